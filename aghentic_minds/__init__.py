@@ -1,7 +1,17 @@
-from .types import Expert, Message, TurnResponse
+from .types import Expert, Message, TurnResponse, TurnChunk, BatchResult
 from .router import Router
 from .session import Flow
 from .memory import PNNet
-from .llm import BaseLLM, GeminiLLM, MockLLM
+from .history import CompactHistory
+from .llm import BaseLLM, MockLLM, LLMRegistry, ResilientLLM
+from .tracing import Tracer, NullTracer, CallbackTracer, MetricsTracer
 
-__all__ = ["Expert", "Message", "TurnResponse", "Router", "Flow", "PNNet", "BaseLLM", "GeminiLLM", "MockLLM"]
+def __getattr__(name):
+    # Provider adapters (GeminiLLM) load their SDK on first access, see llm/__init__.py
+    if name == "GeminiLLM":
+        from . import llm
+        return llm.GeminiLLM
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+__all__ = ["Expert", "Message", "TurnResponse", "TurnChunk", "BatchResult", "Router", "Flow", "PNNet", "CompactHistory", "BaseLLM", "GeminiLLM", "MockLLM", "LLMRegistry", "ResilientLLM",
+           "Tracer", "NullTracer", "CallbackTracer", "MetricsTracer"]
@@ -0,0 +1,283 @@
+import json
+import math
+import time
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from .utils import normalize_message
+
+class CacheBackend(ABC):
+    """
+    Abstract key/value cache used for routing decisions (and other small, recomputable values).
+    Implement this to share a cache between worker processes.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Returns the cached value or None on a miss.
+        """
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """
+        Stores a value. `ttl` (seconds) overrides the backend default.
+        """
+        pass
+
+    @abstractmethod
+    def clear(self):
+        """
+        Drops every entry.
+        """
+        pass
+
+    @abstractmethod
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns hit/miss/eviction counters.
+        """
+        pass
+
+class LRUCache(CacheBackend):
+    """
+    In-process cache with LRU eviction and an optional time-to-live.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "size": len(self._data)}
+
+class RedisCache(CacheBackend):
+    """
+    Cache stored in Redis (or any client exposing redis-py's get/set/scan_iter/delete),
+    so several workers share one set of entries. Values must be JSON serializable.
+    Redis handles eviction (maxmemory-policy) and expiry; hit/miss counters are per process.
+    """
+
+    def __init__(self, client: Any, prefix: str = "aghentic:cache:", ttl: Optional[float] = None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)) if ttl else None)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+class ResponseCache:
+    """
+    Caches expert replies so repeated questions skip the generation call.
+
+    Exact tier: keyed on (expert, normalized message, hash of the last `context_window` history
+    messages), stored in any CacheBackend (in-process LRUCache by default, RedisCache to share
+    replies between workers).
+
+    Near-duplicate tier (`near_duplicate_threshold`, off by default): messages with the same
+    expert and context are compared by cosine similarity of their sets of hashed word/character
+    n-grams; a stored reply is reused when the similarity reaches the threshold. Kept in process,
+    at most `near_duplicate_size` messages per (expert, context), LRU-evicted.
+
+    Experts opt in or out with `Expert.cache_responses`; by default experts with tools are not
+    cached (their replies may depend on tool calls).
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None, max_size: int = 10_000, ttl: Optional[float] = 3600,
+                 context_window: int = 2, near_duplicate_threshold: Optional[float] = None,
+                 near_duplicate_size: int = 256, near_duplicate_buckets: int = 1024):
+        self.backend = backend if backend is not None else LRUCache(max_size=max_size, ttl=ttl)
+        self.ttl = ttl
+        self.context_window = context_window
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.near_duplicate_size = near_duplicate_size
+        self.near_duplicate_buckets = near_duplicate_buckets
+        # (expert, context) digest -> OrderedDict[normalized message -> (n-gram set, response, expires_at)]
+        self._near: "OrderedDict[str, OrderedDict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def enabled_for(expert: Any) -> bool:
+        if expert.cache_responses is not None:
+            return expert.cache_responses
+        return not expert.tools
+
+    def _context_digest(self, expert_name: str, history: Any) -> str:
+        lines = []
+        if self.context_window > 0 and history:
+            if hasattr(history, "routing_lines"):
+                # CompactHistory keeps these lines cached for the router
+                lines = history.routing_lines(self.context_window)
+            else:
+                lines = [f"{m.role}: {m.content}" for m in history[-self.context_window:]]
+        raw = "\0".join([expert_name, *lines])
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    @staticmethod
+    def _ngrams(text: str) -> frozenset:
+        # Imported here: the embedding module pulls in numpy, which plain caching doesn't need
+        from .embedding import hashed_ngrams
+        return frozenset(hashed_ngrams(text, 1 << 20))
+
+    def _count(self, expert_name: str, key: str):
+        with self._lock:
+            stats = self._stats.get(expert_name)
+            if stats is None:
+                stats = self._stats[expert_name] = {"hits": 0, "near_hits": 0, "misses": 0, "stores": 0}
+            stats[key] += 1
+
+    def get(self, expert_name: str, message: str, history: Any = None) -> Optional[str]:
+        """
+        Returns a cached reply for `message` sent to `expert_name` after `history`, or None.
+        """
+        normalized = normalize_message(message)
+        digest = self._context_digest(expert_name, history)
+        response = self.backend.get(f"reply:{digest}:{hashlib.sha1(normalized.encode()).hexdigest()}")
+        if response is not None:
+            self._count(expert_name, "hits")
+            return response
+
+        if self.near_duplicate_threshold is not None:
+            response = self._near_lookup(digest, normalized)
+            if response is not None:
+                self._count(expert_name, "near_hits")
+                return response
+
+        self._count(expert_name, "misses")
+        return None
+
+    def _near_lookup(self, digest: str, normalized: str) -> Optional[str]:
+        ngrams = self._ngrams(normalized)
+        size = len(ngrams) or 1
+        threshold = self.near_duplicate_threshold
+        # Cosine of binary sets is |A & B| / sqrt(|A| |B|), which can't reach the threshold
+        # unless the sizes are within a factor threshold^2 of each other
+        low, high = threshold * threshold * size, size / (threshold * threshold)
+        now = time.monotonic()
+        best, best_score = None, threshold
+        with self._lock:
+            bucket = self._near.get(digest)
+            if bucket is None:
+                return None
+            for key, (other, response, expires_at) in list(bucket.items()):
+                if expires_at is not None and expires_at <= now:
+                    del bucket[key]
+                    continue
+                other_size = len(other)
+                if other_size < low or other_size > high:
+                    continue
+                score = len(ngrams & other) / math.sqrt(size * (other_size or 1))
+                if score >= best_score:
+                    best, best_score = key, score
+            if best is None:
+                return None
+            bucket.move_to_end(best)
+            return bucket[best][1]
+
+    def put(self, expert_name: str, message: str, history: Any, response: str):
+        """
+        Stores the reply generated for `message` (call with the history the reply was generated from).
+        """
+        normalized = normalize_message(message)
+        digest = self._context_digest(expert_name, history)
+        self.backend.set(f"reply:{digest}:{hashlib.sha1(normalized.encode()).hexdigest()}", response)
+        self._count(expert_name, "stores")
+
+        if self.near_duplicate_threshold is not None:
+            ngrams = self._ngrams(normalized)
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            with self._lock:
+                bucket = self._near.get(digest)
+                if bucket is None:
+                    bucket = self._near[digest] = OrderedDict()
+                    while len(self._near) > self.near_duplicate_buckets:
+                        self._near.popitem(last=False)
+                self._near.move_to_end(digest)
+                bucket[normalized] = (ngrams, response, expires_at)
+                bucket.move_to_end(normalized)
+                while len(bucket) > self.near_duplicate_size:
+                    bucket.popitem(last=False)
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self._near.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Returns hit/near-hit/miss/store counts and the hit rate, overall and per expert.
+        """
+        with self._lock:
+            experts = {name: dict(stats) for name, stats in self._stats.items()}
+        totals = {"hits": 0, "near_hits": 0, "misses": 0, "stores": 0}
+        for stats in experts.values():
+            lookups = stats["hits"] + stats["near_hits"] + stats["misses"]
+            stats["hit_rate"] = (stats["hits"] + stats["near_hits"]) / lookups if lookups else 0.0
+            for key in totals:
+                totals[key] += stats[key]
+        lookups = totals["hits"] + totals["near_hits"] + totals["misses"]
+        totals["hit_rate"] = (totals["hits"] + totals["near_hits"]) / lookups if lookups else 0.0
+        return {**totals, "experts": experts, "backend": self.backend.get_stats()}
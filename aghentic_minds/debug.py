@@ -0,0 +1,128 @@
+import os
+import json
+import atexit
+import weakref
+import datetime
+import threading
+from typing import Any, Dict, List, Optional
+from .types import Message
+
+class DebugWriter:
+    """
+    Writes debug snapshots of session memory from a background thread, so debug mode
+    adds no serialization or disk latency to turns.
+
+    Snapshots are coalesced per user: if a user's previous snapshot hasn't been written yet
+    it is replaced, so only the latest one hits the disk. At most `max_pending` users can
+    be waiting; snapshots for new users are dropped (and counted) while the queue is full.
+
+    Formats:
+    - "snapshot": one compact JSON file per user, `{directory}/{user_id}_debug.json`, overwritten.
+    - "jsonl": one line per snapshot appended to `{directory}/debug.jsonl`.
+    """
+    def __init__(self, directory: str = "debug-cache", format: str = "snapshot", max_pending: int = 1024):
+        if format not in ("snapshot", "jsonl"):
+            raise ValueError(f"Unknown debug format: {format}")
+        self.directory = directory
+        self.format = format
+        self.max_pending = max_pending
+        self.stats = {"submitted": 0, "written": 0, "coalesced": 0, "dropped": 0, "errors": 0}
+        os.makedirs(directory, exist_ok=True)
+
+        self._pending: Dict[Any, tuple] = {} # user_id -> (timestamp, expert_name, history)
+        self._writing = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="flow-debug-writer", daemon=True)
+        self._thread.start()
+        # Flush whatever is still queued when the interpreter exits
+        atexit.register(DebugWriter._close_ref, weakref.ref(self))
+
+    @staticmethod
+    def _close_ref(ref):
+        writer = ref()
+        if writer is not None:
+            writer.close()
+
+    def submit(self, user_id: Optional[str], expert_name: str, history: List[Message]) -> bool:
+        """
+        Queues a snapshot. Only a shallow copy of the history is taken here;
+        serialization happens on the writer thread. Returns False if it was dropped.
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            self.stats["submitted"] += 1
+            if user_id in self._pending:
+                self.stats["coalesced"] += 1
+            elif len(self._pending) >= self.max_pending:
+                self.stats["dropped"] += 1
+                return False
+            self._pending[user_id] = (datetime.datetime.now().isoformat(), expert_name, history[:])
+            self._cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                batch, self._pending = self._pending, {}
+                self._writing = True
+
+            try:
+                self._write(batch)
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
+
+    def _write(self, batch: Dict[Any, tuple]):
+        lines = []
+        for user_id, (timestamp, expert_name, history) in batch.items():
+            try:
+                debug_data = {
+                    "last_updated": timestamp,
+                    "current_expert": expert_name,
+                    "history": [msg.model_dump(exclude_none=True) for msg in history]
+                }
+                if self.format == "jsonl":
+                    debug_data["user_id"] = user_id
+                    lines.append(json.dumps(debug_data, separators=(",", ":")))
+                else:
+                    path = os.path.join(self.directory, f"{user_id}_debug.json")
+                    with open(path, "w", encoding="utf-8") as f:
+                        json.dump(debug_data, f, separators=(",", ":"))
+                    self.stats["written"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Debug Log Error: {e}")
+
+        if lines:
+            try:
+                with open(os.path.join(self.directory, "debug.jsonl"), "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+                self.stats["written"] += len(lines)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Debug Log Error: {e}")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until every queued snapshot is written. Returns False on timeout.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._writing, timeout=timeout)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """
+        Writes what is still queued and stops the writer thread.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
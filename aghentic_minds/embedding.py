@@ -0,0 +1,100 @@
+import re
+import zlib
+from typing import Dict, List, Tuple
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_WORD_RE = re.compile(r"\w+")
+
+def hashed_ngrams(text: str, dim: int = 4096, char_ngram: int = 3) -> List[int]:
+    """
+    Hashed word and character n-gram features of `text` (bucket ids in [0, dim)).
+    crc32 instead of hash() so buckets are stable across processes (PYTHONHASHSEED).
+    """
+    features = []
+    n = char_ngram
+    for token in _WORD_RE.findall(text.lower()):
+        features.append(zlib.crc32(f"w:{token}".encode()) % dim)
+        padded = f" {token} "
+        for i in range(max(1, len(padded) - n + 1)):
+            features.append(zlib.crc32(f"c:{padded[i:i + n]}".encode()) % dim)
+    return features
+
+class NgramIndex:
+    """
+    A tiny local text index used as the fast-path routing tier.
+    Texts are embedded as TF-IDF weighted hashed word + character n-grams,
+    and each label (expert) is represented by the centroid of its texts.
+    """
+
+    def __init__(self, dim: int = 4096, char_ngram: int = 3):
+        if np is None:
+            raise ImportError("numpy package is required for NgramIndex (pip install numpy)")
+        self.dim = dim
+        self.char_ngram = char_ngram
+        self.labels: List[str] = []
+        self._idf = np.ones(dim, dtype=np.float32)
+        self._centroids = np.zeros((0, dim), dtype=np.float32)
+
+    def _features(self, text: str) -> List[int]:
+        return hashed_ngrams(text, self.dim, self.char_ngram)
+
+    def _term_frequencies(self, text: str):
+        vec = np.zeros(self.dim, dtype=np.float32)
+        features = self._features(text)
+        if features:
+            np.add.at(vec, features, 1.0)
+            np.log1p(vec, out=vec)
+        return vec
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def fit(self, documents: Dict[str, List[str]]) -> "NgramIndex":
+        """
+        Builds the index from {label: [texts]}. Each text counts as one document for IDF.
+        """
+        self.labels = [label for label, texts in documents.items() if texts]
+        rows = [(label, self._term_frequencies(text)) for label in self.labels for text in documents[label]]
+        if not rows:
+            self._centroids = np.zeros((0, self.dim), dtype=np.float32)
+            return self
+
+        tf = np.stack([vec for _, vec in rows])
+        doc_freq = (tf > 0).sum(axis=0)
+        self._idf = (np.log((1.0 + len(rows)) / (1.0 + doc_freq)) + 1.0).astype(np.float32)
+        weighted = self._normalize(tf * self._idf)
+
+        owners = np.array([self.labels.index(label) for label, _ in rows])
+        centroids = np.stack([weighted[owners == i].mean(axis=0) for i in range(len(self.labels))])
+        self._centroids = self._normalize(centroids).astype(np.float32)
+        return self
+
+    def rank(self, text: str, k: int = None) -> List[Tuple[str, float]]:
+        """
+        Returns [(label, cosine_similarity)] sorted best first, optionally truncated to k.
+        """
+        if not self.labels:
+            return []
+        query = self._normalize(self._term_frequencies(text) * self._idf)
+        scores = self._centroids @ query
+        order = np.argsort(-scores)
+        if k is not None:
+            order = order[:k]
+        return [(self.labels[i], float(scores[i])) for i in order]
+
+    def best(self, text: str) -> Tuple[str, float, float]:
+        """
+        Returns (label, score, margin) where margin is the gap to the runner-up.
+        """
+        ranked = self.rank(text, k=2)
+        if not ranked:
+            return None, 0.0, 0.0
+        label, score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        return label, score, score - runner_up
@@ -0,0 +1,339 @@
+import threading
+from array import array
+from collections.abc import Sequence
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from .types import Message
+
+class _InternTable:
+    """
+    Maps strings (roles, expert names) to small integer ids shared by every history.
+    Append-only, so lookups by id need no lock.
+    """
+    def __init__(self, initial: Iterable[Optional[str]] = ()):
+        self._ids: Dict[Optional[str], int] = {}
+        self._values: List[Optional[str]] = []
+        self._lock = threading.Lock()
+        for value in initial:
+            self.id(value)
+
+    def id(self, value: Optional[str]) -> int:
+        found = self._ids.get(value)
+        if found is not None:
+            return found
+        with self._lock:
+            found = self._ids.get(value)
+            if found is None:
+                found = len(self._values)
+                if found > 0xFFFF:
+                    raise ValueError("Too many distinct roles/expert names to intern")
+                self._values.append(value)
+                self._ids[value] = found
+            return found
+
+    def value(self, id: int) -> Optional[str]:
+        return self._values[id]
+
+_ROLES = _InternTable(["user", "assistant", "system", "model"])
+_EXPERTS = _InternTable([None]) # id 0: message without an "expert" metadata key
+
+_NO_TOKENS = -1
+
+class _Columns:
+    """
+    The column storage shared by a CompactHistory, its forks and the views taken from it.
+    Columns are only ever appended to or replaced wholesale (never shifted in place),
+    so a view keeps reading the messages it was created over.
+    """
+    __slots__ = ("roles", "experts", "tokens", "contents", "extra")
+
+    def __init__(self):
+        self.roles = array("H")
+        self.experts = array("H")
+        self.tokens = array("i")
+        self.contents: List[str] = []
+        self.extra: List[Optional[Dict[str, Any]]] = []
+
+    def record(self, i: int) -> tuple:
+        expert = _EXPERTS.value(self.experts[i])
+        extra = self.extra[i]
+        metadata = dict(extra) if extra else {}
+        if expert is not None:
+            metadata["expert"] = expert
+        tokens = self.tokens[i]
+        return _ROLES.value(self.roles[i]), self.contents[i], metadata, None if tokens == _NO_TOKENS else tokens
+
+    def message(self, i: int) -> Message:
+        role, content, metadata, token_count = self.record(i)
+        # Fields were validated when the message was stored
+        return Message.model_construct(role=role, content=content, metadata=metadata, token_count=token_count)
+
+    def slice(self, start: int, stop: int) -> "_Columns":
+        result = _Columns()
+        result.roles = self.roles[start:stop]
+        result.experts = self.experts[start:stop]
+        result.tokens = self.tokens[start:stop]
+        result.contents = self.contents[start:stop]
+        result.extra = self.extra[start:stop]
+        return result
+
+class CompactHistory(Sequence):
+    """
+    A list-like conversation history stored column-wise instead of as Message objects:
+    interned role and expert ids and token counts in typed arrays, the content strings in
+    one list, and any other metadata (rare, e.g. summary levels) in a sparse side list.
+    That is a few dozen bytes per message instead of a pydantic model plus its metadata dict.
+
+    Indexing returns a Message built on demand (a fresh object each time: mutating it does not
+    change the history); slicing and `+` return a CompactHistory, like a list would return a list.
+
+    With `max_messages` set the history is bounded: appending past the limit drops the oldest
+    messages in O(1) (a start offset moves; storage is compacted once the dropped prefix is as
+    long as the live part). `window()` gives read-only views without copying, and `fork()`
+    a copy-on-write copy in O(1).
+    """
+    __slots__ = ("_cols", "_start", "_stop", "max_messages", "_routing")
+
+    def __init__(self, messages: Iterable[Message] = (), max_messages: Optional[int] = None):
+        self._cols = _Columns()
+        self._start = 0 # Physical index of the first live message
+        self._stop = 0 # Physical end (columns may be longer when shared with a fork)
+        self.max_messages = max_messages
+        self._routing: Optional[Tuple[int, Tuple[str, ...]]] = None # (physical end, cached routing lines)
+        if messages:
+            self.extend(messages)
+
+    @classmethod
+    def of(cls, history: Iterable[Message], max_messages: Optional[int] = None) -> "CompactHistory":
+        """
+        Returns `history` itself if it is already compact, otherwise a compact copy.
+        `max_messages` (if given) becomes its bound.
+        """
+        if not isinstance(history, CompactHistory):
+            return cls(history, max_messages)
+        if max_messages is not None:
+            history.max_messages = max_messages
+            history.trim(max_messages)
+        return history
+
+    def fork(self) -> "CompactHistory":
+        """
+        Returns a copy sharing this history's storage. Appending to either one leaves the other
+        unchanged: the first to append past the shared end grows the columns, the other copies
+        its live messages before its own next append (like Go slices).
+        """
+        result = CompactHistory.__new__(CompactHistory)
+        result._cols = self._cols
+        result._start = self._start
+        result._stop = self._stop
+        result.max_messages = self.max_messages
+        result._routing = self._routing
+        return result
+
+    def _own_tail(self):
+        # Another history already appended to the shared columns: copy ours before appending
+        if self._stop != len(self._cols.contents):
+            self._cols = self._cols.slice(self._start, self._stop)
+            self._start, self._stop = 0, len(self._cols.contents)
+            self._routing = None
+
+    def append(self, msg: Message):
+        self._append(msg)
+        if self.max_messages is not None:
+            self.trim(self.max_messages)
+
+    def _append(self, msg: Message):
+        self._own_tail()
+        metadata = msg.metadata
+        expert = metadata.get("expert") if metadata else None
+        extra = None
+        if metadata and (len(metadata) > 1 or expert is None or not isinstance(expert, str)):
+            extra = dict(metadata)
+            if isinstance(expert, str):
+                del extra["expert"]
+            else:
+                expert = None
+        cols = self._cols
+        cols.roles.append(_ROLES.id(msg.role))
+        cols.experts.append(_EXPERTS.id(expert))
+        cols.tokens.append(_NO_TOKENS if msg.token_count is None else msg.token_count)
+        cols.contents.append(msg.content)
+        cols.extra.append(extra)
+        self._stop += 1
+
+    def extend(self, messages: Iterable[Message]):
+        if isinstance(messages, CompactHistory):
+            src, start, stop = messages._cols, messages._start, messages._stop
+            self._own_tail()
+            cols = self._cols
+            cols.roles.extend(src.roles[start:stop])
+            cols.experts.extend(src.experts[start:stop])
+            cols.tokens.extend(src.tokens[start:stop])
+            cols.contents.extend(src.contents[start:stop])
+            cols.extra.extend(src.extra[start:stop])
+            self._stop += stop - start
+        else:
+            for msg in messages:
+                self._append(msg)
+        if self.max_messages is not None:
+            self.trim(self.max_messages)
+
+    def trim(self, max_messages: int) -> int:
+        """
+        Drops the oldest messages so at most `max_messages` remain. Returns how many were dropped.
+        """
+        excess = len(self) - max_messages
+        if excess <= 0:
+            return 0
+        self._start += excess
+        # Compact once the dead prefix outweighs the live messages (amortized O(1) per drop).
+        # Columns are replaced, not shifted, so existing views stay valid.
+        if self._start >= 32 and self._start >= len(self):
+            self._cols = self._cols.slice(self._start, self._stop)
+            self._start, self._stop = 0, len(self._cols.contents)
+            self._routing = None
+        return excess
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            result = CompactHistory()
+            positions = range(self._start, self._stop)[index]
+            if positions.step == 1:
+                result._cols = self._cols.slice(positions.start, positions.stop)
+                result._stop = len(result._cols.contents)
+            else:
+                for i in positions:
+                    result.append(self._cols.message(i))
+            return result
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        return self._cols.message(self._start + index)
+
+    def __iter__(self):
+        cols = self._cols
+        for i in range(self._start, self._stop):
+            yield cols.message(i)
+
+    def __add__(self, other: Iterable[Message]) -> "CompactHistory":
+        result = self[:]
+        result.extend(other)
+        return result
+
+    def __radd__(self, other: Iterable[Message]) -> "CompactHistory":
+        result = CompactHistory(other)
+        result.extend(self)
+        return result
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (CompactHistory, HistoryView, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"CompactHistory({len(self)} messages)"
+
+    def copy(self) -> List[Message]:
+        """Materializes the history as a plain list of Messages."""
+        return list(self)
+
+    def window(self, last: Optional[int] = None, extra: Iterable[Message] = ()) -> "HistoryView":
+        """
+        Returns a read-only view of the last `last` messages (all by default) followed by `extra`
+        (e.g. the new user message), without copying the history.
+        """
+        stop = self._stop
+        start = self._start if last is None else max(self._start, stop - last)
+        return HistoryView(self._cols, start, stop, tuple(extra))
+
+    def records(self):
+        """Yields (role, content, metadata, token_count) tuples without building Messages."""
+        cols = self._cols
+        for i in range(self._start, self._stop):
+            yield cols.record(i)
+
+    def routing_lines(self, last: int = 5) -> List[str]:
+        """
+        Returns "role: content" lines for the last `last` messages (the router context).
+        Lines are cached, so each message is formatted once instead of on every turn. The cache
+        keeps the widest window asked for, so a shorter request (e.g. the response cache key)
+        doesn't evict lines the router needs on its next turn.
+        """
+        cols = self._cols
+        stop = self._stop
+        start = max(self._start, stop - last)
+        cached_end, lines = self._routing if self._routing is not None else (start, ())
+        if cached_end - len(lines) > start:
+            # The cache doesn't reach back far enough (a longer window was asked for): rebuild
+            cached_end, lines = start, ()
+        keep = max(stop - start, len(lines))
+        lines += tuple(f"{_ROLES.value(cols.roles[i])}: {cols.contents[i]}" for i in range(max(cached_end, start), stop))
+        lines = lines[len(lines) - keep:]
+        self._routing = (stop, lines)
+        return list(lines[len(lines) - (stop - start):])
+
+    def total_tokens(self, count: Callable[[Message], int]) -> int:
+        """
+        Sums the stored token counts; messages without one are counted with `count(msg)`
+        once and the result is stored.
+        """
+        total = 0
+        cols = self._cols
+        tokens = cols.tokens
+        for i in range(self._start, self._stop):
+            if tokens[i] == _NO_TOKENS:
+                tokens[i] = count(cols.message(i))
+            total += tokens[i]
+        return total
+
+class HistoryView(Sequence):
+    """
+    A read-only window over a CompactHistory, optionally followed by extra messages.
+    Handed to LLM adapters instead of a copied list; Messages are built on access.
+    """
+    __slots__ = ("_cols", "_start", "_stop", "_extra")
+
+    def __init__(self, cols: _Columns, start: int, stop: int, extra: Tuple[Message, ...] = ()):
+        self._cols = cols
+        self._start = start
+        self._stop = stop
+        self._extra = extra
+
+    def __len__(self) -> int:
+        return self._stop - self._start + len(self._extra)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        stored = self._stop - self._start
+        if index < stored:
+            return self._cols.message(self._start + index)
+        return self._extra[index - stored]
+
+    def __iter__(self):
+        cols = self._cols
+        for i in range(self._start, self._stop):
+            yield cols.message(i)
+        yield from self._extra
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (CompactHistory, HistoryView, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"HistoryView({len(self)} messages)"
+
+    def copy(self) -> List[Message]:
+        return list(self)
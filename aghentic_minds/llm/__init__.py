@@ -1,5 +1,27 @@
+import importlib
 from .base import BaseLLM
-from .gemini import GeminiLLM
-from .mock import MockLLM
+from .mock import MockLLM, CountingMockLLM, LatencyMockLLM, FaultyMockLLM
+from .registry import LLMRegistry
+from .resilient import ResilientLLM, CircuitBreaker, LLMTimeoutError, CircuitOpenError
+from .replay import RecordingLLM, ReplayLLM, ReplayStore, ReplayMissError
 
-__all__ = ["BaseLLM", "GeminiLLM", "MockLLM"]
+# Provider adapters are imported on first access (PEP 562), so `import aghentic_minds`
+# doesn't load their SDKs (google-genai alone takes ~0.5s) for users who never touch them.
+_LAZY = {
+    "GeminiLLM": ".gemini",
+}
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value # Memoize: later lookups don't go through __getattr__
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
+
+__all__ = ["BaseLLM", "GeminiLLM", "MockLLM", "CountingMockLLM", "LatencyMockLLM", "FaultyMockLLM", "LLMRegistry",
+           "ResilientLLM", "CircuitBreaker", "LLMTimeoutError", "CircuitOpenError",
+           "RecordingLLM", "ReplayLLM", "ReplayStore", "ReplayMissError"]
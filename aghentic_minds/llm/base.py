@@ -1,5 +1,6 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Optional, Any, Dict
+from typing import List, Optional, Any, Dict, Iterator, Sequence
 from ..types import Message
 
 class BaseLLM(ABC):
@@ -8,12 +9,13 @@ class BaseLLM(ABC):
     """
     
     @abstractmethod
-    def generate(self, messages: List[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+    def generate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
         """
         Generates a response from the LLM.
         
         Args:
-            messages: The conversation history.
+            messages: The conversation history, oldest first. Any sequence (Flow passes
+                a list built for this call); adapters should copy it before modifying it.
             system_prompt: Optional system instruction.
             tools: Optional list of tools/functions.
             **kwargs: Additional model-specific parameters (e.g., temperature).
@@ -26,7 +28,8 @@ class BaseLLM(ABC):
     @abstractmethod
     def get_token_usage(self) -> Dict[str, int]:
         """
-        Returns the token usage of the last call.
+        Returns the token usage of the last call made by the calling thread
+        (Flow may call one adapter from several threads at once).
         """
         pass
 
@@ -36,3 +39,29 @@ class BaseLLM(ABC):
         Counts the number of tokens in the given text.
         """
         pass
+
+    def stream(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> Iterator[str]:
+        """
+        Generates a response as a stream of text chunks.
+        
+        The default implementation yields the full `generate` result as a single chunk;
+        adapters whose provider supports streaming should override this.
+        Token usage is available from `get_token_usage` once the stream is exhausted.
+        """
+        yield self.generate(messages, system_prompt=system_prompt, tools=tools, **kwargs)
+
+    async def agenerate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        """
+        Async variant of `generate`.
+        
+        The default implementation runs `generate` in a worker thread so that
+        providers without a native async client still work with `Flow.aprocess_turn`.
+        Adapters with an async SDK should override this.
+        """
+        return await asyncio.to_thread(self.generate, messages, system_prompt, tools, **kwargs)
+
+    async def acount_tokens(self, text: str) -> int:
+        """
+        Async variant of `count_tokens`. Defaults to running `count_tokens` in a worker thread.
+        """
+        return await asyncio.to_thread(self.count_tokens, text)
@@ -1,7 +1,11 @@
-from typing import List, Any, Dict, Optional
+import time
+import hashlib
+import threading
+from typing import List, Any, Dict, Optional, Iterator, Sequence
 from ..types import Message
 from .base import BaseLLM
-from ..utils import Colors
+from ..cache import LRUCache
+from ..utils import Colors, estimate_tokens
 import os
 try:
     from google import genai
@@ -10,87 +14,263 @@ except ImportError:
     genai = None
     types = None
 
+class _ChatHandle:
+    """
+    A live chat plus the (role, text) fingerprint of everything it has seen,
+    used to decide whether the next call can reuse it.
+    """
+    __slots__ = ("chat", "system_prompt", "tools", "cached_content", "fingerprint")
+
+    def __init__(self, chat: Any, system_prompt: Optional[str], tools: Optional[List[Any]], cached_content: Optional[str], fingerprint: List[tuple]):
+        self.chat = chat
+        self.system_prompt = system_prompt
+        self.tools = tools
+        self.cached_content = cached_content
+        self.fingerprint = fingerprint
+
 class GeminiLLM(BaseLLM):
-    def __init__(self, api_key: Optional[str] = None, model_name: str = "gemini-2.0-flash-lite"):
+    def __init__(self, api_key: Optional[str] = None, model_name: str = "gemini-2.0-flash-lite",
+                 max_chat_sessions: int = 256, max_cached_contents: int = 4096,
+                 http_options: Optional[Dict[str, Any]] = None, max_connections: Optional[int] = None,
+                 context_cache: bool = False, cache_ttl: int = 3600, min_cache_tokens: int = 1024,
+                 client: Any = None):
         if not genai:
             raise ImportError("google-genai package is required for GeminiLLM")
-        #  lets check if its already an env var 
-        resolved_api_key = api_key or os.getenv("GOOGLE_API_KEY")
-        if not resolved_api_key:
-            raise ValueError("API key is required. Provide it directly or set GOOGLE_API_KEY in the environment. \nIf you don't have one, create one for free at https://aistudio.google.com/api-keys/")
-        self.client = genai.Client(api_key=resolved_api_key)
+        if client is None:
+            #  lets check if its already an env var
+            resolved_api_key = api_key or os.getenv("GOOGLE_API_KEY")
+            if not resolved_api_key:
+                raise ValueError("API key is required. Provide it directly or set GOOGLE_API_KEY in the environment. \nIf you don't have one, create one for free at https://aistudio.google.com/api-keys/")
+            client = genai.Client(api_key=resolved_api_key, http_options=self._build_http_options(http_options, max_connections))
+        self.client = client
         self.model_name = model_name
-        self._last_usage = {"total": 0}
-
-    def generate(self, messages: List[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
-        genai_history = []
-        
-        # Handle System Prompt
-        # Gemini 2.0 Flash often prefers system instructions in the config or as the first part
-        # For simplicity in this wrapper, we'll prepend it if provided.
-        if system_prompt:
-            genai_history.append(types.Content(
-                role="user", 
-                parts=[types.Part(text=f"System Instruction: {system_prompt}")]
-            ))
+        self._last_usage = {"total": 0, "cached": 0}
+        # Usage of the last call made by each thread, so concurrent calls on this adapter
+        # (e.g. a speculative generation next to routing) don't read each other's counts
+        self._thread_usage = threading.local()
+        self._max_chat_sessions = max_chat_sessions
+        self._max_cached_contents = max_cached_contents
+
+        # Explicit context caching: the (static) system prompt of each expert is uploaded once
+        # as cached content, keyed by a hash of model + prompt, and referenced on every call.
+        self.context_cache = context_cache
+        self.cache_ttl = cache_ttl
+        # Prompts estimated below this size (e.g. the summarizer's one-liner) are sent inline:
+        # the provider rejects small cached contents and caching them wouldn't save much anyway
+        self.min_cache_tokens = min_cache_tokens
+        self._context_caches: Dict[str, tuple] = {} # prompt hash -> (cache name or None, expires_at)
+
+        # Live chats per session (Flow passes session_id), so a turn that only adds
+        # a new user message continues the existing chat instead of rebuilding it.
+        self._chats = LRUCache(max_size=max_chat_sessions)
+        self._achats = LRUCache(max_size=max_chat_sessions)
+        # Converted Content objects, keyed by (role, text)
+        self._contents = LRUCache(max_size=max_cached_contents)
+
+    def with_model(self, model_name: str) -> "GeminiLLM":
+        """
+        Returns a GeminiLLM for another model sharing this one's client (and connection pool)
+        and settings. Handy as an `LLMRegistry` factory.
+        """
+        return GeminiLLM(model_name=model_name, max_chat_sessions=self._max_chat_sessions,
+                         max_cached_contents=self._max_cached_contents, context_cache=self.context_cache,
+                         cache_ttl=self.cache_ttl, min_cache_tokens=self.min_cache_tokens, client=self.client)
 
+    @staticmethod
+    def _build_http_options(http_options: Optional[Dict[str, Any]], max_connections: Optional[int]):
+        """
+        Builds the SDK HttpOptions. `max_connections` sizes the httpx connection pool
+        (kept alive between calls) for both the sync and async clients.
+        """
+        if not http_options and max_connections is None:
+            return None
+        options = dict(http_options or {})
+        if max_connections is not None:
+            import httpx
+            limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            options.setdefault("client_args", {})["limits"] = limits
+            options.setdefault("async_client_args", {})["limits"] = limits
+        return types.HttpOptions(**options)
+
+    def _content(self, role: str, text: str):
+        key = (role, text)
+        content = self._contents.get(key)
+        if content is None:
+            content = types.Content(role=role, parts=[types.Part(text=text)])
+            self._contents.set(key, content)
+        return content
+
+    @staticmethod
+    def _fingerprint(messages: Sequence[Message]) -> List[tuple]:
+        # System messages are not sent to Gemini (see _prepare_request), so they don't count
+        return [("model" if msg.role == "assistant" else "user", msg.content) for msg in messages if msg.role != "system"]
+
+    def _prepare_request(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, cached_content: Optional[str] = None):
+        """
+        Converts our Message objects into the Gemini chat format.
+        Returns (history, last_message_text, config) shared by the sync and async paths.
+        """
         # Convert Messages
-        for msg in messages:
-            role = "model" if msg.role == "assistant" else "user"
-            # Handle system messages in history if they exist (though we usually prune them)
-            if msg.role == "system":
-                continue 
-                
-            genai_history.append(types.Content(
-                role=role,
-                parts=[types.Part(text=msg.content)]
-            ))
+        # (system messages in history are skipped, though we usually prune them)
+        genai_history = [self._content(role, text) for role, text in self._fingerprint(messages)]
+
+        # We use chats.create with the history, as the chat interface handles history formatting nicely.
+        # 'messages' contains the full conversation including the latest user prompt,
+        # so we split it into history + last message.
+        history_content = genai_history[:-1]
+        last_message_content = genai_history[-1].parts[0].text
+        return history_content, last_message_content, self._request_config(system_prompt, tools, cached_content)
+
+    @staticmethod
+    def _request_config(system_prompt: str = None, tools: List[Any] = None, cached_content: Optional[str] = None):
+        """
+        Builds the GenerateContentConfig. The system prompt goes in `system_instruction`
+        (or is referenced through `cached_content`, which already contains it).
+        """
+        config = {}
+        if cached_content:
+            config["cached_content"] = cached_content
+        elif system_prompt:
+            config["system_instruction"] = system_prompt
 
         # Configure Tools
-        tool_config = None
         if tools:
-            tool_config = types.GenerateContentConfig(
-                tools=tools,
-                automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=False)
-            )
+            config["tools"] = tools
+            config["automatic_function_calling"] = types.AutomaticFunctionCallingConfig(disable=False)
+
+        return types.GenerateContentConfig(**config) if config else None
+
+    def _prompt_hash(self, system_prompt: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{system_prompt}".encode()).hexdigest()
+
+    def _lookup_context_cache(self, system_prompt: str = None, tools: List[Any] = None):
+        """
+        Returns (cached_content_name, needs_create). Tool-using calls are not cached,
+        since tools must then live in the cache as well, nor are prompts below `min_cache_tokens`.
+        """
+        if not self.context_cache or not system_prompt or tools or estimate_tokens(system_prompt) < self.min_cache_tokens:
+            return None, False
+        entry = self._context_caches.get(self._prompt_hash(system_prompt))
+        # Refresh shortly before the provider expires the cache
+        if entry is None or entry[1] - min(60, self.cache_ttl / 10) <= time.monotonic():
+            return None, True
+        return entry[0], False
+
+    def _cache_config(self, system_prompt: str):
+        return types.CreateCachedContentConfig(
+            system_instruction=system_prompt,
+            ttl=f"{self.cache_ttl}s",
+            display_name=f"aghentic-{self._prompt_hash(system_prompt)[:16]}"
+        )
 
+    def _remember_context_cache(self, system_prompt: str, name: Optional[str]):
+        # A failed create (e.g. prompt below the provider's minimum cacheable size) is remembered
+        # for the TTL as well, so we fall back to system_instruction without retrying every call.
+        self._context_caches[self._prompt_hash(system_prompt)] = (name, time.monotonic() + self.cache_ttl)
+        return name
+
+    def _context_cache_for(self, system_prompt: str = None, tools: List[Any] = None) -> Optional[str]:
+        name, needs_create = self._lookup_context_cache(system_prompt, tools)
+        if not needs_create:
+            return name
         try:
-            # We use chats.create to maintain some semblance of session if needed, 
-            # but here we are stateless per call, reconstructing history.
-            # Actually, for a pure 'generate' call, models.generate_content is often simpler 
-            # if we pass the whole history.
-            # However, the chat interface handles history formatting nicely.
-            
-            # Let's use chats.create with the history (minus the last message if we were doing a chat loop, 
-            # but here 'messages' includes the latest user message? 
-            # Usually 'generate' takes history + new_message. 
-            # Let's assume 'messages' contains the full conversation including the latest user prompt.
-            
-            if not messages:
-                return ""
-
-            # Split history and last message
-            history_content = genai_history[:-1]
-            last_message_content = genai_history[-1].parts[0].text
-
-            chat = self.client.chats.create(
-                model=self.model_name,
-                history=history_content,
-                config=tool_config
-            )
-            
-            response = chat.send_message(last_message_content)
-            
-            if response.usage_metadata:
-                self._last_usage["total"] = response.usage_metadata.total_token_count
-                
-            return getattr(response, "text", "") or ""
+            cache = self.client.caches.create(model=self.model_name, config=self._cache_config(system_prompt))
+            return self._remember_context_cache(system_prompt, cache.name)
+        except Exception as e:
+            print(f"{Colors.YELLOW}Context cache unavailable, sending the system prompt inline: {e}{Colors.ENDC}")
+            return self._remember_context_cache(system_prompt, None)
 
+    async def _acontext_cache_for(self, system_prompt: str = None, tools: List[Any] = None) -> Optional[str]:
+        name, needs_create = self._lookup_context_cache(system_prompt, tools)
+        if not needs_create:
+            return name
+        try:
+            cache = await self.client.aio.caches.create(model=self.model_name, config=self._cache_config(system_prompt))
+            return self._remember_context_cache(system_prompt, cache.name)
         except Exception as e:
-            raise e
+            print(f"{Colors.YELLOW}Context cache unavailable, sending the system prompt inline: {e}{Colors.ENDC}")
+            return self._remember_context_cache(system_prompt, None)
+
+    def _checkout_chat(self, chats: LRUCache, factory: Any, session_id: Optional[str], messages: Sequence[Message],
+                       system_prompt: str = None, tools: List[Any] = None, cached_content: Optional[str] = None):
+        """
+        Returns (handle, last_message_text) for this call.
+        A cached chat is reused when it has seen exactly the history before the new message with the
+        same system prompt and tools; otherwise (history pruned, sanitized or summarized) it is rebuilt.
+        The handle is removed from the cache while in use and returned via `_checkin_chat`.
+        """
+        fingerprint = self._fingerprint(messages)
+        if session_id is not None:
+            handle = chats.get(session_id)
+            if handle is not None:
+                chats.delete(session_id)
+                if (handle.system_prompt == system_prompt and handle.tools is tools
+                        and handle.cached_content == cached_content and handle.fingerprint == fingerprint[:-1]):
+                    handle.fingerprint = fingerprint
+                    return handle, fingerprint[-1][1]
+
+        history_content, last_message_content, config = self._prepare_request(messages, system_prompt, tools, cached_content)
+        chat = factory(model=self.model_name, history=history_content, config=config)
+        return _ChatHandle(chat, system_prompt, tools, cached_content, fingerprint), last_message_content
+
+    def _checkin_chat(self, chats: LRUCache, session_id: Optional[str], handle: _ChatHandle, response_text: str):
+        # An empty/invalid response is not recorded in the chat history, so the handle can't be trusted
+        if session_id is None or not response_text:
+            return
+        handle.fingerprint.append(("model", response_text))
+        chats.set(session_id, handle)
+
+    def _record_usage(self, response) -> str:
+        if response.usage_metadata:
+            usage = {
+                "total": response.usage_metadata.total_token_count,
+                # Prompt tokens served from the context cache (billed at the reduced cached rate)
+                "cached": getattr(response.usage_metadata, "cached_content_token_count", None) or 0,
+            }
+            self._last_usage = self._thread_usage.last = usage
+        return getattr(response, "text", "") or ""
+
+    def generate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, session_id: Optional[str] = None, **kwargs) -> str:
+        if not messages:
+            return ""
+
+        cached_content = self._context_cache_for(system_prompt, tools)
+        handle, last_message_content = self._checkout_chat(self._chats, self.client.chats.create, session_id, messages, system_prompt, tools, cached_content)
+        response = handle.chat.send_message(last_message_content)
+        response_text = self._record_usage(response)
+        self._checkin_chat(self._chats, session_id, handle, response_text)
+        return response_text
+
+    def stream(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, session_id: Optional[str] = None, **kwargs) -> Iterator[str]:
+        if not messages:
+            return
+
+        cached_content = self._context_cache_for(system_prompt, tools)
+        handle, last_message_content = self._checkout_chat(self._chats, self.client.chats.create, session_id, messages, system_prompt, tools, cached_content)
+        # Usage metadata is reported on the chunks; the last one carries the final totals.
+        parts = []
+        for chunk in handle.chat.send_message_stream(last_message_content):
+            text = self._record_usage(chunk)
+            if text:
+                parts.append(text)
+                yield text
+        self._checkin_chat(self._chats, session_id, handle, "".join(parts))
+
+    async def agenerate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, session_id: Optional[str] = None, **kwargs) -> str:
+        if not messages:
+            return ""
+
+        # Same request as `generate`, but through the SDK's asyncio client so the
+        # event loop is free while we wait on the network.
+        cached_content = await self._acontext_cache_for(system_prompt, tools)
+        handle, last_message_content = self._checkout_chat(self._achats, self.client.aio.chats.create, session_id, messages, system_prompt, tools, cached_content)
+        response = await handle.chat.send_message(last_message_content)
+        response_text = self._record_usage(response)
+        self._checkin_chat(self._achats, session_id, handle, response_text)
+        return response_text
 
     def get_token_usage(self) -> Dict[str, int]:
-        return self._last_usage
+        return getattr(self._thread_usage, "last", self._last_usage)
 
     def count_tokens(self, text: str) -> int:
         try:
@@ -102,3 +282,14 @@ class GeminiLLM(BaseLLM):
         except Exception as e:
             print(f"Token Count Error: {e}")
             return len(text) // 4 # Fallback
+
+    async def acount_tokens(self, text: str) -> int:
+        try:
+            resp = await self.client.aio.models.count_tokens(
+                model=self.model_name,
+                contents=types.Content(parts=[types.Part(text=text)])
+            )
+            return resp.total_tokens
+        except Exception as e:
+            print(f"Token Count Error: {e}")
+            return len(text) // 4 # Fallback
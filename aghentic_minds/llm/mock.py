@@ -1,4 +1,10 @@
-from typing import List, Any, Dict
+import re
+import math
+import time
+import random
+import asyncio
+import threading
+from typing import List, Any, Dict, Iterator, Sequence
 from ..types import Message
 from .base import BaseLLM
 
@@ -7,26 +13,34 @@ class MockLLM(BaseLLM):
     A Mock LLM for testing purposes.
     Returns predefined responses or echoes input.
     """
-    def __init__(self, responses: Dict[str, str] = None, routing_rules: Dict[str, str] = None, default_response: str = "Mock Response"):
+    def __init__(self, responses: Dict[str, str] = None, routing_rules: Dict[str, str] = None, default_response: str = "Mock Response",
+                 stream_chunk_size: int = 8, stream_delay: float = 0.0):
         self.responses = responses or {}
         self.routing_rules = routing_rules or {}
         self.default_response = default_response
+        # `stream` splits responses into chunks of this many characters, sleeping stream_delay seconds before each
+        self.stream_chunk_size = stream_chunk_size
+        self.stream_delay = stream_delay
         self._last_usage = {"total": 0}
 
-    def generate(self, messages: List[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+    @staticmethod
+    def _is_routing(messages: Sequence[Message]) -> bool:
+        # Routing requests are detected via the Router prompt signature
+        return bool(messages) and "You are an Intent Router" in messages[-1].content
+
+    def _respond(self, messages: Sequence[Message]) -> str:
         last_msg = messages[-1].content if messages else ""
-        
+
         # 1. Handle Routing Requests (detected via Router prompt signature)
-        if "You are an Intent Router" in last_msg:
+        if self._is_routing(messages):
             # Extract the User Message line to avoid matching history
-            import re
             match = re.search(r'User Message: "(.*?)"', last_msg, re.DOTALL)
             target_text = match.group(1) if match else last_msg
 
             for keyword, agent_name in self.routing_rules.items():
                 if keyword.lower() in target_text.lower():
                     return agent_name
-            # If no rule matches, return a default or the first agent? 
+            # If no rule matches, return a default or the first agent?
             # For safety in tests, we might return "orchestrator" or just let it fall through.
             # But usually routing expects a name.
             return "orchestrator"
@@ -35,11 +49,140 @@ class MockLLM(BaseLLM):
         for key, response in self.responses.items():
             if key.lower() in last_msg.lower():
                 return response
-            
+
         return self.default_response
 
+    def generate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        return self._respond(messages)
+
+    def stream(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> Iterator[str]:
+        response = self._respond(messages)
+        for i in range(0, len(response), self.stream_chunk_size):
+            if self.stream_delay:
+                time.sleep(self.stream_delay)
+            yield response[i:i + self.stream_chunk_size]
+
+    async def agenerate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        # Native coroutine: no worker thread needed for a pure in-memory lookup.
+        return self._respond(messages)
+
     def get_token_usage(self) -> Dict[str, int]:
         return {"total": 42}
 
     def count_tokens(self, text: str) -> int:
         return len(text) // 4
+
+    async def acount_tokens(self, text: str) -> int:
+        return self.count_tokens(text)
+
+class CountingMockLLM(MockLLM):
+    """
+    A MockLLM that counts the requests it answers (generate, stream and agenerate alike), split
+    into routing calls and generation calls, for tests asserting which LLM calls were made.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+        self.routing_calls = 0
+        self.generation_calls = 0
+        self._count_lock = threading.Lock()
+
+    def _respond(self, messages: Sequence[Message]) -> str:
+        with self._count_lock:
+            self.calls += 1
+            if self._is_routing(messages):
+                self.routing_calls += 1
+            else:
+                self.generation_calls += 1
+        return super()._respond(messages)
+
+class LatencyMockLLM(MockLLM):
+    """
+    A MockLLM that sleeps before answering, to simulate provider latency in benchmarks and load tests.
+    Routing calls (Router prompts) and generation calls use separate latency distributions.
+
+    A distribution is a number (constant seconds), a callable taking a random.Random, or a tuple:
+    ("const", s), ("uniform", low, high), ("normal", mean, stddev) or ("lognormal", median, sigma).
+    Sampling is seeded, so runs are reproducible.
+    """
+    def __init__(self, *args, routing_latency: Any = 0.0, generation_latency: Any = 0.0, seed: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.routing_latency = routing_latency
+        self.generation_latency = generation_latency
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _sample(self, distribution: Any) -> float:
+        with self._lock:
+            if callable(distribution):
+                value = distribution(self._random)
+            elif isinstance(distribution, (int, float)):
+                value = distribution
+            else:
+                kind, *params = distribution
+                if kind == "const":
+                    value = params[0]
+                elif kind == "uniform":
+                    value = self._random.uniform(*params)
+                elif kind == "normal":
+                    value = self._random.gauss(*params)
+                elif kind == "lognormal":
+                    median, sigma = params
+                    value = median * math.exp(self._random.gauss(0.0, sigma))
+                else:
+                    raise ValueError(f"Unknown latency distribution: {kind}")
+        return max(0.0, value)
+
+    def _latency(self, messages: Sequence[Message]) -> float:
+        return self._sample(self.routing_latency if self._is_routing(messages) else self.generation_latency)
+
+    def generate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        delay = self._latency(messages)
+        if delay:
+            time.sleep(delay) # sleep(0) still yields the GIL and costs ~0.1ms
+        return self._respond(messages)
+
+    def stream(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> Iterator[str]:
+        delay = self._latency(messages)
+        if delay:
+            time.sleep(delay)
+        yield from super().stream(messages, system_prompt, tools, **kwargs)
+
+    async def agenerate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        await asyncio.sleep(self._latency(messages))
+        return self._respond(messages)
+
+class FaultyMockLLM(LatencyMockLLM):
+    """
+    A LatencyMockLLM that injects failures, to test retry, timeout and circuit-breaker handling.
+
+    - `fail_first`: the first N calls raise `error`.
+    - `failure_rate`: afterwards, each call raises `error` with this probability (seeded).
+    - `error`: an exception class or a zero-argument factory (default ConnectionError, a transient error).
+    Slow calls are simulated with the latency distributions. `calls` counts every attempt.
+    """
+    def __init__(self, *args, failure_rate: float = 0.0, fail_first: int = 0, error: Any = ConnectionError, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failure_rate = failure_rate
+        self.fail_first = fail_first
+        self.error = error
+        self.calls = 0
+
+    def _maybe_fail(self):
+        with self._lock:
+            self.calls += 1
+            fail = self.calls <= self.fail_first or (self.failure_rate and self._random.random() < self.failure_rate)
+        if fail:
+            raise self.error("Injected LLM failure")
+
+    def generate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        self._maybe_fail()
+        return super().generate(messages, system_prompt, tools, **kwargs)
+
+    def stream(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> Iterator[str]:
+        self._maybe_fail()
+        yield from super().stream(messages, system_prompt, tools, **kwargs)
+
+    async def agenerate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        self._maybe_fail()
+        return await super().agenerate(messages, system_prompt, tools, **kwargs)
@@ -0,0 +1,146 @@
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
+from ..types import Expert, Message
+from .base import BaseLLM
+
+class _RoleLLM(BaseLLM):
+    """
+    Wraps the LLM serving one role and records the token usage of each call in the registry.
+    Anything else (count_tokens, model attributes, ...) is passed through.
+    """
+    def __init__(self, llm: BaseLLM, role: str, registry: "LLMRegistry"):
+        self.llm = llm
+        self.role = role
+        self.registry = registry
+
+    def __getattr__(self, name: str):
+        return getattr(self.llm, name)
+
+    def generate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        response = self.llm.generate(messages, system_prompt=system_prompt, tools=tools, **kwargs)
+        self.registry._record(self.role, self.llm)
+        return response
+
+    def stream(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> Iterator[str]:
+        yield from self.llm.stream(messages, system_prompt=system_prompt, tools=tools, **kwargs)
+        self.registry._record(self.role, self.llm)
+
+    async def agenerate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        response = await self.llm.agenerate(messages, system_prompt=system_prompt, tools=tools, **kwargs)
+        self.registry._record(self.role, self.llm)
+        return response
+
+    def get_token_usage(self) -> Dict[str, int]:
+        return self.llm.get_token_usage()
+
+    def count_tokens(self, text: str) -> int:
+        return self.llm.count_tokens(text)
+
+    async def acount_tokens(self, text: str) -> int:
+        return await self.llm.acount_tokens(text)
+
+class LLMRegistry:
+    """
+    Decides which LLM serves each role, so routing and summarization can run on a small,
+    fast model while each expert generates with its own.
+
+    Roles are "router", "summarizer" and "generation" (expert replies). A role is configured
+    with an LLM instance or a model name; model names are turned into instances by
+    `factory(model_name)` (e.g. `GeminiLLM(...).with_model`), once per name, and reused.
+
+    Experts are resolved in order: `experts[expert.name]`, then `Expert.model_name` through the
+    factory (when a factory is set and the expert sets `model_name` explicitly), then the
+    "generation" role, then `default`.
+
+    Token usage of every call is accumulated per role and per model (`get_token_usage`).
+    Pass the registry as the `llm` of both `Router` and `Flow`.
+    """
+    ROUTER = "router"
+    SUMMARIZER = "summarizer"
+    GENERATION = "generation"
+
+    def __init__(self, default: BaseLLM, router: Union[BaseLLM, str, None] = None, summarizer: Union[BaseLLM, str, None] = None,
+                 generation: Union[BaseLLM, str, None] = None, experts: Optional[Dict[str, Union[BaseLLM, str]]] = None,
+                 factory: Optional[Callable[[str], BaseLLM]] = None):
+        self.default = default
+        self.factory = factory
+        self.roles = {self.ROUTER: router, self.SUMMARIZER: summarizer, self.GENERATION: generation}
+        self.experts = dict(experts or {})
+        self._models: Dict[str, BaseLLM] = {} # model name -> instance created by the factory
+        self._wrapped: Dict[tuple, _RoleLLM] = {}
+        self._usage: Dict[str, Dict[str, int]] = {}
+        self._model_usage: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _instance(self, spec: Union[BaseLLM, str, None]) -> Optional[BaseLLM]:
+        if spec is None or not isinstance(spec, str):
+            return spec
+        if self.factory is None:
+            raise ValueError(f"LLMRegistry needs a factory to create model '{spec}'")
+        with self._lock:
+            llm = self._models.get(spec)
+            if llm is None:
+                llm = self.factory(spec)
+                self._models[spec] = llm
+            return llm
+
+    def _wrap(self, role: str, llm: BaseLLM) -> _RoleLLM:
+        key = (role, id(llm))
+        wrapped = self._wrapped.get(key)
+        if wrapped is None:
+            with self._lock:
+                wrapped = self._wrapped.setdefault(key, _RoleLLM(llm, role, self))
+        return wrapped
+
+    def for_role(self, role: str) -> BaseLLM:
+        """
+        Returns the LLM for "router", "summarizer" or "generation" (falling back to `default`).
+        """
+        llm = self._instance(self.roles.get(role)) or self.default
+        return self._wrap(role, llm)
+
+    @staticmethod
+    def _chose_model(expert: Expert) -> bool:
+        # `model_name` always has a value: only an explicitly set (or non-default) one picks a model,
+        # otherwise the "generation" role and `default` would never be reached
+        return bool(expert.model_name) and (
+            "model_name" in expert.model_fields_set or expert.model_name != Expert.model_fields["model_name"].default
+        )
+
+    def for_expert(self, expert: Expert) -> BaseLLM:
+        """
+        Returns the LLM that generates replies for `expert`.
+        """
+        spec = self.experts.get(expert.name)
+        if spec is None and self.factory is not None and self._chose_model(expert):
+            spec = expert.model_name
+        llm = self._instance(spec) or self._instance(self.roles[self.GENERATION]) or self.default
+        return self._wrap(self.GENERATION, llm)
+
+    @property
+    def router(self) -> BaseLLM:
+        return self.for_role(self.ROUTER)
+
+    @property
+    def summarizer(self) -> BaseLLM:
+        return self.for_role(self.SUMMARIZER)
+
+    def _record(self, role: str, llm: BaseLLM):
+        usage = llm.get_token_usage() or {}
+        model = getattr(llm, "model_name", None) or type(llm).__name__
+        with self._lock:
+            for bucket in (self._usage.setdefault(role, {"calls": 0}), self._model_usage.setdefault(model, {"calls": 0})):
+                bucket["calls"] += 1
+                for key, value in usage.items():
+                    if isinstance(value, int):
+                        bucket[key] = bucket.get(key, 0) + value
+
+    def get_token_usage(self) -> Dict[str, Any]:
+        """
+        Returns accumulated usage: {"roles": {role: {"calls", "total", ...}}, "models": {model_name: {...}}}.
+        """
+        with self._lock:
+            return {
+                "roles": {role: dict(usage) for role, usage in self._usage.items()},
+                "models": {model: dict(usage) for model, usage in self._model_usage.items()},
+            }
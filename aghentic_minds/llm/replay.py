@@ -0,0 +1,281 @@
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from ..types import Message
+from ..utils import estimate_tokens
+from .base import BaseLLM
+
+# Per-call plumbing that doesn't change the response (Flow passes the user as session_id)
+IGNORED_KWARGS = {"session_id"}
+
+class ReplayMissError(LookupError):
+    """Raised by ReplayLLM when a request was never recorded and there is no fallback."""
+
+def request_key(messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+    """
+    Stable hash of an LLM request: message roles and contents, system prompt, tool names
+    and model parameters. Message metadata and cached token counts are not part of it.
+    """
+    payload = {
+        "messages": [[m.role, m.content] for m in messages],
+        "system_prompt": system_prompt,
+        "tools": [getattr(tool, "__name__", repr(tool)) for tool in tools or []],
+        "kwargs": {k: v for k, v in kwargs.items() if k not in IGNORED_KWARGS},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+class Recording:
+    """
+    One recorded call: the response, its stream chunks (None for `generate` calls),
+    token usage, total latency and time to first chunk, in seconds.
+    """
+    __slots__ = ("response", "chunks", "usage", "latency", "first_chunk_latency")
+
+    def __init__(self, response: str, usage: Dict[str, int], latency: float,
+                 chunks: Optional[List[str]] = None, first_chunk_latency: Optional[float] = None):
+        self.response = response
+        self.chunks = chunks
+        self.usage = usage
+        self.latency = latency
+        self.first_chunk_latency = first_chunk_latency
+
+class ReplayStore:
+    """
+    Recorded LLM calls in a SQLite database (WAL mode, keyed by `request_key`).
+    With `preload=True` all recordings are read into a dict on open, so lookups during
+    a replay are O(1) and never touch the disk; otherwise each lookup is a primary-key query.
+    Recording the same request again replaces the earlier recording.
+    """
+
+    def __init__(self, path: str = "replay.db", preload: bool = True):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS recordings (key TEXT PRIMARY KEY, response TEXT NOT NULL, chunks TEXT, "
+            "usage TEXT NOT NULL, latency REAL NOT NULL, first_chunk_latency REAL, model TEXT, recorded_at REAL NOT NULL)"
+        )
+        self._entries: Optional[Dict[str, Recording]] = None
+        if preload:
+            rows = self._conn.execute(
+                "SELECT key, response, chunks, usage, latency, first_chunk_latency FROM recordings"
+            ).fetchall()
+            self._entries = {row[0]: self._recording(row[1:]) for row in rows}
+
+    @staticmethod
+    def _recording(row) -> Recording:
+        response, chunks, usage, latency, first_chunk_latency = row
+        return Recording(response, json.loads(usage), latency,
+                         json.loads(chunks) if chunks is not None else None, first_chunk_latency)
+
+    def get(self, key: str) -> Optional[Recording]:
+        if self._entries is not None:
+            return self._entries.get(key)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, chunks, usage, latency, first_chunk_latency FROM recordings WHERE key = ?", (key,)
+            ).fetchone()
+        return self._recording(row) if row is not None else None
+
+    def put(self, key: str, recording: Recording, model: Optional[str] = None):
+        chunks = json.dumps(recording.chunks) if recording.chunks is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO recordings (key, response, chunks, usage, latency, first_chunk_latency, model, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET response = excluded.response, "
+                "chunks = excluded.chunks, usage = excluded.usage, latency = excluded.latency, "
+                "first_chunk_latency = excluded.first_chunk_latency, model = excluded.model, recorded_at = excluded.recorded_at",
+                (key, recording.response, chunks, json.dumps(recording.usage), recording.latency,
+                 recording.first_chunk_latency, model, time.time())
+            )
+            if self._entries is not None:
+                self._entries[key] = recording
+
+    def __len__(self) -> int:
+        if self._entries is not None:
+            return len(self._entries)
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM recordings").fetchone()[0]
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class RecordingLLM(BaseLLM):
+    """
+    Wraps any BaseLLM and writes every successful call (response, token usage, measured
+    latency and, for streams, the chunks and time to first chunk) to a ReplayStore.
+    Failed calls and streams abandoned before their end are not recorded.
+    """
+    def __init__(self, llm: BaseLLM, store: ReplayStore):
+        self.llm = llm
+        self.store = store
+        self.model = getattr(llm, "model_name", type(llm).__name__)
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        return getattr(self.llm, name)
+
+    def _record(self, key: str, recording: Recording):
+        self.store.put(key, recording, self.model)
+        with self._lock:
+            self.recorded += 1
+
+    def generate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        started = time.perf_counter()
+        response = self.llm.generate(messages, system_prompt=system_prompt, tools=tools, **kwargs)
+        latency = time.perf_counter() - started
+        self._record(request_key(messages, system_prompt, tools, **kwargs),
+                     Recording(response, dict(self.llm.get_token_usage()), latency))
+        return response
+
+    def stream(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> Iterator[str]:
+        started = time.perf_counter()
+        chunks, first_chunk_latency = [], None
+        for chunk in self.llm.stream(messages, system_prompt=system_prompt, tools=tools, **kwargs):
+            if first_chunk_latency is None:
+                first_chunk_latency = time.perf_counter() - started
+            chunks.append(chunk)
+            yield chunk
+        latency = time.perf_counter() - started
+        self._record(request_key(messages, system_prompt, tools, **kwargs),
+                     Recording("".join(chunks), dict(self.llm.get_token_usage()), latency, chunks, first_chunk_latency))
+
+    async def agenerate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        started = time.perf_counter()
+        response = await self.llm.agenerate(messages, system_prompt=system_prompt, tools=tools, **kwargs)
+        latency = time.perf_counter() - started
+        # SQLite writes are short; doing them inline keeps the recording in call order
+        self._record(request_key(messages, system_prompt, tools, **kwargs),
+                     Recording(response, dict(self.llm.get_token_usage()), latency))
+        return response
+
+    def get_token_usage(self) -> Dict[str, int]:
+        return self.llm.get_token_usage()
+
+    def count_tokens(self, text: str) -> int:
+        return self.llm.count_tokens(text)
+
+    async def acount_tokens(self, text: str) -> int:
+        return await self.llm.acount_tokens(text)
+
+class ReplayLLM(BaseLLM):
+    """
+    Serves responses recorded by RecordingLLM, without network access.
+
+    - Requests are matched by `request_key` (O(1) with a preloaded store).
+    - `replay_latency=True` sleeps for the recorded latency (times `latency_scale`) before answering,
+      so Flow can be benchmarked offline with a production latency profile. Recorded streams are
+      replayed chunk by chunk: the first chunk after the recorded time to first chunk, the others
+      spread evenly over the rest of the recorded latency.
+    - Unrecorded requests go to `fallback` if given, else raise ReplayMissError.
+    """
+    def __init__(self, store: ReplayStore, replay_latency: bool = False, latency_scale: float = 1.0,
+                 fallback: Optional[BaseLLM] = None):
+        self.store = store
+        self.replay_latency = replay_latency
+        self.latency_scale = latency_scale
+        self.fallback = fallback
+        self.stats = {"hits": 0, "misses": 0, "replayed_latency": 0.0}
+        self._last_usage = {"total": 0}
+        # Per-thread usage of the last call, as in GeminiLLM
+        self._thread_usage = threading.local()
+        self._lock = threading.Lock()
+
+    def _lookup(self, messages: Sequence[Message], system_prompt: str, tools: List[Any], kwargs: Dict[str, Any]) -> Optional[Recording]:
+        key = request_key(messages, system_prompt, tools, **kwargs)
+        recording = self.store.get(key)
+        with self._lock:
+            if recording is None:
+                self.stats["misses"] += 1
+            else:
+                self.stats["hits"] += 1
+                self.stats["replayed_latency"] += self._delay(recording.latency)
+        if recording is None and self.fallback is None:
+            raise ReplayMissError(f"No recording for request {key[:12]}")
+        return recording
+
+    def _delay(self, latency: Optional[float]) -> float:
+        return (latency or 0.0) * self.latency_scale if self.replay_latency else 0.0
+
+    def _stream_delays(self, recording: Recording) -> List[float]:
+        """Sleep before each recorded chunk."""
+        first = min(recording.first_chunk_latency or 0.0, recording.latency)
+        rest = len(recording.chunks) - 1
+        between = (recording.latency - first) / rest if rest else 0.0
+        return [self._delay(first)] + [self._delay(between)] * rest
+
+    def generate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        recording = self._lookup(messages, system_prompt, tools, kwargs)
+        if recording is None:
+            response = self.fallback.generate(messages, system_prompt=system_prompt, tools=tools, **kwargs)
+            self._set_usage(self.fallback.get_token_usage())
+            return response
+        delay = self._delay(recording.latency)
+        if delay:
+            time.sleep(delay)
+        self._set_usage(dict(recording.usage))
+        return recording.response
+
+    def stream(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> Iterator[str]:
+        recording = self._lookup(messages, system_prompt, tools, kwargs)
+        if recording is None:
+            yield from self.fallback.stream(messages, system_prompt=system_prompt, tools=tools, **kwargs)
+            self._set_usage(self.fallback.get_token_usage())
+            return
+        if not recording.chunks:
+            # Recorded with `generate`: one chunk once the whole latency has passed
+            chunks, delays = [recording.response], [self._delay(recording.latency)]
+        else:
+            chunks, delays = recording.chunks, self._stream_delays(recording)
+        for chunk, delay in zip(chunks, delays):
+            if delay:
+                time.sleep(delay)
+            yield chunk
+        self._set_usage(dict(recording.usage))
+
+    async def agenerate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        recording = self._lookup(messages, system_prompt, tools, kwargs)
+        if recording is None:
+            response = await self.fallback.agenerate(messages, system_prompt=system_prompt, tools=tools, **kwargs)
+            self._set_usage(self.fallback.get_token_usage())
+            return response
+        delay = self._delay(recording.latency)
+        if delay:
+            await asyncio.sleep(delay)
+        self._set_usage(dict(recording.usage))
+        return recording.response
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["replayed_latency"] = round(stats["replayed_latency"], 4)
+        return stats
+
+    def _set_usage(self, usage: Dict[str, int]):
+        self._last_usage = self._thread_usage.last = usage
+
+    def get_token_usage(self) -> Dict[str, int]:
+        return getattr(self._thread_usage, "last", self._last_usage)
+
+    def count_tokens(self, text: str) -> int:
+        if self.fallback is not None:
+            return self.fallback.count_tokens(text)
+        return estimate_tokens(text)
+
+    async def acount_tokens(self, text: str) -> int:
+        if self.fallback is not None:
+            return await self.fallback.acount_tokens(text)
+        return estimate_tokens(text)
@@ -0,0 +1,424 @@
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+from ..types import Message
+from .base import BaseLLM
+
+# HTTP status codes worth retrying (google-genai APIError exposes them as `code`)
+TRANSIENT_CODES = {408, 429, 500, 502, 503, 504}
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when an LLM call misses its deadline."""
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the provider while the circuit breaker is open."""
+
+def is_transient(error: Exception) -> bool:
+    """
+    Default retry policy: timeouts, connection errors and 408/429/5xx API errors.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code in TRANSIENT_CODES
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive transient failures and rejects calls for
+    `reset_timeout` seconds. Then a single trial call is let through (half-open):
+    success closes the breaker, failure opens it again.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def release(self):
+        """Ends a call without a verdict (cancelled or interrupted): a half-open trial may run again."""
+        with self._lock:
+            self._trial_running = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+class ResilientLLM(BaseLLM):
+    """
+    Wraps any BaseLLM with per-call deadlines, retries, hedged requests and a circuit breaker,
+    so one slow or failing provider call doesn't stall the turn.
+
+    - `timeout`: seconds one attempt may take before LLMTimeoutError (None: no limit).
+      `deadline` bounds the whole call, retries and backoff included.
+    - Transient errors (`retry_on(error)`, default `is_transient`) are retried up to
+      `max_retries` times with full-jitter exponential backoff (`backoff` * 2^attempt, capped at `max_backoff`).
+      Other errors are raised immediately.
+    - `hedge=True`: if an attempt hasn't answered after `hedge_delay` seconds, a second identical
+      request is fired and whichever answers first wins. With `hedge_delay=None` the delay is the
+      `hedge_quantile` of recent call latencies (no hedging until `hedge_min_samples` calls were seen).
+    - The circuit breaker opens after `failure_threshold` consecutive transient failures;
+      calls then fail fast with CircuitOpenError for `reset_timeout` seconds.
+
+    Sync calls with a timeout or hedging run on a private thread pool (`max_workers`); a timed-out
+    request can't be cancelled and finishes in the background. Streams are retried only until
+    their first chunk and are neither hedged nor timed; the breaker records their outcome once
+    the first chunk arrives (and a transient error after it as a failure).
+    """
+    def __init__(self, llm: BaseLLM, timeout: Optional[float] = None, deadline: Optional[float] = None,
+                 max_retries: int = 2, backoff: float = 0.2, max_backoff: float = 5.0,
+                 retry_on: Callable[[Exception], bool] = is_transient,
+                 hedge: bool = False, hedge_delay: Optional[float] = None, hedge_quantile: float = 0.95, hedge_min_samples: int = 20,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0, max_workers: int = 32, seed: Optional[int] = None):
+        self.llm = llm
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_on = retry_on
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_workers = max_workers
+        self.stats = {"calls": 0, "retries": 0, "timeouts": 0, "hedged": 0, "hedge_wins": 0, "failures": 0, "short_circuited": 0}
+
+        self._latencies = deque(maxlen=256) # Recent successful attempt latencies (seconds)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        # Attempts with a timeout or hedge run on pool threads: their token usage is
+        # carried back to the calling thread here
+        self._thread_usage = threading.local()
+
+    def __getattr__(self, name: str):
+        return getattr(self.llm, name)
+
+    # --- Policy helpers ---
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _observe(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def current_hedge_delay(self) -> Optional[float]:
+        """
+        Seconds before a hedge request is fired, or None if hedging is off (or still warming up).
+        """
+        if not self.hedge:
+            return None
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.hedge_quantile * len(ordered)))]
+
+    def _backoff(self, attempt: int) -> float:
+        with self._lock:
+            return self._random.uniform(0.0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def _attempt_timeout(self, call_deadline: Optional[float]) -> Optional[float]:
+        if call_deadline is None:
+            return self.timeout
+        remaining = call_deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMTimeoutError("LLM call deadline exceeded")
+        return remaining if self.timeout is None else min(self.timeout, remaining)
+
+    def _should_retry(self, error: Exception, attempt: int, call_deadline: Optional[float]) -> Optional[float]:
+        """
+        Records a failed attempt. Returns the backoff to sleep before retrying, or None to give up.
+        """
+        if isinstance(error, LLMTimeoutError):
+            self._count("timeouts")
+        if not self.retry_on(error):
+            # The provider answered (e.g. a bad request): not a health problem
+            self.breaker.success()
+            return None
+        self.breaker.failure()
+        if attempt >= self.max_retries:
+            return None
+        delay = self._backoff(attempt)
+        if call_deadline is not None and time.monotonic() + delay >= call_deadline:
+            return None
+        self._count("retries")
+        return delay
+
+    def _admit(self, last_error: Optional[Exception]):
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError("LLM circuit breaker is open") from last_error
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["circuit"] = self.breaker.state
+        stats["hedge_delay"] = self.current_hedge_delay()
+        return stats
+
+    # --- Sync ---
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="resilient-llm")
+        return self._pool
+
+    def _attempt(self, call: Callable[[], str], timeout: Optional[float]) -> str:
+        hedge_delay = self.current_hedge_delay()
+        if timeout is None and hedge_delay is None:
+            # Nothing to race against: call inline, no thread hop
+            started = time.monotonic()
+            result = call()
+            self._observe(time.monotonic() - started)
+            return result
+
+        pool = self._executor()
+        started = time.monotonic()
+        end = None if timeout is None else started + timeout
+        pending = {pool.submit(call): started}
+        primary = next(iter(pending))
+        error = None
+        while pending:
+            now = time.monotonic()
+            wait_for = None if end is None else max(0.0, end - now)
+            hedge_at = None
+            if hedge_delay is not None and len(pending) == 1 and primary in pending:
+                hedge_at = started + hedge_delay
+                wait_for = max(0.0, hedge_at - now) if wait_for is None else min(wait_for, max(0.0, hedge_at - now))
+
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                submitted = pending.pop(future)
+                if future.exception() is None:
+                    self._observe(time.monotonic() - submitted)
+                    if future is not primary:
+                        self._count("hedge_wins")
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+
+            now = time.monotonic()
+            if end is not None and now >= end:
+                for other in pending:
+                    other.cancel()
+                raise LLMTimeoutError(f"LLM call timed out after {timeout:.3f}s")
+            if hedge_at is not None and now >= hedge_at and primary in pending:
+                self._count("hedged")
+                pending[pool.submit(call)] = now
+                hedge_delay = None
+            elif error is not None and not pending:
+                raise error
+        raise error
+
+    def _call(self, call: Callable[[], str]) -> str:
+        self._count("calls")
+        call_deadline = None if self.deadline is None else time.monotonic() + self.deadline
+        attempt, last_error = 0, None
+        while True:
+            self._admit(last_error)
+            try:
+                result = self._attempt(call, self._attempt_timeout(call_deadline))
+            except Exception as e:
+                delay = self._should_retry(e, attempt, call_deadline)
+                if delay is None:
+                    self._count("failures")
+                    raise
+                last_error = e
+                attempt += 1
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.success()
+            return result
+
+    def generate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        def call():
+            response = self.llm.generate(messages, system_prompt=system_prompt, tools=tools, **kwargs)
+            return response, self.llm.get_token_usage()
+        response, self._thread_usage.last = self._call(call)
+        return response
+
+    def stream(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> Iterator[str]:
+        self._count("calls")
+        self._thread_usage.last = None
+        attempt, last_error = 0, None
+        while True:
+            self._admit(last_error)
+            try:
+                chunks = self.llm.stream(messages, system_prompt=system_prompt, tools=tools, **kwargs)
+                # Retry only until the first chunk: after that the caller has seen output
+                first = next(chunks, None)
+            except Exception as e:
+                delay = self._should_retry(e, attempt, None)
+                if delay is None:
+                    self._count("failures")
+                    raise
+                last_error = e
+                attempt += 1
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            break
+        # The provider answered: record it now, since the consumer may close the stream early
+        self.breaker.success()
+        if first is None:
+            return
+        yield first
+        try:
+            yield from chunks
+        except Exception as e:
+            # Too late to retry, but a transient failure mid-stream still counts against the provider
+            if self.retry_on(e):
+                self.breaker.failure()
+            self._count("failures")
+            raise
+
+    # --- Async ---
+
+    async def _aattempt(self, make_call: Callable[[], Any], timeout: Optional[float]) -> str:
+        hedge_delay = self.current_hedge_delay()
+        if hedge_delay is None:
+            started = time.monotonic()
+            if timeout is None:
+                result = await make_call()
+            else:
+                try:
+                    result = await asyncio.wait_for(make_call(), timeout)
+                except asyncio.TimeoutError:
+                    raise LLMTimeoutError(f"LLM call timed out after {timeout:.3f}s") from None
+            self._observe(time.monotonic() - started)
+            return result
+
+        started = time.monotonic()
+        end = None if timeout is None else started + timeout
+        primary = asyncio.ensure_future(make_call())
+        pending = {primary: started}
+        error = None
+        try:
+            while pending:
+                now = time.monotonic()
+                wait_for = None if end is None else max(0.0, end - now)
+                hedge_at = None
+                if hedge_delay is not None and len(pending) == 1 and primary in pending:
+                    hedge_at = started + hedge_delay
+                    wait_for = max(0.0, hedge_at - now) if wait_for is None else min(wait_for, max(0.0, hedge_at - now))
+
+                done, _ = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    submitted = pending.pop(task)
+                    if task.exception() is None:
+                        self._observe(time.monotonic() - submitted)
+                        if task is not primary:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+
+                now = time.monotonic()
+                if end is not None and now >= end:
+                    raise LLMTimeoutError(f"LLM call timed out after {timeout:.3f}s")
+                if hedge_at is not None and now >= hedge_at and primary in pending:
+                    self._count("hedged")
+                    pending[asyncio.ensure_future(make_call())] = now
+                    hedge_delay = None
+                elif error is not None and not pending:
+                    raise error
+            raise error
+        finally:
+            # Unlike threads, tasks can be cancelled: stop the losers (or everything, on timeout)
+            for task in pending:
+                task.cancel()
+
+    async def agenerate(self, messages: Sequence[Message], system_prompt: str = None, tools: List[Any] = None, **kwargs) -> str:
+        self._count("calls")
+        self._thread_usage.last = None
+        call_deadline = None if self.deadline is None else time.monotonic() + self.deadline
+        attempt, last_error = 0, None
+        while True:
+            self._admit(last_error)
+            try:
+                result = await self._aattempt(
+                    lambda: self.llm.agenerate(messages, system_prompt=system_prompt, tools=tools, **kwargs),
+                    self._attempt_timeout(call_deadline),
+                )
+            except Exception as e:
+                delay = self._should_retry(e, attempt, call_deadline)
+                if delay is None:
+                    self._count("failures")
+                    raise
+                last_error = e
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled (e.g. a discarded speculative generation): don't leave a half-open trial running
+                self.breaker.release()
+                raise
+            self.breaker.success()
+            return result
+
+    # --- Pass-through ---
+
+    def get_token_usage(self) -> Dict[str, int]:
+        # Set by `generate` on this thread; streams and async calls read the wrapped LLM
+        usage = getattr(self._thread_usage, "last", None)
+        return usage if usage is not None else self.llm.get_token_usage()
+
+    def count_tokens(self, text: str) -> int:
+        return self.llm.count_tokens(text)
+
+    async def acount_tokens(self, text: str) -> int:
+        return await self.llm.acount_tokens(text)
+
+    def close(self):
+        """Releases the worker pool without waiting for requests that are still running."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -1,5 +1,9 @@
-from typing import List, Any
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import List, Any, Dict, Optional
 from .types import Message
+from .utils import estimate_tokens
+from .history import CompactHistory
 
 class PNNet:
     """
@@ -11,7 +15,11 @@ class PNNet:
     def prune(history: List[Message], max_turns: int = 20) -> List[Message]:
         """
         Keeps the history within a manageable size.
+        A CompactHistory is trimmed in place (O(1)); a list is sliced.
         """
+        if isinstance(history, CompactHistory):
+            history.trim(max_turns * 2)
+            return history
         # Simple truncation for now, but can be enhanced with summarization
         if len(history) > max_turns * 2:
             return history[-(max_turns * 2):]
@@ -41,44 +49,315 @@ class PNNet:
         return clean_history
 
     @staticmethod
-    def summarize_if_needed(history: List[Message], llm: Any, token_limit: int = 500, target_tokens: int = 150) -> List[Message]:
+    def count_message_tokens(msg: Message, llm: Any = None, estimate: bool = False) -> int:
         """
-        Checks if history exceeds token_limit. If so, summarizes the older part to target_tokens.
+        Returns the token count of a message, computing it at most once (cached on the message).
+        With estimate=True (or no LLM) a local estimate is used instead of the provider tokenizer.
         """
-        # 1. Count tokens
-        full_text = "\n".join([f"{msg.role}: {msg.content}" for msg in history])
-        
-        current_tokens = 0
-        if hasattr(llm, "count_tokens"):
-            current_tokens = llm.count_tokens(full_text)
+        if msg.token_count is None:
+            text = f"{msg.role}: {msg.content}"
+            if estimate or llm is None or not hasattr(llm, "count_tokens"):
+                msg.token_count = estimate_tokens(text)
+            else:
+                msg.token_count = llm.count_tokens(text)
+        return msg.token_count
+
+    @staticmethod
+    async def acount_message_tokens(msg: Message, llm: Any = None, estimate: bool = False) -> int:
+        """
+        Async variant of `count_message_tokens`.
+        """
+        if msg.token_count is None:
+            text = f"{msg.role}: {msg.content}"
+            if estimate or llm is None or not hasattr(llm, "acount_tokens"):
+                msg.token_count = estimate_tokens(text)
+            else:
+                msg.token_count = await llm.acount_tokens(text)
+        return msg.token_count
+
+    @staticmethod
+    def total_tokens(history: List[Message], llm: Any = None, estimate: bool = False) -> int:
+        """
+        Sums the cached per-message token counts (counting only messages not seen before).
+        """
+        if isinstance(history, CompactHistory):
+            return history.total_tokens(lambda msg: PNNet.count_message_tokens(msg, llm, estimate))
+        return sum(PNNet.count_message_tokens(msg, llm, estimate) for msg in history)
+
+    TRUNCATION_MARKER = " …[truncated]"
+
+    @staticmethod
+    def truncate_message(msg: Message, max_tokens: int, tokens: int) -> Message:
+        """
+        Returns a copy of `msg` (counted at `tokens` tokens) cut down to about `max_tokens` tokens.
+        """
+        keep = max(0, len(msg.content) * max_tokens // max(1, tokens) - len(PNNet.TRUNCATION_MARKER))
+        return msg.model_copy(update={"content": msg.content[:keep] + PNNet.TRUNCATION_MARKER, "token_count": max_tokens})
+
+    @staticmethod
+    def pack_context(history: List[Message], budget: int, llm: Any = None, estimate: bool = True,
+                     max_message_tokens: Optional[int] = None, min_fragment: int = 32) -> List[Message]:
+        """
+        Packs history into `budget` tokens for a generation call, newest messages first.
+        - The latest summary is always kept (truncated if it alone exceeds the budget).
+        - Messages over `max_message_tokens` (default: a quarter of the budget) are truncated.
+        - Packing stops at the first message that doesn't fit, so there are no gaps; with at least
+          `min_fragment` tokens left a truncated copy of it is included.
+        Stored per-message token counts are used; missing ones are computed with `llm` (a local
+        estimate by default). A CompactHistory builds new Messages on access, so its missing counts
+        stay on the returned Messages and its (possibly shared) columns are never written to.
+        Returns a new list in chronological order.
+        """
+        max_message_tokens = max_message_tokens or max(1, budget // 4)
+        count = lambda msg: PNNet.count_message_tokens(msg, llm, estimate)
+
+        # Summaries sit at the head of the history; the last one is the latest
+        summary_index = -1
+        while summary_index + 1 < len(history) and PNNet.is_summary(history[summary_index + 1]):
+            summary_index += 1
+
+        summary, used = None, 0
+        if summary_index >= 0:
+            summary = history[summary_index]
+            used = count(summary)
+            if used > budget:
+                summary, used = PNNet.truncate_message(summary, budget, used), budget
+
+        packed = []
+        for i in range(len(history) - 1, -1, -1):
+            if i == summary_index:
+                continue
+            msg = history[i]
+            tokens = count(msg)
+            if tokens > max_message_tokens:
+                msg, tokens = PNNet.truncate_message(msg, max_message_tokens, tokens), max_message_tokens
+            remaining = budget - used
+            if tokens > remaining:
+                if remaining >= min_fragment:
+                    packed.append(PNNet.truncate_message(msg, remaining, tokens))
+                break
+            packed.append(msg)
+            used += tokens
+
+        packed.reverse()
+        return [summary] + packed if summary is not None else packed
+
+    SUMMARY_SYSTEM_PROMPT = "You are a helpful assistant that summarizes conversation history."
+
+    @staticmethod
+    def _format_history(history: List[Message]) -> str:
+        return "\n".join([f"{msg.role}: {msg.content}" for msg in history])
+
+    SUMMARY_PREFIX = "Previous conversation summary: "
+
+    @staticmethod
+    def is_summary(msg: Message) -> bool:
+        return msg.role == "system" and msg.content.startswith(PNNet.SUMMARY_PREFIX.strip())
+
+    @staticmethod
+    def _summary_request(history: List[Message], target_tokens: int, max_chunks: int = 0):
+        """
+        Plans one incremental summarization step.
+        Returns (kept_prefix, recent_messages, prompt, level), or None when there is nothing to do.
+
+        Only messages that aged out since the last summarization are read:
+        - level 1 ("chunk"): the aged-out messages alone become a new chunk summary,
+          while fewer than `max_chunks` chunks exist.
+        - level 2 ("session"): existing summaries and the aged-out messages are folded into
+          one session summary. With max_chunks=0 every step is a rolling fold.
+        """
+        # Keep last 2 turns (4 messages)
+        if len(history) <= 4:
+            return None
+            
+        head = history[:-4]
+        recent_messages = history[-4:]
+
+        summaries = [msg for msg in head if PNNet.is_summary(msg)]
+        aged_out = [msg for msg in head if not PNNet.is_summary(msg)]
+        chunks = [msg for msg in summaries if msg.metadata.get("summary_level", 1) == 1]
+        session_summaries = [msg for msg in summaries if msg.metadata.get("summary_level", 1) != 1]
+
+        if len(chunks) < max_chunks:
+            if not aged_out:
+                return None
+            prompt = f"Summarize the following conversation excerpt into a concise summary of approximately {target_tokens} tokens. Preserve key information and context.\n\n{PNNet._format_history(aged_out)}"
+            return summaries, recent_messages, prompt, 1
+
+        if not aged_out and len(summaries) <= 1:
+            return None
+
+        text_to_summarize = PNNet._format_history(aged_out)
+        if not summaries:
+            prompt = f"Summarize the following conversation history into a concise summary of approximately {target_tokens} tokens. Preserve key information and context.\n\n{text_to_summarize}"
         else:
-            current_tokens = len(full_text) // 4
+            existing = "\n".join(msg.content[len(PNNet.SUMMARY_PREFIX):] for msg in session_summaries + chunks)
+            prompt = (
+                f"Update the existing conversation summary with the new messages below. Produce a single concise summary "
+                f"of approximately {target_tokens} tokens. Preserve key information and context.\n\n"
+                f"Existing summary:\n{existing}\n\nNew messages:\n{text_to_summarize}"
+            )
+        return [], recent_messages, prompt, 2
+
+    @staticmethod
+    def _summary_message(summary_text: str, level: int) -> Message:
+        return Message(role="system", content=f"{PNNet.SUMMARY_PREFIX}{summary_text}", metadata={"summary_level": level})
+
+    @staticmethod
+    def summarize_if_needed(history: List[Message], llm: Any, token_limit: int = 500, target_tokens: int = 150,
+                            current_tokens: Optional[int] = None, max_chunks: int = 0) -> List[Message]:
+        """
+        Checks if history exceeds token_limit. If so, folds the messages that aged out since the
+        last summarization into the summary (see `_summary_request` for the chunk/session levels).
+        Pass `current_tokens` (e.g. a running total kept by the session) to skip counting.
+        """
+        # 1. Count tokens
+        if current_tokens is None:
+            full_text = PNNet._format_history(history)
+            if hasattr(llm, "count_tokens"):
+                current_tokens = llm.count_tokens(full_text)
+            else:
+                current_tokens = len(full_text) // 4
             
         if current_tokens <= token_limit:
             return history
             
         # 2. Summarize
-        # Keep last 2 turns (4 messages)
-        if len(history) <= 4:
+        request = PNNet._summary_request(history, target_tokens, max_chunks)
+        if request is None:
             return history
-            
-        messages_to_summarize = history[:-4]
-        recent_messages = history[-4:]
-        
-        text_to_summarize = "\n".join([f"{msg.role}: {msg.content}" for msg in messages_to_summarize])
-        
-        prompt = f"Summarize the following conversation history into a concise summary of approximately {target_tokens} tokens. Preserve key information and context.\n\n{text_to_summarize}"
+        kept_prefix, recent_messages, prompt, level = request
         
         try:
             summary_text = llm.generate(
                 messages=[Message(role="user", content=prompt)],
-                system_prompt="You are a helpful assistant that summarizes conversation history."
+                system_prompt=PNNet.SUMMARY_SYSTEM_PROMPT
             )
             
             # Create new history with summary
-            summary_msg = Message(role="system", content=f"Previous conversation summary: {summary_text}")
-            return [summary_msg] + recent_messages
+            return kept_prefix + [PNNet._summary_message(summary_text, level)] + recent_messages
+            
+        except Exception as e:
+            print(f"Summarization failed: {e}")
+            return history
+
+    @staticmethod
+    async def asummarize_if_needed(history: List[Message], llm: Any, token_limit: int = 500, target_tokens: int = 150,
+                                   current_tokens: Optional[int] = None, max_chunks: int = 0) -> List[Message]:
+        """
+        Async variant of `summarize_if_needed`, using `acount_tokens` / `agenerate`.
+        """
+        if current_tokens is None:
+            full_text = PNNet._format_history(history)
+            if hasattr(llm, "acount_tokens"):
+                current_tokens = await llm.acount_tokens(full_text)
+            else:
+                current_tokens = len(full_text) // 4
+            
+        if current_tokens <= token_limit:
+            return history
+            
+        request = PNNet._summary_request(history, target_tokens, max_chunks)
+        if request is None:
+            return history
+        kept_prefix, recent_messages, prompt, level = request
+        
+        try:
+            summary_text = await llm.agenerate(
+                messages=[Message(role="user", content=prompt)],
+                system_prompt=PNNet.SUMMARY_SYSTEM_PROMPT
+            )
+            
+            return kept_prefix + [PNNet._summary_message(summary_text, level)] + recent_messages
             
         except Exception as e:
             print(f"Summarization failed: {e}")
             return history
+
+class BackgroundSummarizer:
+    """
+    Runs PNNet summarization in a worker pool so it stays off the response critical path.
+    A finished summary is swapped into the session on its next turn via `apply`.
+    At most one summarization per session is in flight at a time.
+    """
+
+    def __init__(self, llm: Any, token_limit: int = 500, target_tokens: int = 150, max_workers: int = 2, estimate_tokens: bool = False,
+                 max_chunks: int = 0):
+        self.llm = llm
+        self.token_limit = token_limit
+        self.target_tokens = target_tokens
+        self.max_chunks = max_chunks
+        self.estimate_tokens = estimate_tokens
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summarizer")
+        self._pending: Dict[Any, Future] = {}
+        self._lock = threading.Lock()
+
+    def _summarize(self, snapshot: List[Message]):
+        request = PNNet._summary_request(snapshot, self.target_tokens, self.max_chunks)
+        if request is None:
+            return None
+        kept_prefix, recent_messages, prompt, level = request
+        summary_text = self.llm.generate(
+            messages=[Message(role="user", content=prompt)],
+            system_prompt=PNNet.SUMMARY_SYSTEM_PROMPT
+        )
+        summary_msg = PNNet._summary_message(summary_text, level)
+        PNNet.count_message_tokens(summary_msg, self.llm, self.estimate_tokens)
+        covered = [(msg.role, msg.content) for msg in snapshot[:len(snapshot) - len(recent_messages)]]
+        return covered, kept_prefix + [summary_msg]
+
+    def submit(self, session_key: Any, history: List[Message], current_tokens: int) -> bool:
+        """
+        Schedules a summarization if the history is over the limit and none is already running.
+        Returns True if a job was started.
+        """
+        if current_tokens <= self.token_limit or len(history) <= 4:
+            return False
+        with self._lock:
+            if session_key in self._pending:
+                return False
+            self._pending[session_key] = self._executor.submit(self._summarize, history[:])
+        return True
+
+    def apply(self, session_key: Any, history: List[Message]) -> Optional[List[Message]]:
+        """
+        Returns the history with a finished summary swapped in, or None if there is nothing to apply.
+        The summary is discarded if the summarized prefix is no longer at the head of the history
+        (e.g. it was pruned or sanitized in the meantime).
+        """
+        with self._lock:
+            future = self._pending.get(session_key)
+            if future is None or not future.done():
+                return None
+            del self._pending[session_key]
+
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Summarization failed: {e}")
+            return None
+        if result is None:
+            return None
+
+        covered, replacement = result
+        if len(history) < len(covered):
+            return None
+        for msg, (role, content) in zip(history, covered):
+            if msg.role != role or msg.content != content:
+                return None
+        return replacement + history[len(covered):]
+
+    def pending(self, session_key: Any) -> bool:
+        with self._lock:
+            return session_key in self._pending
+
+    def join(self, timeout: Optional[float] = None):
+        """
+        Waits for every in-flight summarization to finish.
+        """
+        with self._lock:
+            futures = list(self._pending.values())
+        wait(futures, timeout=timeout)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
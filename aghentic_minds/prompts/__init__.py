@@ -1,5 +1,16 @@
 import os
+from functools import lru_cache
 
+# Prompt registry: name -> path inside this package. Files are read on first access
+# (PEP 562 module __getattr__) and memoized, so importing the package does no disk I/O.
+PROMPTS = {
+    # Quick Start Prompts
+    "QUICK_START_ORCHESTRATOR": ("orchestrator", "quick_start", "orchestrator.md"),
+    "QUICK_START_SALES": ("experts", "quick_start", "sales_expert.md"),
+    "QUICK_START_SUPPORT": ("experts", "quick_start", "support_expert.md"),
+}
+
+@lru_cache(maxsize=None)
 def _load_prompt(path_parts):
     """Reads a prompt file from within the package."""
     base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -10,7 +21,14 @@ def _load_prompt(path_parts):
     except FileNotFoundError:
         return f"Error: Prompt file not found at {file_path}"
 
-# Quick Start Prompts
-QUICK_START_ORCHESTRATOR = _load_prompt(["orchestrator", "quick_start", "orchestrator.md"])
-QUICK_START_SALES = _load_prompt(["experts", "quick_start", "sales_expert.md"])
-QUICK_START_SUPPORT = _load_prompt(["experts", "quick_start", "support_expert.md"])
\ No newline at end of file
+def get_prompt(name: str) -> str:
+    """Returns a registered prompt by name (e.g. "QUICK_START_SALES"), reading it at most once."""
+    return _load_prompt(PROMPTS[name])
+
+def __getattr__(name):
+    if name in PROMPTS:
+        return get_prompt(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + list(PROMPTS))
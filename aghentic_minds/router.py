@@ -1,12 +1,23 @@
-from typing import List, Optional
+import hashlib
+import threading
+from typing import List, Optional, Union
 from .types import Expert, Message
 from .llm.base import BaseLLM
-from .utils import Colors
+from .llm.registry import LLMRegistry
+from .cache import CacheBackend
+from .utils import Colors, estimate_tokens, normalize_message
+
+# Small-talk utterances given to the auto-created orchestrator so the fast path
+# can settle "thanks" / "ok" style messages without an LLM call.
+SMALL_TALK_EXAMPLES = ["hi", "hello", "hey there", "thanks", "thank you", "ok", "okay", "cool", "bye", "good morning"]
 
 class Router:
-    def __init__(self, experts: List[Expert], llm: BaseLLM, default_expert: Optional[Expert] = None):
+    def __init__(self, experts: List[Expert], llm: Union[BaseLLM, LLMRegistry], default_expert: Optional[Expert] = None,
+                 fast_path_threshold: Optional[float] = None, fast_path_margin: float = 0.1,
+                 cache: Optional[CacheBackend] = None, prefilter_k: Optional[int] = None):
         self.experts = {e.name: e for e in experts}
-        self.llm = llm
+        # With an LLMRegistry, classification runs on its "router" model (ideally the cheapest tier)
+        self.llm = llm.router if isinstance(llm, LLMRegistry) else llm
         
         # 1. Orchestrator Default Mitigation
         # If no default expert is provided, we create a generic "Orchestrator"
@@ -18,7 +29,8 @@ class Router:
                 self.default_expert = Expert(
                     name="orchestrator",
                     description="Handles general queries, greetings, and routing to other experts.",
-                    system_prompt="You are a helpful AI assistant. You handle general queries and help route users to the right expert if needed."
+                    system_prompt="You are a helpful AI assistant. You handle general queries and help route users to the right expert if needed.",
+                    examples=SMALL_TALK_EXAMPLES
                 )
                 self.experts[self.default_expert.name] = self.default_expert
         else:
@@ -26,56 +38,229 @@ class Router:
             if default_expert.name not in self.experts:
                 self.experts[default_expert.name] = default_expert
 
-    def classify(self, user_message: str, current_expert_name: str, recent_history: List[str] = None) -> str:
+        # 2. Fast-path tier
+        # A local n-gram index over expert descriptions + examples. When its best match
+        # clears the threshold (and beats the runner-up by the margin) we skip the LLM call.
+        # Leave the threshold as None to always use the LLM classifier.
+        self.fast_path_threshold = fast_path_threshold
+        self.fast_path_margin = fast_path_margin
+        self._index = None
+        # With many experts, only the top `prefilter_k` candidates (ranked by the same n-gram index)
+        # are listed in the LLM prompt, plus the current and default experts.
+        self.prefilter_k = prefilter_k
+
+        # 3. Decision cache
+        # LLM decisions keyed on (expert set hash, current expert, normalized message).
+        # The expert set hash is part of the key, so changing experts invalidates old entries
+        # even when the backend is shared between workers.
+        self.cache = cache
+        self._experts_hash = ""
+        self._on_experts_changed()
+
+        # Per-tier decision counters, used to tune the threshold
+        self.tier_stats = {"cache": 0, "fast_path": 0, "llm": 0}
+        # Size of the classification prompts sent to the LLM (estimated tokens)
+        self.prompt_stats = {"prompts": 0, "tokens": 0}
+        # One Router is shared by all of a Flow's threads: counters are updated under a lock
+        self._stats_lock = threading.Lock()
+
+    def _on_experts_changed(self):
+        digest = hashlib.sha1(self.default_expert.name.encode())
+        for name in sorted(self.experts):
+            digest.update(f"\0{name}\0{self.experts[name].description}".encode())
+        self._experts_hash = digest.hexdigest()[:16]
+        self._compile_catalog()
+        if self.fast_path_threshold is not None or self.prefilter_k is not None:
+            self._build_index()
+
+    def add_expert(self, expert: Expert):
         """
-        Determines the best expert to handle the user message.
+        Registers (or replaces) an expert and invalidates routing state derived from the expert set.
         """
-        # Construct the classification prompt
-        experts_desc = "\n".join([f"- '{name}': {expert.description}" for name, expert in self.experts.items()])
-        
-        history_text = ""
+        self.experts[expert.name] = expert
+        self._on_experts_changed()
+
+    def remove_expert(self, name: str):
+        """
+        Unregisters an expert. The default expert cannot be removed.
+        """
+        if name == self.default_expert.name:
+            raise ValueError(f"Cannot remove the default expert '{name}'")
+        self.experts.pop(name, None)
+        self._on_experts_changed()
+
+    def _cache_key(self, user_message: str, current_expert_name: str) -> str:
+        raw = f"{self._experts_hash}\0{current_expert_name}\0{normalize_message(user_message)}"
+        return "route:" + hashlib.sha1(raw.encode()).hexdigest()
+
+    def _cached(self, user_message: str, current_expert_name: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        name = self.cache.get(self._cache_key(user_message, current_expert_name))
+        # Guard against entries written by a worker with a different expert set
+        return name if name in self.experts else None
+
+    def _build_index(self):
+        from .embedding import NgramIndex
+        documents = {name: [expert.description] + list(expert.examples) for name, expert in self.experts.items()}
+        self._index = NgramIndex().fit(documents)
+
+    def _fast_path(self, user_message: str) -> Optional[str]:
+        """
+        Returns an expert name when the local index is confident, otherwise None.
+        """
+        if self._index is None or self.fast_path_threshold is None:
+            return None
+        name, score, margin = self._index.best(user_message)
+        if name is not None and score >= self.fast_path_threshold and margin >= self.fast_path_margin:
+            return name
+        return None
+
+    def get_stats(self) -> dict:
+        """
+        Returns per-tier decision counts and hit rates.
+        """
+        with self._stats_lock:
+            stats = dict(self.tier_stats)
+            prompts, prompt_tokens = self.prompt_stats["prompts"], self.prompt_stats["tokens"]
+        total = sum(stats.values())
+        for tier in list(stats):
+            stats[f"{tier}_rate"] = stats[tier] / total if total else 0.0
+        if self.cache is not None:
+            stats["cache_backend"] = self.cache.get_stats()
+        stats["avg_prompt_tokens"] = prompt_tokens / prompts if prompts else 0.0
+        return stats
+
+    def _compile_catalog(self):
+        """
+        Precompiles the static parts of the classification prompt (done only when the expert set changes).
+        The static head (instructions + expert catalog) comes first so providers can reuse it as a cached prefix.
+        """
+        self._catalog_lines = {name: f"- {name}: {' '.join(expert.description.split())}" for name, expert in self.experts.items()}
+        self._prompt_intro = "You are an Intent Router. Pick the expert that should answer the user's message.\nExperts:\n"
+        self._prompt_head = self._prompt_intro + "\n".join(self._catalog_lines.values())
+        self._prompt_rules = (
+            "Keep the current expert if the message fits its domain; switch only when another expert clearly covers it; "
+            f"if unsure or for chit-chat, answer {self.default_expert.name}.\nOutput ONLY the expert name."
+        )
+
+    def _candidates(self, user_message: str, current_expert_name: str) -> Optional[List[str]]:
+        """
+        The experts to list in the prompt: everyone, or with `prefilter_k` the top-k by n-gram
+        similarity plus the current and default experts.
+        """
+        if self.prefilter_k is None or self._index is None or len(self.experts) <= self.prefilter_k:
+            return None
+        names = [name for name, _ in self._index.rank(user_message, self.prefilter_k)]
+        for name in (current_expert_name, self.default_expert.name):
+            if name in self.experts and name not in names:
+                names.append(name)
+        return names
+
+    def _build_prompt(self, user_message: str, current_expert_name: str, recent_history: List[str] = None) -> str:
+        candidates = self._candidates(user_message, current_expert_name)
+        if candidates is None:
+            head = self._prompt_head
+        else:
+            head = self._prompt_intro + "\n".join(self._catalog_lines[name] for name in candidates)
+
+        parts = [head, f"Current Expert: {current_expert_name}"]
         if recent_history:
-            history_text = "\nRecent Context:\n" + "\n".join([f"- {msg}" for msg in recent_history[-5:]])
+            parts.append("Recent Context:\n" + "\n".join(f"- {msg}" for msg in recent_history[-5:]))
+        parts.append(f'User Message: "{user_message}"')
+        parts.append(self._prompt_rules)
+        prompt = "\n".join(parts)
 
-        prompt = f"""
-        You are an Intent Router.
-        
-        Current Expert: {current_expert_name}
-        {history_text}
-        User Message: "{user_message}"
-        
-        Available Experts:
-        {experts_desc}
-        
-        Task: Determine if the user's intent requires switching to a different expert.
+        tokens = estimate_tokens(prompt)
+        with self._stats_lock:
+            self.prompt_stats["prompts"] += 1
+            self.prompt_stats["tokens"] += tokens
+        return prompt
+
+    def _resolve_prediction(self, response_text: str, current_expert_name: str) -> str:
+        predicted_expert = response_text.strip().lower()
         
-        Rules:
-        1. If the user's request matches the Current Expert's domain, keep it.
-        2. If the user explicitly asks for a topic covered by another expert, switch.
-        3. If unsure, or for general chit-chat, default to '{self.default_expert.name}'.
+        # Validate
+        # We do a loose match or exact match
+        for name in self.experts.keys():
+            if name.lower() == predicted_expert:
+                return name
         
-        Output ONLY the expert name.
+        return current_expert_name
+
+    def _warn_fallback(self, current_expert_name: str):
+        # The LLM class handles printing the specific error (e.g. API key issues)
+        # We just log a small warning here to indicate routing failed.
+        print(f"{Colors.YELLOW}Router warning: Failed to classify intent. Staying with {current_expert_name}.{Colors.ENDC}")
+
+    def _local_decision(self, user_message: str, current_expert_name: str) -> Optional[str]:
+        """
+        Tries the cheap tiers (cache, then fast path). Returns None when the LLM is needed.
+        """
+        cached_choice = self._cached(user_message, current_expert_name)
+        if cached_choice is not None:
+            self._count_tier("cache")
+            return cached_choice
+
+        fast_choice = self._fast_path(user_message)
+        if fast_choice is not None:
+            self._count_tier("fast_path")
+            return fast_choice
+
+        self._count_tier("llm")
+        return None
+
+    def _count_tier(self, tier: str):
+        with self._stats_lock:
+            self.tier_stats[tier] += 1
+
+    def _remember(self, user_message: str, current_expert_name: str, choice: str):
+        if self.cache is not None:
+            self.cache.set(self._cache_key(user_message, current_expert_name), choice)
+
+    def classify(self, user_message: str, current_expert_name: str, recent_history: List[str] = None) -> str:
+        """
+        Determines the best expert to handle the user message.
         """
+        local_choice = self._local_decision(user_message, current_expert_name)
+        if local_choice is not None:
+            return local_choice
+
+        prompt = self._build_prompt(user_message, current_expert_name, recent_history)
 
         try:
             # We wrap the prompt in a Message object
             messages = [Message(role="user", content=prompt)]
             
             response_text = self.llm.generate(messages=messages)
-            predicted_expert = response_text.strip().lower()
-            
-            # Validate
-            # We do a loose match or exact match
-            for name in self.experts.keys():
-                if name.lower() == predicted_expert:
-                    return name
+            choice = self._resolve_prediction(response_text, current_expert_name)
+            self._remember(user_message, current_expert_name, choice)
+            return choice
             
+        except Exception as e:
+            self._warn_fallback(current_expert_name)
             return current_expert_name
+
+    async def aclassify(self, user_message: str, current_expert_name: str, recent_history: List[str] = None) -> str:
+        """
+        Async variant of `classify`, awaiting `BaseLLM.agenerate`.
+        """
+        local_choice = self._local_decision(user_message, current_expert_name)
+        if local_choice is not None:
+            return local_choice
+
+        prompt = self._build_prompt(user_message, current_expert_name, recent_history)
+
+        try:
+            messages = [Message(role="user", content=prompt)]
+            
+            response_text = await self.llm.agenerate(messages=messages)
+            choice = self._resolve_prediction(response_text, current_expert_name)
+            self._remember(user_message, current_expert_name, choice)
+            return choice
             
         except Exception as e:
-            # The LLM class handles printing the specific error (e.g. API key issues)
-            # We just log a small warning here to indicate routing failed.
-            print(f"{Colors.YELLOW}Router warning: Failed to classify intent. Staying with {current_expert_name}.{Colors.ENDC}")
+            self._warn_fallback(current_expert_name)
             return current_expert_name
 
     def get_expert(self, name: str) -> Expert:
@@ -1,74 +1,257 @@
-import os
-import json
-import datetime
-from typing import Dict, List, Any, Optional
-from .types import Expert, Message, TurnResponse
+import time
+import asyncio
+import weakref
+import threading
+import contextlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Tuple, Union
+from .types import Expert, Message, TurnResponse, TurnChunk, BatchResult
 from .router import Router
-from .memory import PNNet
+from .memory import PNNet, BackgroundSummarizer
+from .store import SessionStore, InMemorySessionStore
+from .history import CompactHistory
 from .llm.base import BaseLLM
 from .llm.mock import MockLLM
+from .llm.registry import LLMRegistry
+from .debug import DebugWriter
+from .cache import ResponseCache
+from .tracing import Tracer, NullTracer, SPAN_TURN, SPAN_ROUTE, SPAN_CONTEXT, SPAN_GENERATE, SPAN_PRUNE, SPAN_SUMMARIZE, SPAN_DEBUG_LOG, SPAN_RESPONSE_CACHE
 from .utils import Colors
 
 class Flow:
-    def __init__(self, router: Router, llm: BaseLLM, debug: bool = False, optimize: bool = False):
+    def __init__(self, router: Router, llm: Union[BaseLLM, LLMRegistry], debug: bool = False, optimize: bool = False, speculative: bool = False, max_workers: int = 8,
+                 store: Optional[SessionStore] = None, estimate_tokens: bool = False, background_summarize: bool = False,
+                 summary_chunks: int = 0, tracer: Optional[Tracer] = None,
+                 debug_format: str = "snapshot", debug_dir: str = "debug-cache", compact_history: bool = True,
+                 max_turns: int = 20, lock_stripes: int = 64,
+                 response_cache: Optional[ResponseCache] = None):
         self.router = router
-        self.llm = llm
+        # `llm` may be an LLMRegistry: expert replies then use each expert's model and summaries
+        # the "summarizer" model. `self.llm` is the default model (also used for token counting).
+        self.llms = llm if isinstance(llm, LLMRegistry) else LLMRegistry(llm)
+        self.llm = self.llms.default
         self.debug = debug
         self.optimize = optimize
+        # With optimize=True each message is token-counted once and the session keeps a running total.
+        # estimate_tokens=True uses a local estimate instead of the provider tokenizer (no network calls).
+        self.estimate_tokens = estimate_tokens
+        # Summaries are incremental: only messages that aged out since the last one are read.
+        # summary_chunks > 0 keeps up to that many chunk summaries before folding them into a session summary.
+        self.summary_chunks = summary_chunks
+        # background_summarize=True moves summarization to a worker pool; the summary is applied on the next turn.
+        self._summarizer = (
+            BackgroundSummarizer(self.llms.summarizer, estimate_tokens=estimate_tokens, max_chunks=summary_chunks)
+            if optimize and background_summarize else None
+        )
         self._mock_notice_shown = False
-            
-        # In-memory storage for demo purposes. 
-        # In production, this should be replaced by a persistent store (Redis/Mongo).
-        self._sessions: Dict[str, Dict[str, Any]] = {} 
-        
-        # Ensure debug cache directory exists
-        if self.debug:
-            os.makedirs("debug-cache", exist_ok=True)
+
+        # Speculative mode: generate with the current expert while the router classifies.
+        # If the router keeps the expert we use that response, otherwise it is discarded.
+        # A turn only speculates when a worker is idle: a queued speculation would make a hit wait
+        # for work that hasn't started, so with more concurrent turns than `max_workers` the rest skip it.
+        self.speculative = speculative
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="flow") if speculative else None
+        self._speculating = 0 # Speculations submitted and not finished (guarded by self._lock)
+        self.speculation_stats = {"turns": 0, "hits": 0, "misses": 0, "skipped": 0, "time_saved": 0.0}
+
+        # Session state is loaded from the store at the start of each turn and saved at the end.
+        # Defaults to an unbounded in-process store; pass InMemorySessionStore(max_sessions=..., idle_ttl=...),
+        # SQLiteSessionStore or RedisSessionStore to bound memory or share sessions between workers.
+        self.store = store if store is not None else InMemorySessionStore()
+        # Histories are kept as CompactHistory (columnar, Messages built on demand) instead of
+        # lists of Message models, which cuts per-session memory for long-lived sessions.
+        self.compact_history = compact_history
+        # History keeps the last max_turns turns. Compact histories are bounded buffers: old
+        # messages drop off in O(1), and router/LLM calls get cached lines and views, not copies.
+        self.max_turns = max_turns
+
+        # Spans for route / context / generate / prune / summarize / debug_log (and the whole turn).
+        # The default NullTracer records nothing; use MetricsTracer for histograms and a Prometheus export.
+        self.tracer = tracer if tracer is not None else NullTracer()
+
+        # Debug snapshots are written by a background thread (latest snapshot per user, compact JSON
+        # or appended JSONL with debug_format="jsonl"), so debug mode doesn't slow down turns.
+        self._debug_writer = DebugWriter(debug_dir, format=debug_format) if debug else None
+
+        # Opt-in reply cache: a repeated question (same expert and recent context) skips generation.
+        # Cached replies still go through history, pruning and summarization like generated ones.
+        self.response_cache = response_cache
+
+        # One Flow can serve concurrent callers. A turn claims its user for its whole duration, so
+        # turns of the same user run in order while different users run in parallel. Claims are
+        # tracked per stripe (one of `lock_stripes`, picked by hashing the user id); the stripe lock
+        # is only held to take or release a claim, never while a turn runs or a stream is suspended.
+        # Sessions are copy-on-write: a turn edits its own copy and publishes it with store.save,
+        # so readers never see a half-applied turn.
+        self._session_conditions = [threading.Condition() for _ in range(max(1, lock_stripes))]
+        self._active_users = [set() for _ in self._session_conditions]
+        # Async callers queue on a per-user asyncio.Lock first (per event loop, dropped once unused), so
+        # coroutines of one loop never wait for each other in executor threads the running turn may need.
+        self._async_locks: "weakref.WeakKeyDictionary[Any, weakref.WeakValueDictionary]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock() # Flow-wide state: speculation stats, mock notice, async locks
 
     def _get_session(self, user_id: str) -> Dict[str, Any]:
-        if user_id not in self._sessions:
-            self._sessions[user_id] = {
+        session = self.store.load(user_id)
+        if session is None:
+            session = {
                 "history": [],
                 "current_expert": self.router.default_expert.name
             }
-        return self._sessions[user_id]
+            return session
+        # Copy-on-write: the stored session (and its history) is never modified in place
+        return dict(session)
+
+    def _stripe(self, user_id: Optional[str]) -> int:
+        return hash(user_id) % len(self._session_conditions)
+
+    def _claim_user(self, stripe: int, user_id: Optional[str], blocking: bool = True) -> bool:
+        condition, active = self._session_conditions[stripe], self._active_users[stripe]
+        with condition:
+            while user_id in active:
+                if not blocking:
+                    return False
+                condition.wait()
+            active.add(user_id)
+            return True
+
+    def _release_user(self, stripe: int, user_id: Optional[str]):
+        condition = self._session_conditions[stripe]
+        with condition:
+            self._active_users[stripe].discard(user_id)
+            condition.notify_all()
+
+    @contextlib.contextmanager
+    def _user_turn(self, user_id: Optional[str]):
+        """
+        Runs the block as the user's only turn in progress (waits for an earlier one to finish).
+        """
+        stripe = self._stripe(user_id)
+        self._claim_user(stripe, user_id)
+        try:
+            yield
+        finally:
+            self._release_user(stripe, user_id)
+
+    def _async_lock(self, user_id: Optional[str]) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            locks = self._async_locks.get(loop)
+            if locks is None:
+                locks = self._async_locks[loop] = weakref.WeakValueDictionary()
+            lock = locks.get(user_id)
+            if lock is None:
+                lock = locks[user_id] = asyncio.Lock()
+            return lock
+
+    @contextlib.asynccontextmanager
+    async def _auser_turn(self, user_id: Optional[str]):
+        """
+        Async variant of `_user_turn` (claims are shared with the sync entry points).
+        Coroutines of this event loop wait on an asyncio.Lock. Only a claim held elsewhere
+        (a sync caller or another loop) is waited for in a worker thread; that holder doesn't
+        need this loop's executor to finish, so the wait can't starve it.
+        """
+        stripe = self._stripe(user_id)
+        async with self._async_lock(user_id):
+            if not self._claim_user(stripe, user_id, blocking=False):
+                claiming = asyncio.get_running_loop().run_in_executor(None, self._claim_user, stripe, user_id)
+                try:
+                    await asyncio.shield(claiming)
+                except asyncio.CancelledError:
+                    # The worker still gets the claim eventually: hand it back
+                    claiming.add_done_callback(lambda _: self._release_user(stripe, user_id))
+                    raise
+            try:
+                yield
+            finally:
+                self._release_user(stripe, user_id)
+
+    def close(self):
+        """
+        Releases background resources (worker threads) and writes pending debug snapshots.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._summarizer is not None:
+            self._summarizer.close()
+        if self._debug_writer is not None:
+            self._debug_writer.close()
+
+    def get_token_usage(self) -> Dict[str, Any]:
+        """
+        Returns token usage accumulated per role (router / summarizer / generation) and per model.
+        Router calls are included when the Router was given the same LLMRegistry.
+        """
+        return self.llms.get_token_usage()
+
+    def get_speculation_stats(self) -> Dict[str, Any]:
+        """
+        Returns how often speculative generation was kept, how many turns skipped it because
+        every worker was busy, and the estimated time it saved (seconds).
+        """
+        with self._lock:
+            stats = dict(self.speculation_stats)
+        stats["hit_rate"] = stats["hits"] / stats["turns"] if stats["turns"] else 0.0
+        return stats
+
+    def _speculate(self, session: Dict[str, Any], message: str, user_id: str) -> Optional[Future]:
+        """
+        Starts generating with the current expert on an idle worker.
+        Returns None (and counts the turn as skipped) when every worker is busy.
+        """
+        with self._lock:
+            if self._speculating >= self.max_workers:
+                self.speculation_stats["skipped"] += 1
+                return None
+            self._speculating += 1
+        future = self._executor.submit(
+            self._generate, session["history"], message, self.router.get_expert(session["current_expert"]), user_id
+        )
+        # Runs when the generation finishes or is cancelled before it started
+        future.add_done_callback(self._speculation_done)
+        return future
+
+    def _speculation_done(self, future: Future):
+        with self._lock:
+            self._speculating -= 1
+
+    def _record_speculation(self, hit: bool, classify_time: float = 0.0, generate_time: float = 0.0, elapsed: float = 0.0):
+        with self._lock:
+            self.speculation_stats["turns"] += 1
+            if hit:
+                self.speculation_stats["hits"] += 1
+                # Sequentially this turn would have cost classify + generate.
+                self.speculation_stats["time_saved"] += classify_time + generate_time - elapsed
+            else:
+                self.speculation_stats["misses"] += 1
 
     def _log_debug_memory(self, user_id: str, expert_name: str, history: List[Message]):
         """
-        Logs the memory context to a file for debugging purposes.
-        Overwrites the file for the same user to keep a single debug file.
+        Queues a snapshot of the memory context for the debug writer.
+        Only the latest snapshot per user is kept (debug-cache/{user_id}_debug.json by default).
         """
-        if not self.debug:
+        if self._debug_writer is None:
             return
 
-        filename = f"debug-cache/{user_id}_debug.json"
-        
-        try:
-            # Convert Message objects to serializable dicts
-            serializable_history = [msg.model_dump() for msg in history]
-            
-            # Wrap in a dict to include metadata since we removed it from filename
-            debug_data = {
-                "last_updated": datetime.datetime.now().isoformat(),
-                "current_expert": expert_name,
-                "history": serializable_history
-            }
+        with self.tracer.span(SPAN_DEBUG_LOG, messages=len(history)):
+            self._debug_writer.submit(user_id, expert_name, history)
 
-            with open(filename, "w", encoding="utf-8") as f:
-                json.dump(debug_data, f, indent=2)
-        except Exception as e:
-            print(f"Debug Log Error: {e}")
+    def _router_context(self, history: List[Message]) -> List[str]:
+        # Extract simple text history for the router
+        if isinstance(history, CompactHistory):
+            return history.routing_lines(5)
+        return [f"{m.role}: {m.content}" for m in history[-5:]]
 
-    def process_turn(self, message: str, user_id: Optional[str] = None) -> TurnResponse:
-        session = self._get_session(user_id)
+    def _apply_routing(self, session: Dict[str, Any], next_expert_name: str):
+        """
+        Applies the router decision to the session.
+        Returns (expert, history, switched).
+        """
         current_expert_name = session["current_expert"]
         history = session["history"]
 
-        # 1. Classify / Route
-        # Extract simple text history for the router
-        text_history = [f"{m.role}: {m.content}" for m in history[-5:]]
-        next_expert_name = self.router.classify(message, current_expert_name, text_history)
-        
         switched = next_expert_name != current_expert_name
         if switched:
 
@@ -78,56 +261,96 @@ class Flow:
             session["current_expert"] = next_expert_name
             current_expert_name = next_expert_name
 
-        current_expert = self.router.get_expert(current_expert_name)
-
-        # 2. Prepare Context for LLM
-        # We construct the messages list for the LLM
-        
-        # Note: In a real chat session, we might not want to append system prompt to history list permanently
-        # but send it as part of the request.
-        
-        # 2.5 Debug Logging
-        # We log the history before appending the new message for debugging state
-        self._log_debug_memory(user_id, current_expert_name, history)
-
-        # 3. Generate Response
-        response_text = "Error: LLM not initialized."
-        token_usage = {"total": 0}
-        
-        try:
-            # Prepare messages for generation: History + New Message
-            # We don't modify the persistent history yet
-            messages_for_llm = history.copy()
-            messages_for_llm.append(Message(role="user", content=message))
-            
-            response_text = self.llm.generate(
-                messages=messages_for_llm,
-                system_prompt=current_expert.system_prompt,
-                tools=current_expert.tools
-            )
-            
-            token_usage = self.llm.get_token_usage()
-
-        except Exception as e:
-            print(f"{Colors.RED}Error generating response: {e}{Colors.ENDC}")
-            if "API_KEY_INVALID" in str(e) or "API key not valid" in str(e):
-                print(f"{Colors.YELLOW}API key is required. Provide it directly or set GOOGLE_API_KEY in the environment. \nIf you don't have one, create one for free at https://aistudio.google.com/api-keys/{Colors.ENDC}")
-            response_text = "I encountered a system error. Please check the console logs."
-
-        # 4. Update History
-        # We append the user message and the assistant response to our internal history
-        history.append(Message(role="user", content=message, metadata={"expert": current_expert_name}))
-        history.append(Message(role="assistant", content=response_text, metadata={"expert": current_expert_name}))
-        
-        # Prune if too long
-        session["history"] = PNNet.prune(history)
-
-        # Summarize if optimize is enabled
-        if self.optimize:
-             session["history"] = PNNet.summarize_if_needed(session["history"], self.llm)
+        return self.router.get_expert(current_expert_name), history, switched
+
+    def _generation_messages(self, history: List[Message], message: str, expert: Optional[Expert] = None, span: Any = None) -> List[Message]:
+        # Prepare messages for generation: History + New Message
+        # We don't modify the persistent history yet
+        if expert is not None and expert.context_budget:
+            # Pack the history newest-first into what the expert's budget leaves after the new message.
+            # The new message gets the same per-message cap as history (a quarter of the budget),
+            # so an oversized one can't crowd out the summary or push the call over budget.
+            budget = expert.context_budget
+            user_message = Message(role="user", content=message)
+            # Counted like the rest of the session (provider tokenizer unless estimate_tokens=True)
+            user_tokens = PNNet.count_message_tokens(user_message, self.llm, self.estimate_tokens)
+            max_message_tokens = max(1, budget // 4)
+            if user_tokens > max_message_tokens:
+                user_message, user_tokens = PNNet.truncate_message(user_message, max_message_tokens, user_tokens), max_message_tokens
+            packed = PNNet.pack_context(history, max(0, budget - user_tokens), self.llm, self.estimate_tokens)
+            packed.append(user_message)
+            if span is not None:
+                span.set(packed=len(packed) - 1, tokens=sum(msg.token_count for msg in packed))
+            return packed
+        if isinstance(history, CompactHistory):
+            # A real list (adapters may concatenate or append to it), built from the columns in one pass
+            return list(history.window(extra=(Message(role="user", content=message),)))
+        messages_for_llm = history.copy()
+        messages_for_llm.append(Message(role="user", content=message))
+        return messages_for_llm
+
+    def _generation_error(self, e: Exception) -> str:
+        print(f"{Colors.RED}Error generating response: {e}{Colors.ENDC}")
+        if "API_KEY_INVALID" in str(e) or "API key not valid" in str(e):
+            print(f"{Colors.YELLOW}API key is required. Provide it directly or set GOOGLE_API_KEY in the environment. \nIf you don't have one, create one for free at https://aistudio.google.com/api-keys/{Colors.ENDC}")
+        return "I encountered a system error. Please check the console logs."
+
+    def _turn_messages(self, message: str, response_text: str, expert_name: str) -> List[Message]:
+        return [
+            Message(role="user", content=message, metadata={"expert": expert_name}),
+            Message(role="assistant", content=response_text, metadata={"expert": expert_name}),
+        ]
+
+    def _commit_turn(self, session: Dict[str, Any], history: List[Message], new_messages: List[Message]):
+        # The running token total is only valid if history is still the stored list (not sanitized)
+        running_total = session.get("tokens") if history is session["history"] else None
+
+        max_messages = self.max_turns * 2
 
+        with self.tracer.span(SPAN_PRUNE) as span:
+            # Messages that will age out of the window once the new turn is added
+            # (only needed to keep the running token total)
+            excess = max(0, len(history) + len(new_messages) - max_messages)
+            dropped = history[:excess] if excess and self.optimize and running_total is not None else []
+
+            # We append the user message and the assistant response to a new history: the published one
+            # may still be read (store readers, debug snapshots, LLM calls that outlived a timeout).
+            # A CompactHistory fork shares storage (O(1)) and drops the oldest messages itself.
+            if self.compact_history:
+                history = CompactHistory.of(history.fork() if isinstance(history, CompactHistory) else history, max_messages)
+                history.extend(new_messages)
+            else:
+                history = history + new_messages
+
+            # Prune if too long
+            pruned = PNNet.prune(history, self.max_turns)
+            session["history"] = pruned
+            span.set(messages=len(pruned), dropped=excess)
+
+            if self.optimize:
+                if running_total is None:
+                    session["tokens"] = PNNet.total_tokens(pruned, self.llm, self.estimate_tokens)
+                else:
+                    session["tokens"] = (running_total
+                                         + sum(msg.token_count for msg in new_messages)
+                                         - PNNet.total_tokens(dropped, self.llm, self.estimate_tokens))
+
+    def _apply_pending_summary(self, user_id: Optional[str], session: Dict[str, Any]):
+        # Swap in a summary finished in the background since the last turn
+        if self._summarizer is None:
+            return
+        summarized = self._summarizer.apply(user_id, session["history"])
+        if summarized is not None:
+            session["history"] = summarized
+            session["tokens"] = PNNet.total_tokens(summarized, self.llm, self.estimate_tokens)
+
+    def _show_mock_notice(self):
         # Check for MockLLM notice (Show only once)
         if isinstance(self.llm, MockLLM) and not self._mock_notice_shown:
+             with self._lock:
+                 if self._mock_notice_shown:
+                     return
+                 self._mock_notice_shown = True
              # Helper for terminal hyperlinks: \033]8;;URL\033\\TEXT\033]8;;\033\\
              def link(text, url):
                  return f"\033]8;;{url}\033\\{text}\033]8;;\033\\"
@@ -144,11 +367,409 @@ class Flow:
              print("│  OR                                                                    │")
              print(f"│  python simple_example.py ({link('Link', simp_url)})" + " " * 39 + "│")
              print(f"└────────────────────────────────────────────────────────────────────────┘{Colors.ENDC}")
-             self._mock_notice_shown = True
 
-        return TurnResponse(
-            content=response_text,
-            agent_name=current_expert_name,
-            switched_context=switched,
-            token_usage=token_usage
-        )
+    def _lookup_response(self, history: List[Message], message: str, expert: Expert):
+        """
+        Returns (cache, cached_reply): the response cache to store the reply in (None if the
+        expert is not cached) and the reply found in it, if any.
+        """
+        if self.response_cache is None or not ResponseCache.enabled_for(expert):
+            return None, None
+        with self.tracer.span(SPAN_RESPONSE_CACHE, expert=expert.name) as span:
+            cached = self.response_cache.get(expert.name, message, history)
+            span.set(hit=cached is not None)
+        return self.response_cache, cached
+
+    @staticmethod
+    def _trace_usage(span: Any, token_usage: Dict[str, int]):
+        span.set(tokens=token_usage.get("total", 0), cached_tokens=token_usage.get("cached", 0))
+
+    def _generate(self, history: List[Message], message: str, expert: Expert, user_id: Optional[str] = None):
+        """
+        Runs the expert generation call. Returns (response_text, token_usage, duration).
+        """
+        started = time.perf_counter()
+        cache, cached = self._lookup_response(history, message, expert)
+        if cached is not None:
+            return cached, {"total": 0}, time.perf_counter() - started
+        with self.tracer.span(SPAN_CONTEXT, messages=len(history)) as span:
+            messages = self._generation_messages(history, message, expert, span)
+        llm = self.llms.for_expert(expert)
+        with self.tracer.span(SPAN_GENERATE, expert=expert.name) as span:
+            try:
+                response_text = llm.generate(
+                    messages=messages,
+                    system_prompt=expert.system_prompt,
+                    tools=expert.tools,
+                    session_id=user_id
+                )
+                token_usage = llm.get_token_usage()
+                if cache is not None and response_text:
+                    cache.put(expert.name, message, history, response_text)
+            except Exception as e:
+                response_text = self._generation_error(e)
+                token_usage = {"total": 0}
+                span.set(error=type(e).__name__)
+            self._trace_usage(span, token_usage)
+        return response_text, token_usage, time.perf_counter() - started
+
+    async def _agenerate(self, history: List[Message], message: str, expert: Expert, user_id: Optional[str] = None):
+        started = time.perf_counter()
+        cache, cached = self._lookup_response(history, message, expert)
+        if cached is not None:
+            return cached, {"total": 0}, time.perf_counter() - started
+        with self.tracer.span(SPAN_CONTEXT, messages=len(history)) as span:
+            messages = self._generation_messages(history, message, expert, span)
+        llm = self.llms.for_expert(expert)
+        with self.tracer.span(SPAN_GENERATE, expert=expert.name) as span:
+            try:
+                response_text = await llm.agenerate(
+                    messages=messages,
+                    system_prompt=expert.system_prompt,
+                    tools=expert.tools,
+                    session_id=user_id
+                )
+                token_usage = llm.get_token_usage()
+                if cache is not None and response_text:
+                    cache.put(expert.name, message, history, response_text)
+            except Exception as e:
+                response_text = self._generation_error(e)
+                token_usage = {"total": 0}
+                span.set(error=type(e).__name__)
+            self._trace_usage(span, token_usage)
+        return response_text, token_usage, time.perf_counter() - started
+
+    def _count_new_messages(self, messages: List[Message]):
+        # With optimize=True every stored message carries its token count (for the running total)
+        if self.optimize:
+            for msg in messages:
+                PNNet.count_message_tokens(msg, self.llm, self.estimate_tokens)
+
+    async def _acount_new_messages(self, messages: List[Message]):
+        if self.optimize:
+            for msg in messages:
+                await PNNet.acount_message_tokens(msg, self.llm, self.estimate_tokens)
+
+    def _summarizes_inline(self, user_id: Optional[str], session: Dict[str, Any]) -> bool:
+        """
+        Hands the committed history to the background summarizer if there is one.
+        Returns True when the turn has to summarize it itself (optimize=True, no background summarizer).
+        """
+        if self._summarizer is not None:
+            self._summarizer.submit(user_id, session["history"], session["tokens"])
+            return False
+        return self.optimize
+
+    def _apply_summary(self, session: Dict[str, Any], summarized: List[Message], span: Any):
+        changed = summarized is not session["history"]
+        if changed:
+            # The new summary message was counted by the caller; the rest already were
+            session["history"] = summarized
+            session["tokens"] = PNNet.total_tokens(summarized, self.llm, self.estimate_tokens)
+        span.set(summarized=changed, tokens_after=session["tokens"])
+
+    def _save_session(self, user_id: Optional[str], session: Dict[str, Any]):
+        self.store.save(user_id, session)
+        self._show_mock_notice()
+
+    def _finish_turn(self, user_id: Optional[str], session: Dict[str, Any], history: List[Message], message: str, response_text: str, expert_name: str):
+        """
+        Appends the turn to history, prunes/summarizes and saves the session.
+        """
+        new_messages = self._turn_messages(message, response_text, expert_name)
+        self._count_new_messages(new_messages)
+        self._commit_turn(session, history, new_messages)
+
+        if self._summarizes_inline(user_id, session):
+            with self.tracer.span(SPAN_SUMMARIZE, tokens_before=session["tokens"]) as span:
+                summarized = PNNet.summarize_if_needed(session["history"], self.llms.summarizer, current_tokens=session["tokens"], max_chunks=self.summary_chunks)
+                if summarized is not session["history"]:
+                    self._count_new_messages(summarized[:1])
+                self._apply_summary(session, summarized, span)
+
+        self._save_session(user_id, session)
+
+    async def _afinish_turn(self, user_id: Optional[str], session: Dict[str, Any], history: List[Message], message: str, response_text: str, expert_name: str):
+        """
+        Async variant of `_finish_turn`: token counting and summarization are awaited,
+        and the session is saved off the event loop (see `_off_loop`).
+        """
+        new_messages = self._turn_messages(message, response_text, expert_name)
+        await self._acount_new_messages(new_messages)
+        self._commit_turn(session, history, new_messages)
+
+        if self._summarizes_inline(user_id, session):
+            with self.tracer.span(SPAN_SUMMARIZE, tokens_before=session["tokens"]) as span:
+                summarized = await PNNet.asummarize_if_needed(session["history"], self.llms.summarizer, current_tokens=session["tokens"], max_chunks=self.summary_chunks)
+                if summarized is not session["history"]:
+                    await self._acount_new_messages(summarized[:1])
+                self._apply_summary(session, summarized, span)
+
+        await self._off_loop(self._save_session, user_id, session)
+
+    async def _off_loop(self, fn, *args):
+        # Stores that do I/O (SQLite, Redis) run in a worker thread so they don't block the event loop
+        if self.store.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def process_turn(self, message: str, user_id: Optional[str] = None) -> TurnResponse:
+        """
+        Routes the message, generates the reply and updates the user's session.
+        Safe to call from several threads; turns of the same user run one at a time.
+        """
+        with self._user_turn(user_id), self.tracer.span(SPAN_TURN) as turn:
+            session = self._get_session(user_id)
+            self._apply_pending_summary(user_id, session)
+            started = time.perf_counter()
+
+            # 0. Speculation: start generating with the current expert before routing finishes
+            speculation = self._speculate(session, message, user_id) if self.speculative else None
+
+            # 1. Classify / Route
+            with self.tracer.span(SPAN_ROUTE) as span:
+                next_expert_name = self.router.classify(message, session["current_expert"], self._router_context(session["history"]))
+                classify_time = time.perf_counter() - started
+                current_expert, history, switched = self._apply_routing(session, next_expert_name)
+                span.set(expert=current_expert.name, switched=switched)
+
+            # 2. Debug Logging
+            # We log the history before appending the new message for debugging state
+            self._log_debug_memory(user_id, current_expert.name, history)
+
+            # 3. Generate Response
+            if speculation is not None and not switched:
+                response_text, token_usage, generate_time = speculation.result()
+                self._record_speculation(True, classify_time, generate_time, time.perf_counter() - started)
+            else:
+                if speculation is not None:
+                    # The router switched experts: the speculative answer is thrown away.
+                    speculation.cancel()
+                    self._record_speculation(False)
+                response_text, token_usage, _ = self._generate(history, message, current_expert, user_id)
+
+            # 4. Update History
+            self._finish_turn(user_id, session, history, message, response_text, current_expert.name)
+
+            turn.set(expert=current_expert.name, switched=switched, tokens=token_usage.get("total", 0))
+            return TurnResponse(
+                content=response_text,
+                agent_name=current_expert.name,
+                switched_context=switched,
+                token_usage=token_usage
+            )
+
+    def stream_turn(self, message: str, user_id: Optional[str] = None) -> Iterator[TurnChunk]:
+        """
+        Streaming variant of `process_turn`.
+        Yields a "route" chunk (agent_name / switched_context) as soon as routing is done,
+        then "content" chunks as the LLM produces them, and finally a "done" chunk carrying
+        the full content and token usage. History is updated once the stream has ended.
+        The stream keeps its user claimed until it is exhausted or closed: other users' turns
+        (and streams interleaved in the same thread) proceed, but a second turn of the same
+        user waits, so don't start one from the thread that is consuming this stream.
+        """
+        with self._user_turn(user_id), self.tracer.span(SPAN_TURN) as turn:
+            session = self._get_session(user_id)
+            self._apply_pending_summary(user_id, session)
+
+            # 1. Classify / Route
+            with self.tracer.span(SPAN_ROUTE) as span:
+                next_expert_name = self.router.classify(message, session["current_expert"], self._router_context(session["history"]))
+                current_expert, history, switched = self._apply_routing(session, next_expert_name)
+                span.set(expert=current_expert.name, switched=switched)
+            yield TurnChunk(type="route", agent_name=current_expert.name, switched_context=switched)
+
+            # 2. Debug Logging
+            self._log_debug_memory(user_id, current_expert.name, history)
+
+            # 3. Stream Response
+            # (the generate span includes the time the consumer spends between chunks)
+            parts = []
+            token_usage = {"total": 0}
+            cache, cached = self._lookup_response(history, message, current_expert)
+            if cached is not None:
+                # A cached reply is sent as a single chunk
+                parts.append(cached)
+                yield TurnChunk(type="content", content=cached, agent_name=current_expert.name, switched_context=switched)
+            else:
+                with self.tracer.span(SPAN_CONTEXT, messages=len(history)) as span:
+                    messages = self._generation_messages(history, message, current_expert, span)
+                llm = self.llms.for_expert(current_expert)
+                with self.tracer.span(SPAN_GENERATE, expert=current_expert.name) as span:
+                    try:
+                        for text in llm.stream(
+                            messages=messages,
+                            system_prompt=current_expert.system_prompt,
+                            tools=current_expert.tools,
+                            session_id=user_id
+                        ):
+                            if text:
+                                parts.append(text)
+                                yield TurnChunk(type="content", content=text, agent_name=current_expert.name, switched_context=switched)
+                        token_usage = llm.get_token_usage()
+                        if cache is not None and parts:
+                            cache.put(current_expert.name, message, history, "".join(parts))
+                    except Exception as e:
+                        error_text = self._generation_error(e)
+                        parts.append(error_text)
+                        span.set(error=type(e).__name__)
+                        yield TurnChunk(type="content", content=error_text, agent_name=current_expert.name, switched_context=switched)
+                    self._trace_usage(span, token_usage)
+
+            # 4. Update History
+            response_text = "".join(parts)
+            self._finish_turn(user_id, session, history, message, response_text, current_expert.name)
+            turn.set(expert=current_expert.name, switched=switched, tokens=token_usage.get("total", 0))
+
+            yield TurnChunk(type="done", content=response_text, agent_name=current_expert.name, switched_context=switched, token_usage=token_usage)
+
+    async def aprocess_turn(self, message: str, user_id: Optional[str] = None) -> TurnResponse:
+        """
+        Async variant of `process_turn`.
+        Routing, generation and summarization are awaited, so a single event loop
+        can keep many turns in flight at once.
+        """
+        async with self._auser_turn(user_id):
+            return await self._aprocess_turn(message, user_id)
+
+    async def _aprocess_turn(self, message: str, user_id: Optional[str] = None) -> TurnResponse:
+        with self.tracer.span(SPAN_TURN) as turn:
+            session = await self._off_loop(self._get_session, user_id)
+            self._apply_pending_summary(user_id, session)
+            started = time.perf_counter()
+
+            # 0. Speculation: start generating with the current expert before routing finishes
+            speculation = None
+            if self.speculative:
+                speculation = asyncio.create_task(
+                    self._agenerate(session["history"], message, self.router.get_expert(session["current_expert"]), user_id)
+                )
+
+            # 1. Classify / Route
+            with self.tracer.span(SPAN_ROUTE) as span:
+                next_expert_name = await self.router.aclassify(message, session["current_expert"], self._router_context(session["history"]))
+                classify_time = time.perf_counter() - started
+                current_expert, history, switched = self._apply_routing(session, next_expert_name)
+                span.set(expert=current_expert.name, switched=switched)
+
+            # 2. Debug Logging
+            # Only queues the snapshot: files are written on the DebugWriter's own thread
+            self._log_debug_memory(user_id, current_expert.name, history)
+
+            # 3. Generate Response
+            if speculation is not None and not switched:
+                response_text, token_usage, generate_time = await speculation
+                self._record_speculation(True, classify_time, generate_time, time.perf_counter() - started)
+            else:
+                if speculation is not None:
+                    speculation.cancel()
+                    self._record_speculation(False)
+                response_text, token_usage, _ = await self._agenerate(history, message, current_expert, user_id)
+
+            # 4. Update History
+            await self._afinish_turn(user_id, session, history, message, response_text, current_expert.name)
+
+            turn.set(expert=current_expert.name, switched=switched, tokens=token_usage.get("total", 0))
+            return TurnResponse(
+                content=response_text,
+                agent_name=current_expert.name,
+                switched_context=switched,
+                token_usage=token_usage
+            )
+
+    def process_turns(self, requests: Iterable[Tuple[Optional[str], str]], max_concurrency: int = 8,
+                      timeout: Optional[float] = None, max_pending: Optional[int] = None) -> Iterator[BatchResult]:
+        """
+        Processes many (user_id, message) pairs, yielding a BatchResult as each one completes.
+
+        Different users run concurrently on up to `max_concurrency` threads; turns of the same
+        user run one at a time, in input order. At most `max_pending` requests (default
+        4 * max_concurrency) are read ahead from `requests`, so a slow consumer applies backpressure.
+        A request running longer than `timeout` seconds (time waiting for a free worker doesn't
+        count) is reported as an error; the underlying turn still completes (and updates history)
+        before that user's next turn starts.
+        Errors are collected per request and never abort the batch.
+        """
+        max_pending = max_pending or max_concurrency * 4
+        source = enumerate(requests)
+        exhausted = False
+        buffered = 0 # Requests read from the source and not yet reported
+        waiting: Dict[Optional[str], deque] = {} # Per-user requests queued behind an in-flight turn
+        inflight: Dict[Any, Dict[str, Any]] = {}
+        ready: deque = deque() # Requests whose user is free, waiting for a worker
+        active_users = set() # Users with a request ready or in flight
+
+        pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="flow-batch")
+
+        def schedule(index: int, user_id: Optional[str], message: str):
+            active_users.add(user_id)
+            ready.append((index, user_id, message))
+
+        def fill():
+            # Submit only when a worker is free, so a request's timeout counts from when it starts
+            # running, not the time spent queued behind other users' turns
+            while ready and len(inflight) < max_concurrency:
+                index, user_id, message = ready.popleft()
+                future = pool.submit(self.process_turn, message, user_id)
+                inflight[future] = {
+                    "index": index, "user_id": user_id, "message": message, "reported": False,
+                    "deadline": time.monotonic() + timeout if timeout is not None else None
+                }
+
+        try:
+            while True:
+                # 1. Read ahead until the pending window is full
+                while not exhausted and buffered < max_pending:
+                    try:
+                        index, (user_id, message) = next(source)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    buffered += 1
+                    if user_id in active_users:
+                        waiting.setdefault(user_id, deque()).append((index, message))
+                    else:
+                        schedule(index, user_id, message)
+                fill()
+
+                if not inflight:
+                    break
+
+                # 2. Wait for a completion or the nearest deadline
+                deadlines = [job["deadline"] for job in inflight.values() if job["deadline"] is not None and not job["reported"]]
+                wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                done, _ = wait(inflight, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                now = time.monotonic()
+                for future, job in inflight.items():
+                    if future not in done and not job["reported"] and job["deadline"] is not None and job["deadline"] <= now:
+                        job["reported"] = True
+                        buffered -= 1
+                        yield BatchResult(index=job["index"], user_id=job["user_id"], message=job["message"],
+                                          error=f"TimeoutError: turn exceeded {timeout}s")
+
+                for future in done:
+                    job = inflight.pop(future)
+                    user_id = job["user_id"]
+
+                    # Start the user's next turn before reporting, to keep workers busy
+                    active_users.discard(user_id)
+                    queue = waiting.get(user_id)
+                    if queue:
+                        next_index, next_message = queue.popleft()
+                        if not queue:
+                            del waiting[user_id]
+                        schedule(next_index, user_id, next_message)
+                    fill()
+
+                    if job["reported"]:
+                        continue
+                    buffered -= 1
+                    try:
+                        result = BatchResult(index=job["index"], user_id=user_id, message=job["message"], response=future.result())
+                    except Exception as e:
+                        result = BatchResult(index=job["index"], user_id=user_id, message=job["message"], error=f"{type(e).__name__}: {e}")
+                    yield result
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,217 @@
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from .types import Message
+from .history import CompactHistory
+
+def dump_session(session: Dict[str, Any]) -> str:
+    """
+    Serializes a session into compact JSON:
+    {"e": current_expert, "h": [[role, content, metadata?, token_count?], ...], "t": tokens?}.
+    Trailing empty fields are omitted.
+    """
+    messages = session["history"]
+    if isinstance(messages, CompactHistory):
+        records = messages.records()
+    else:
+        records = ((msg.role, msg.content, msg.metadata, msg.token_count) for msg in messages)
+
+    history = []
+    for role, content, metadata, token_count in records:
+        record = [role, content]
+        if metadata or token_count is not None:
+            record.append(metadata)
+        if token_count is not None:
+            record.append(token_count)
+        history.append(record)
+    data = {"e": session["current_expert"], "h": history}
+    if session.get("tokens") is not None:
+        data["t"] = session["tokens"]
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+def load_session(data: str) -> Dict[str, Any]:
+    """
+    Inverse of `dump_session`.
+    """
+    raw = json.loads(data)
+    history = [
+        Message(
+            role=record[0],
+            content=record[1],
+            metadata=record[2] if len(record) > 2 else {},
+            token_count=record[3] if len(record) > 3 else None
+        )
+        for record in raw["h"]
+    ]
+    session = {"history": history, "current_expert": raw["e"]}
+    if "t" in raw:
+        session["tokens"] = raw["t"]
+    return session
+
+class SessionStore(ABC):
+    """
+    Abstract storage for per-user session state ({"history": [...], "current_expert": str}).
+    `Flow` loads a session at the start of each turn and saves it at the end.
+    Stores whose load/save do I/O keep `blocking = True`: `Flow.aprocess_turn` then runs them in a
+    worker thread instead of on the event loop.
+    """
+    blocking = True
+
+    @abstractmethod
+    def load(self, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Returns the stored session, or None if the user has none (or it expired).
+        """
+        pass
+
+    @abstractmethod
+    def save(self, user_id: Optional[str], session: Dict[str, Any]):
+        """
+        Persists the session.
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, user_id: Optional[str]):
+        """
+        Removes the session if present.
+        """
+        pass
+
+class InMemorySessionStore(SessionStore):
+    """
+    Keeps live session objects in process memory (no serialization).
+    Bounded by `max_sessions` (least recently used are evicted) and `idle_ttl` seconds.
+    """
+    blocking = False
+
+    def __init__(self, max_sessions: Optional[int] = None, idle_ttl: Optional[float] = None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[Optional[str], tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        # Entries are kept in access order, so idle sessions sit at the front
+        while self._sessions:
+            user_id, (_, last_access) = next(iter(self._sessions.items()))
+            over_capacity = self.max_sessions is not None and len(self._sessions) > self.max_sessions
+            idle = self.idle_ttl is not None and now - last_access > self.idle_ttl
+            if not (over_capacity or idle):
+                break
+            del self._sessions[user_id]
+
+    def load(self, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(user_id)
+            if entry is None:
+                return None
+            session, last_access = entry
+            if self.idle_ttl is not None and now - last_access > self.idle_ttl:
+                del self._sessions[user_id]
+                return None
+            self._sessions[user_id] = (session, now)
+            self._sessions.move_to_end(user_id)
+            return session
+
+    def save(self, user_id: Optional[str], session: Dict[str, Any]):
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[user_id] = (session, now)
+            self._sessions.move_to_end(user_id)
+            self._evict(now)
+
+    def delete(self, user_id: Optional[str]):
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions stored in a SQLite database in WAL mode, so several worker processes
+    on one host can share it. Use `purge_idle` to drop sessions older than `idle_ttl`.
+    """
+
+    def __init__(self, path: str = "sessions.db", idle_ttl: Optional[float] = None):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (user_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+
+    def load(self, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, updated_at FROM sessions WHERE user_id = ?", (str(user_id),)
+            ).fetchone()
+        if row is None:
+            return None
+        if self.idle_ttl is not None and time.time() - row[1] > self.idle_ttl:
+            self.delete(user_id)
+            return None
+        return load_session(row[0])
+
+    def save(self, user_id: Optional[str], session: Dict[str, Any]):
+        data = dump_session(session)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                (str(user_id), data, time.time())
+            )
+
+    def delete(self, user_id: Optional[str]):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (str(user_id),))
+
+    def purge_idle(self) -> int:
+        """
+        Deletes sessions idle for longer than `idle_ttl`. Returns the number removed.
+        """
+        if self.idle_ttl is None:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.idle_ttl,))
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessions stored in Redis (any client exposing redis-py's get/set/delete works),
+    so sessions can be shared across hosts. `idle_ttl` maps to the key expiry.
+    """
+
+    def __init__(self, client: Any, prefix: str = "aghentic:session:", idle_ttl: Optional[float] = None):
+        self.client = client
+        self.prefix = prefix
+        self.idle_ttl = idle_ttl
+
+    def load(self, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        data = self.client.get(f"{self.prefix}{user_id}")
+        if data is None:
+            return None
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        return load_session(data)
+
+    def save(self, user_id: Optional[str], session: Dict[str, Any]):
+        ex = max(1, int(self.idle_ttl)) if self.idle_ttl else None
+        self.client.set(f"{self.prefix}{user_id}", dump_session(session), ex=ex)
+
+    def delete(self, user_id: Optional[str]):
+        self.client.delete(f"{self.prefix}{user_id}")
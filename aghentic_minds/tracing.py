@@ -0,0 +1,189 @@
+import time
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# Span names emitted by Flow
+SPAN_TURN = "turn"
+SPAN_ROUTE = "route"
+SPAN_CONTEXT = "context"
+SPAN_GENERATE = "generate"
+SPAN_PRUNE = "prune"
+SPAN_SUMMARIZE = "summarize"
+SPAN_DEBUG_LOG = "debug_log"
+SPAN_RESPONSE_CACHE = "response_cache"
+
+# Latency buckets (seconds) for the histogram aggregator
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Span:
+    """
+    A timed section of a turn. Use as a context manager; `set(...)` attaches attributes
+    (expert, token counts, ...) that are passed to the tracer when the span ends.
+    """
+    __slots__ = ("tracer", "name", "attributes", "started")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.started = 0.0
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.tracer.on_span(self.name, time.perf_counter() - self.started, self.attributes)
+        return False
+
+class _NullSpan:
+    """Shared do-nothing span returned by NullTracer."""
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class Tracer:
+    """
+    Base class for tracing hooks.
+    Subclass and override `on_span`, which is called once per finished span with its
+    duration (seconds) and attributes. May be called from worker threads.
+    """
+    def span(self, name: str, **attributes) -> Span:
+        return Span(self, name, attributes)
+
+    def on_span(self, name: str, duration: float, attributes: Dict[str, Any]):
+        pass
+
+class NullTracer(Tracer):
+    """
+    Default tracer: spans are a shared no-op object, nothing is timed or recorded.
+    """
+    def span(self, name: str, **attributes) -> _NullSpan:
+        return _NULL_SPAN
+
+class CallbackTracer(Tracer):
+    """
+    Forwards every span to `callback(name, duration, attributes)`, e.g. to a logger or an APM client.
+    """
+    def __init__(self, callback):
+        self.callback = callback
+
+    def on_span(self, name: str, duration: float, attributes: Dict[str, Any]):
+        self.callback(name, duration, attributes)
+
+class MetricsTracer(Tracer):
+    """
+    In-process aggregator: a latency histogram per span name, plus totals of the
+    numeric token attributes (`tokens`, `cached_tokens`) and error counts.
+    Export with `snapshot()` or `to_prometheus()`.
+    """
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[str, Any]] = {}
+        self._tokens: Dict[Tuple[str, str], int] = {}
+        self._errors: Dict[str, int] = {}
+
+    def on_span(self, name: str, duration: float, attributes: Dict[str, Any]):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+                self._histograms[name] = histogram
+            # Last slot is the +Inf bucket
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    index = i
+                    break
+            histogram["counts"][index] += 1
+            histogram["sum"] += duration
+            histogram["count"] += 1
+
+            for key in ("tokens", "cached_tokens"):
+                value = attributes.get(key)
+                if value:
+                    self._tokens[(name, key)] = self._tokens.get((name, key), 0) + value
+            if "error" in attributes:
+                self._errors[name] = self._errors.get(name, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._tokens.clear()
+            self._errors.clear()
+
+    @staticmethod
+    def _quantile(buckets: Tuple[float, ...], counts: List[int], total: int, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation (like histogram_quantile)
+        rank = q * total
+        seen = 0
+        for bound, count in zip(buckets, counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns {"spans": {name: {count, sum, mean, p50, p95, p99}}, "tokens": {...}, "errors": {...}}.
+        Percentiles are bucket upper bounds, in seconds.
+        """
+        with self._lock:
+            spans = {}
+            for name, histogram in self._histograms.items():
+                count = histogram["count"]
+                spans[name] = {
+                    "count": count,
+                    "sum": histogram["sum"],
+                    "mean": histogram["sum"] / count if count else 0.0,
+                    "p50": self._quantile(self.buckets, histogram["counts"], count, 0.50),
+                    "p95": self._quantile(self.buckets, histogram["counts"], count, 0.95),
+                    "p99": self._quantile(self.buckets, histogram["counts"], count, 0.99),
+                }
+            tokens = {f"{name}.{key}": value for (name, key), value in self._tokens.items()}
+            return {"spans": spans, "tokens": tokens, "errors": dict(self._errors)}
+
+    def to_prometheus(self, prefix: str = "aghentic") -> str:
+        """
+        Renders the metrics in the Prometheus text exposition format.
+        """
+        lines = [
+            f"# HELP {prefix}_span_duration_seconds Duration of Flow turn phases.",
+            f"# TYPE {prefix}_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name in sorted(self._histograms):
+                histogram = self._histograms[name]
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram["counts"]):
+                    cumulative += count
+                    lines.append(f'{prefix}_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {histogram["count"]}')
+                lines.append(f'{prefix}_span_duration_seconds_sum{{span="{name}"}} {histogram["sum"]}')
+                lines.append(f'{prefix}_span_duration_seconds_count{{span="{name}"}} {histogram["count"]}')
+
+            lines.append(f"# HELP {prefix}_tokens_total Tokens reported by traced spans.")
+            lines.append(f"# TYPE {prefix}_tokens_total counter")
+            for (name, key), value in sorted(self._tokens.items()):
+                lines.append(f'{prefix}_tokens_total{{span="{name}",kind="{key}"}} {value}')
+
+            lines.append(f"# HELP {prefix}_span_errors_total Spans that ended with an exception.")
+            lines.append(f"# TYPE {prefix}_span_errors_total counter")
+            for name, value in sorted(self._errors.items()):
+                lines.append(f'{prefix}_span_errors_total{{span="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
@@ -10,6 +10,9 @@ class Expert(BaseModel):
     description: str
     model_name: str = "gemini-2.0-flash" # Default model for this agent
     tools: Optional[List[Any]] = None # List of callable tools
+    examples: List[str] = Field(default_factory=list) # Example utterances for the fast-path router
+    context_budget: Optional[int] = None # Token budget for history + new message in generate calls (None: whole history); messages over a quarter of it are truncated
+    cache_responses: Optional[bool] = None # Flow response cache opt-in/out; None: cached unless the expert has tools
 
 class Message(BaseModel):
     """
@@ -18,6 +21,7 @@ class Message(BaseModel):
     role: str # 'user', 'model', 'system'
     content: str
     metadata: Dict[str, Any] = Field(default_factory=dict)
+    token_count: Optional[int] = None # Cached token count, filled in once by PNNet.count_message_tokens
 
 class TurnResponse(BaseModel):
     """
@@ -27,3 +31,25 @@ class TurnResponse(BaseModel):
     agent_name: str
     switched_context: bool
     token_usage: Dict[str, int] = Field(default_factory=lambda: {"total": 0})
+
+class TurnChunk(BaseModel):
+    """
+    One event of a streamed turn (`Flow.stream_turn`).
+    type is "route" (routing decided), "content" (a piece of the reply) or "done" (full reply + usage).
+    """
+    type: str
+    agent_name: str
+    switched_context: bool = False
+    content: str = ""
+    token_usage: Dict[str, int] = Field(default_factory=lambda: {"total": 0})
+
+class BatchResult(BaseModel):
+    """
+    The outcome of one request in `Flow.process_turns`.
+    Exactly one of `response` / `error` is set.
+    """
+    index: int # Position of the request in the input iterable
+    user_id: Optional[str]
+    message: str
+    response: Optional[TurnResponse] = None
+    error: Optional[str] = None
@@ -14,6 +14,8 @@ class Colors:
 EMOJI_RANGE_REGEX = r"[\U0001F300-\U0001FAFF\U0001F000-\U0001F02F\u2600-\u27BF]"
 VARIATION_JOINERS_REGEX = r"[\uFE0F\u200D]"
 import os
+import re
+
 def load_prompt(filename):
     """Helper to load prompt content from the prompts directory."""
     base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -23,4 +25,12 @@ def load_prompt(filename):
             return f.read()
     except FileNotFoundError:
         print(f"Error: Could not find prompt file: {path}")
-        return ""
\ No newline at end of file
+        return ""
+
+def normalize_message(text: str) -> str:
+    """Lowercases and drops punctuation and extra whitespace, for cache keys."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (~4 characters per token), no network involved."""
+    return len(text) // 4
@@ -0,0 +1,127 @@
+"""
+Measurement helpers for the benchmark scenarios.
+"""
+import gc
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of `samples` (pct in 0..100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+class TurnTimer:
+    """
+    Wraps `flow.process_turn` to record the latency of every turn, including
+    turns issued from worker threads by `process_turns`.
+    """
+
+    def __init__(self, flow: Any):
+        self.flow = flow
+        self.latencies: List[float] = []
+        self._original = flow.process_turn
+
+        def timed(message, user_id=None):
+            started = time.perf_counter()
+            try:
+                return self._original(message, user_id)
+            finally:
+                self.latencies.append(time.perf_counter() - started)
+
+        flow.process_turn = timed
+
+    def restore(self):
+        self.flow.process_turn = self._original
+
+
+def measure(run: Callable[[Any], None], make_flow: Callable[[bool], Any], sessions: int, trace_memory: bool = True) -> Dict[str, Any]:
+    """
+    Runs a scenario twice against fresh Flows:
+    1. a timing pass with injected LLM latency (turns/sec and turn latency percentiles),
+    2. a memory pass under tracemalloc without latency (peak bytes, bytes retained per session, net blocks per turn).
+    `make_flow(with_latency)` builds the Flow and `run(flow)` drives the whole scenario.
+    """
+    flow = make_flow(True)
+    timer = TurnTimer(flow)
+    started = time.perf_counter()
+    run(flow)
+    elapsed = time.perf_counter() - started
+    timer.restore()
+    flow.close()
+
+    latencies = timer.latencies
+    result = {
+        "turns": len(latencies),
+        "sessions": sessions,
+        "wall_seconds": round(elapsed, 4),
+        "turns_per_sec": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(1000 * sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p50": round(1000 * percentile(latencies, 50), 3),
+            "p95": round(1000 * percentile(latencies, 95), 3),
+            "p99": round(1000 * percentile(latencies, 99), 3),
+            "max": round(1000 * max(latencies), 3) if latencies else 0.0,
+        },
+    }
+
+    if trace_memory:
+        gc.collect()
+        blocks_before = sys.getallocatedblocks()
+        tracemalloc.start()
+        flow = make_flow(False)
+        baseline, _ = tracemalloc.get_traced_memory()
+        run(flow)
+        flow.close()
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        blocks_after = sys.getallocatedblocks()
+        turns = max(1, len(latencies))
+        result["memory"] = {
+            "peak_bytes": peak - baseline,
+            "retained_bytes": current - baseline,
+            "retained_bytes_per_session": (current - baseline) // max(1, sessions),
+            "net_blocks_per_turn": round((blocks_after - blocks_before) / turns, 2),
+        }
+        # Keep the flow (and its sessions) alive until after the measurement
+        del flow
+
+    return result
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float = 0.10) -> List[str]:
+    """
+    Returns human readable regressions between two result files: throughput or thread speed-up
+    drops, or p95 latency / per-session memory increases beyond `tolerance` (fractional).
+    """
+    regressions = []
+    for name, now in current.get("scenarios", {}).items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        checks = [
+            ("turns_per_sec", before["turns_per_sec"], now["turns_per_sec"], False),
+            ("latency_ms.p95", before["latency_ms"]["p95"], now["latency_ms"]["p95"], True),
+        ]
+        if "memory" in before and "memory" in now:
+            checks.append(("memory.retained_bytes_per_session", before["memory"]["retained_bytes_per_session"],
+                           now["memory"]["retained_bytes_per_session"], True))
+        # Thread-count sweeps (shared_threads): a lower speed-up means turns got serialized
+        for threads, point in now.get("scaling", {}).items():
+            old_point = before.get("scaling", {}).get(threads)
+            if old_point is not None:
+                checks.append((f"scaling.{threads}.speedup", old_point["speedup"], point["speedup"], False))
+        for metric, old, new, higher_is_worse in checks:
+            if not old:
+                continue
+            change = (new - old) / old
+            if (higher_is_worse and change > tolerance) or (not higher_is_worse and change < -tolerance):
+                regressions.append(f"{name}: {metric} {old} -> {new} ({change:+.1%})")
+    return regressions
@@ -0,0 +1,85 @@
+"""
+Startup benchmark: how long `import aghentic_minds` takes in a fresh interpreter.
+
+Each statement runs in a new `python -X importtime` process (best of N runs); the report has
+the cumulative import time of the statement's modules and the slowest modules it pulled in.
+
+Usage:
+    python -m benchmarks.importtime                  # JSON to stdout
+    python -m benchmarks.importtime -n 10 --top 15 -o startup.json
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATEMENTS = {
+    "core": "import aghentic_minds",
+    "mock_quick_start": "from aghentic_minds import Expert, Router, Flow; from aghentic_minds.llm import MockLLM",
+    "prompts": "from aghentic_minds.prompts import QUICK_START_SALES",
+    # Touching a provider adapter loads its SDK: the cost lazy loading keeps out of "core"
+    "gemini": "from aghentic_minds.llm import GeminiLLM",
+}
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """Returns [(module, self_us, cumulative_us, depth)] from `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def run_once(statement: str) -> List[Tuple[str, int, int, int]]:
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return parse_importtime(proc.stderr)
+
+
+def measure(statement: str, runs: int, top: int) -> Dict[str, Any]:
+    best = None
+    for _ in range(runs):
+        rows = run_once(statement)
+        # Top-level rows (depth 0) are what the statement itself triggered (minus interpreter startup)
+        total = sum(cumulative for name, _, cumulative, depth in rows if depth == 0 and name not in ("site", "encodings"))
+        if best is None or total < best[0]:
+            best = (total, rows)
+    total, rows = best
+    slowest = sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+    return {
+        "import_ms": round(total / 1000, 2),
+        "modules": len(rows),
+        "slowest_self_ms": {name: round(self_us / 1000, 2) for name, self_us, _, _ in slowest},
+        "loaded_google_genai": any(name == "google.genai" for name, _, _, _ in rows),
+        "loaded_numpy": any(name == "numpy" for name, _, _, _ in rows),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure aghentic_minds import time with -X importtime.")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="Fresh interpreters per statement (best is kept)")
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list")
+    parser.add_argument("-o", "--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = {name: measure(statement, args.runs, args.top) for name, statement in STATEMENTS.items()}
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
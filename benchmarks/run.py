@@ -0,0 +1,239 @@
+"""
+Deterministic benchmarks for the Flow / Router / PNNet hot paths.
+
+Every scenario runs against a LatencyMockLLM with seeded latency distributions,
+so results only depend on the library code and the machine.
+
+Usage:
+    python -m benchmarks.run                              # all scenarios, JSON to stdout
+    python -m benchmarks.run -s long_history -o out.json
+    python -m benchmarks.run -o new.json --compare baseline.json   # exit 1 on regressions
+    python -m benchmarks.run -s shared_threads --llm gemini --record gemini.db   # capture real responses/latency once
+    python -m benchmarks.run -s shared_threads --replay gemini.db                # replay them offline
+"""
+import os
+import sys
+import json
+import threading
+import argparse
+import contextlib
+import datetime
+import platform
+from typing import Any, Callable, Dict, Optional
+
+# Allow running from a source checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aghentic_minds import Expert, Router, Flow
+from aghentic_minds.llm import LatencyMockLLM, RecordingLLM, ReplayLLM, ReplayStore
+from benchmarks.harness import measure, compare
+
+EXPERTS = [
+    Expert(name="orchestrator", description="Greetings and general questions.", system_prompt="You are the orchestrator. " * 20),
+    Expert(name="sales", description="Pricing, plans and purchases.", system_prompt="You are a sales representative. " * 20),
+    Expert(name="support", description="Troubleshooting, bugs and account problems.", system_prompt="You are a support engineer. " * 20),
+]
+ROUTING_RULES = {"price": "sales", "buy": "sales", "crash": "support", "error": "support", "hello": "orchestrator"}
+SALES_MESSAGES = ["What is the price of the premium plan?", "I want to buy ten seats.", "Is there a price for students?"]
+SUPPORT_MESSAGES = ["The app shows an error on login.", "It keeps crashing on startup.", "Same error again after the update."]
+REPLY = "Thanks for reaching out. Here is a detailed answer that covers the question with a few useful steps. " * 3
+
+
+class LLMSource:
+    """
+    The LLM behind the timing pass (--llm / --record / --replay): the scenario's LatencyMockLLM,
+    Gemini, or responses and latencies recorded earlier. The memory pass always uses the mock.
+    """
+
+    def __init__(self, provider: str = "mock", record: Optional[str] = None, replay: Optional[str] = None, latency_scale: float = 1.0):
+        self.provider = provider
+        self.record = ReplayStore(record) if record else None
+        self.replay = ReplayStore(replay) if replay else None
+        self.latency_scale = latency_scale
+        self.replayers = []
+
+    def wrap(self, mock: Any) -> Any:
+        if self.replay is not None:
+            llm = ReplayLLM(self.replay, replay_latency=True, latency_scale=self.latency_scale)
+            self.replayers.append(llm)
+            return llm
+        llm = mock
+        if self.provider == "gemini":
+            from aghentic_minds.llm import GeminiLLM
+            llm = GeminiLLM()
+        return RecordingLLM(llm, self.record) if self.record is not None else llm
+
+    def replay_stats(self) -> Optional[Dict[str, Any]]:
+        """Hits/misses of the scenario that just ran; misses mean the recording is stale."""
+        if not self.replayers:
+            return None
+        stats = [llm.get_stats() for llm in self.replayers]
+        self.replayers = []
+        return {"hits": sum(s["hits"] for s in stats), "misses": sum(s["misses"] for s in stats)}
+
+
+SOURCE = LLMSource()
+
+
+def make_flow_factory(routing_latency: Any, generation_latency: Any, **flow_kwargs) -> Callable[[bool], Flow]:
+    def make_flow(with_latency: bool) -> Flow:
+        llm = LatencyMockLLM(
+            routing_rules=ROUTING_RULES,
+            default_response=REPLY,
+            routing_latency=routing_latency if with_latency else 0.0,
+            generation_latency=generation_latency if with_latency else 0.0,
+            seed=42,
+        )
+        if with_latency:
+            llm = SOURCE.wrap(llm)
+        return Flow(Router(EXPERTS, llm), llm, **flow_kwargs)
+    return make_flow
+
+
+def scenario_many_sessions(scale: float) -> Dict[str, Any]:
+    """Many short sessions served concurrently through process_turns."""
+    users, turns = 500, 4
+    requests = [(f"user{u}", SALES_MESSAGES[t % 3]) for t in range(turns) for u in range(users)]
+
+    def run(flow):
+        for _ in flow.process_turns(requests, max_concurrency=32):
+            pass
+
+    factory = make_flow_factory(("lognormal", 0.004 * scale, 0.3), ("lognormal", 0.012 * scale, 0.3))
+    return measure(run, factory, sessions=users)
+
+
+def scenario_long_history(scale: float) -> Dict[str, Any]:
+    """Few sessions with long conversations (history pruning on every turn)."""
+    users, turns = 5, 120
+
+    def run(flow):
+        for t in range(turns):
+            for u in range(users):
+                flow.process_turn(SUPPORT_MESSAGES[t % 3], user_id=f"user{u}")
+
+    factory = make_flow_factory(("const", 0.0005 * scale), ("const", 0.001 * scale))
+    return measure(run, factory, sessions=users)
+
+
+def scenario_expert_switches(scale: float) -> Dict[str, Any]:
+    """Every turn switches expert (sanitize on switch, no speculation hits)."""
+    users, turns = 20, 30
+
+    def run(flow):
+        for t in range(turns):
+            messages = SALES_MESSAGES if t % 2 == 0 else SUPPORT_MESSAGES
+            for u in range(users):
+                flow.process_turn(messages[t % 3], user_id=f"user{u}")
+
+    factory = make_flow_factory(("const", 0.0005 * scale), ("const", 0.001 * scale))
+    return measure(run, factory, sessions=users)
+
+
+def scenario_optimize(scale: float) -> Dict[str, Any]:
+    """optimize=True: token accounting and summarization on long conversations."""
+    users, turns = 10, 40
+
+    def run(flow):
+        for t in range(turns):
+            for u in range(users):
+                flow.process_turn(SUPPORT_MESSAGES[t % 3], user_id=f"user{u}")
+
+    factory = make_flow_factory(("const", 0.0005 * scale), ("const", 0.001 * scale), optimize=True)
+    return measure(run, factory, sessions=users)
+
+
+def scenario_shared_threads(scale: float) -> Dict[str, Any]:
+    """
+    One Flow shared by plain threads calling process_turn, swept over 1/4/8/16 threads.
+    The top-level figures are for 16 threads; "scaling" has turns/sec and the speed-up over
+    1 thread per count, so --compare catches a lock that serializes different users.
+    """
+    users, turns = 64, 5
+
+    def runner(threads: int):
+        def run(flow):
+            def worker(t):
+                for turn in range(turns):
+                    for u in range(t, users, threads):
+                        flow.process_turn(SALES_MESSAGES[turn % 3], user_id=f"user{u}")
+            pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+        return run
+
+    factory = make_flow_factory(("lognormal", 0.004 * scale, 0.3), ("lognormal", 0.012 * scale, 0.3))
+    counts = (1, 4, 8, 16)
+    results = {threads: measure(runner(threads), factory, sessions=users, trace_memory=threads == counts[-1]) for threads in counts}
+    result = results[counts[-1]]
+    single = results[1]["turns_per_sec"]
+    result["scaling"] = {
+        str(threads): {"turns_per_sec": r["turns_per_sec"], "speedup": round(r["turns_per_sec"] / single, 2) if single else 0.0}
+        for threads, r in results.items()
+    }
+    return result
+
+
+SCENARIOS = {
+    "many_sessions": scenario_many_sessions,
+    "long_history": scenario_long_history,
+    "expert_switches": scenario_expert_switches,
+    "optimize": scenario_optimize,
+    "shared_threads": scenario_shared_threads,
+}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Flow/Router/PNNet hot paths.")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="Scenario to run (repeatable, default: all)")
+    parser.add_argument("-o", "--output", help="Write JSON results to this file instead of stdout")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiply every injected latency (0 disables it)")
+    parser.add_argument("--compare", help="Baseline JSON file; exit with status 1 if a scenario regressed")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression for --compare")
+    parser.add_argument("--llm", choices=["mock", "gemini"], default="mock", help="LLM for the timing pass (gemini needs GOOGLE_API_KEY)")
+    parser.add_argument("--record", help="Record the timing pass LLM calls into this replay database")
+    parser.add_argument("--replay", help="Serve the timing pass from this replay database, with the recorded latencies")
+    args = parser.parse_args(argv)
+
+    global SOURCE
+    SOURCE = LLMSource(args.llm, args.record, args.replay, args.latency_scale)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency_scale": args.latency_scale,
+            "llm": f"replay:{args.replay}" if args.replay else args.llm,
+        },
+        "scenarios": {},
+    }
+    for name in args.scenario or list(SCENARIOS):
+        print(f"Running {name}...", file=sys.stderr)
+        # Flow prints context switches; keep stdout clean for the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            results["scenarios"][name] = SCENARIOS[name](args.latency_scale)
+        replay_stats = SOURCE.replay_stats()
+        if replay_stats is not None:
+            results["scenarios"][name]["replay"] = replay_stats
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import time
+import unittest
+from aghentic_minds.cache import ResponseCache
+from aghentic_minds.session import Flow
+from aghentic_minds.router import Router
+from aghentic_minds.types import Expert, Message
+from aghentic_minds.llm.mock import CountingMockLLM
+
+class TestResponseCache(unittest.TestCase):
+    def test_exact_hit_ignores_case_and_punctuation(self):
+        cache = ResponseCache()
+        cache.put("sales", "What is the price?", [], "It's $10.")
+        self.assertEqual(cache.get("sales", "what is the price", []), "It's $10.")
+        self.assertIsNone(cache.get("support", "What is the price?", []))
+        stats = cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["experts"]["sales"]["hit_rate"], 1.0)
+
+    def test_context_window_is_part_of_the_key(self):
+        cache = ResponseCache(context_window=2)
+        earlier = [Message(role="user", content="I use the free plan"), Message(role="assistant", content="Noted")]
+        cache.put("sales", "How much?", earlier, "Upgrade is $10.")
+        self.assertIsNone(cache.get("sales", "How much?", []))
+        self.assertEqual(cache.get("sales", "How much?", list(earlier)), "Upgrade is $10.")
+        # Only the last `context_window` messages count
+        older = [Message(role="user", content="hi")] + earlier
+        self.assertEqual(cache.get("sales", "How much?", older), "Upgrade is $10.")
+
+    def test_near_duplicate_tier(self):
+        cache = ResponseCache(near_duplicate_threshold=0.8)
+        cache.put("support", "How do I reset my password?", [], "Use the reset link.")
+        self.assertEqual(cache.get("support", "how do i reset my password please", []), "Use the reset link.")
+        self.assertIsNone(cache.get("support", "Where is my invoice?", []))
+        self.assertEqual(cache.get_stats()["near_hits"], 1)
+
+    def test_ttl_and_size_eviction(self):
+        cache = ResponseCache(max_size=2, ttl=0.05, near_duplicate_threshold=0.8)
+        cache.put("sales", "a question", [], "a")
+        cache.put("sales", "b question", [], "b")
+        cache.put("sales", "c question", [], "c")
+        self.assertEqual(cache.get_stats()["backend"]["size"], 2)
+        time.sleep(0.06)
+        self.assertIsNone(cache.get("sales", "c question", []))
+
+    def test_experts_with_tools_are_not_cached_by_default(self):
+        self.assertTrue(ResponseCache.enabled_for(Expert(name="a", description="", system_prompt="")))
+        self.assertFalse(ResponseCache.enabled_for(Expert(name="b", description="", system_prompt="", tools=[print])))
+        self.assertTrue(ResponseCache.enabled_for(Expert(name="c", description="", system_prompt="", tools=[print], cache_responses=True)))
+        self.assertFalse(ResponseCache.enabled_for(Expert(name="d", description="", system_prompt="", cache_responses=False)))
+
+class TestFlowResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.experts = [
+            Expert(name="orchestrator", description="General", system_prompt="sys"),
+            Expert(name="sales", description="Sales expert", system_prompt="sales sys"),
+            Expert(name="ops", description="Orders", system_prompt="ops sys", tools=[print]),
+        ]
+        self.llm = CountingMockLLM(responses={"price": "It costs $10."}, routing_rules={"price": "sales", "order": "ops"})
+        self.cache = ResponseCache()
+        self.flow = Flow(Router(self.experts, self.llm), self.llm, response_cache=self.cache)
+
+    def test_repeated_question_across_users(self):
+        first = self.flow.process_turn("What is the price?", user_id="alice")
+        second = self.flow.process_turn("what is the price", user_id="bob")
+        self.assertEqual((self.llm.routing_calls, self.llm.generation_calls), (2, 1))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.token_usage["total"], 0)
+        # The cached turn is still recorded in history
+        history = self.flow._get_session("bob")["history"]
+        self.assertEqual([m.content for m in history], ["what is the price", "It costs $10."])
+
+    def test_tool_experts_are_not_cached(self):
+        self.flow.process_turn("Where is my order?", user_id="alice")
+        self.flow.process_turn("Where is my order?", user_id="bob")
+        self.assertEqual((self.llm.routing_calls, self.llm.generation_calls), (2, 2))
+        self.assertEqual(self.cache.get_stats()["stores"], 0)
+
+    def test_streamed_turns_use_the_cache(self):
+        self.flow.process_turn("What is the price?", user_id="alice")
+        chunks = list(self.flow.stream_turn("What is the price?", user_id="bob"))
+        self.assertEqual(chunks[-1].content, "It costs $10.")
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
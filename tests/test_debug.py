@@ -0,0 +1,79 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from aghentic_minds.debug import DebugWriter
+from aghentic_minds.session import Flow
+from aghentic_minds.router import Router
+from aghentic_minds.types import Expert, Message
+from aghentic_minds.llm.mock import MockLLM
+
+class TestDebugWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.history = [Message(role="user", content="hi"), Message(role="assistant", content="hello")]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def read(self, user_id):
+        with open(os.path.join(self.directory, f"{user_id}_debug.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_snapshot_written_in_background(self):
+        writer = DebugWriter(self.directory)
+        writer.submit("user1", "sales", self.history)
+        self.assertTrue(writer.flush(timeout=5))
+        data = self.read("user1")
+        self.assertEqual(data["current_expert"], "sales")
+        self.assertEqual([m["content"] for m in data["history"]], ["hi", "hello"])
+        writer.close()
+
+    def test_coalesces_per_user_and_drops_when_full(self):
+        writer = DebugWriter(self.directory, max_pending=2)
+        # Hold the lock so the writer thread can't drain the queue while we submit
+        with writer._cond:
+            writer.submit("user1", "sales", self.history[:1])
+            writer.submit("user1", "support", self.history)
+            writer.submit("user2", "sales", self.history)
+            dropped = writer.submit("user3", "sales", self.history)
+        writer.close()
+
+        self.assertFalse(dropped)
+        self.assertEqual(writer.stats["coalesced"], 1)
+        self.assertEqual(writer.stats["dropped"], 1)
+        self.assertEqual(writer.stats["written"], 2)
+        self.assertEqual(self.read("user1")["current_expert"], "support")
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "user3_debug.json")))
+
+    def test_jsonl_appends(self):
+        writer = DebugWriter(self.directory, format="jsonl")
+        writer.submit("user1", "sales", self.history)
+        writer.flush(timeout=5)
+        writer.submit("user1", "support", self.history)
+        writer.close()
+        with open(os.path.join(self.directory, "debug.jsonl"), encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([(l["user_id"], l["current_expert"]) for l in lines], [("user1", "sales"), ("user1", "support")])
+
+    def test_snapshot_is_isolated_from_later_turns(self):
+        writer = DebugWriter(self.directory)
+        with writer._cond:
+            writer.submit("user1", "sales", self.history)
+            self.history.append(Message(role="user", content="later"))
+        writer.close()
+        self.assertEqual(len(self.read("user1")["history"]), 2)
+
+    def test_flow_debug_mode(self):
+        llm = MockLLM()
+        flow = Flow(Router([Expert(name="orchestrator", description="General", system_prompt="sys")], llm), llm,
+                    debug=True, debug_dir=self.directory)
+        flow.process_turn("hello", user_id="user1")
+        flow.process_turn("again", user_id="user1")
+        flow.close()
+        # Logged before the second turn is appended
+        self.assertEqual(len(self.read("user1")["history"]), 2)
+
+if __name__ == '__main__':
+    unittest.main()
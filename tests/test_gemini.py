@@ -0,0 +1,220 @@
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from aghentic_minds.types import Message
+from aghentic_minds.llm import gemini
+from aghentic_minds.llm.gemini import GeminiLLM
+
+class StubChat:
+    def __init__(self, client, history, config):
+        self.client = client
+        self.history = list(history)
+        self.config = config
+
+    def _reply(self, message):
+        self.client.sent.append(message)
+        cached = 0
+        if self.config is not None and self.config.cached_content:
+            cached = self.client.cache_sizes[self.config.cached_content]
+        return SimpleNamespace(text=f"reply to {message}", usage_metadata=SimpleNamespace(total_token_count=10 + cached, cached_content_token_count=cached))
+
+    def send_message(self, message):
+        return self._reply(message)
+
+    def send_message_stream(self, message):
+        response = self._reply(message)
+        for word in response.text.split(" "):
+            yield SimpleNamespace(text=word + " ", usage_metadata=response.usage_metadata)
+
+class AsyncStubChat(StubChat):
+    async def send_message(self, message):
+        return self._reply(message)
+
+class StubClient:
+    """
+    Records chats created and messages sent, mimicking the parts of genai.Client used by GeminiLLM.
+    """
+    def __init__(self):
+        self.created = []
+        self.sent = []
+        self.cache_sizes = {}
+        self.cache_creates = 0
+        self.min_cache_chars = 0
+        self.chats = SimpleNamespace(create=self._create(StubChat))
+        self.caches = SimpleNamespace(create=self._create_cache)
+        self.aio = SimpleNamespace(
+            chats=SimpleNamespace(create=self._create(AsyncStubChat)),
+            caches=SimpleNamespace(create=self._acreate_cache)
+        )
+
+    def _create_cache(self, model, config):
+        self.cache_creates += 1
+        if len(config.system_instruction) < self.min_cache_chars:
+            raise ValueError("Cached content is too small")
+        name = f"cachedContents/{len(self.cache_sizes)}"
+        self.cache_sizes[name] = len(config.system_instruction) // 4
+        return SimpleNamespace(name=name)
+
+    async def _acreate_cache(self, model, config):
+        return self._create_cache(model, config)
+
+    def _create(self, chat_class):
+        def create(model, history=None, config=None):
+            chat = chat_class(self, history or [], config)
+            self.created.append(chat)
+            return chat
+        return create
+
+@unittest.skipIf(gemini.genai is None, "google-genai not installed")
+class TestGeminiChatReuse(unittest.TestCase):
+    def setUp(self):
+        self.client = StubClient()
+        self.llm = GeminiLLM(client=self.client)
+
+    def turn(self, history, text, session_id="user1", system_prompt="sys"):
+        messages = history + [Message(role="user", content=text)]
+        reply = self.llm.generate(messages, system_prompt=system_prompt, session_id=session_id)
+        return messages + [Message(role="assistant", content=reply)]
+
+    def test_live_chat_is_reused(self):
+        history = self.turn([], "hello")
+        history = self.turn(history, "how are you")
+        self.turn(history, "bye")
+        self.assertEqual(len(self.client.created), 1)
+        self.assertEqual(self.client.sent, ["hello", "how are you", "bye"])
+
+    def test_rebuilt_when_history_changes(self):
+        history = self.turn([], "hello")
+        history = self.turn(history, "question")
+        # Summarized history no longer matches what the chat has seen
+        summarized = [Message(role="system", content="Previous conversation summary: ...")] + history[-2:]
+        self.turn(summarized, "next")
+        self.assertEqual(len(self.client.created), 2)
+        # Rebuilt chat history: only the last turn (the summary system message is not sent)
+        self.assertEqual(len(self.client.created[-1].history), 2)
+
+    def test_rebuilt_when_system_prompt_changes(self):
+        history = self.turn([], "hello")
+        self.turn(history, "I want to buy", system_prompt="sales sys")
+        self.assertEqual(len(self.client.created), 2)
+
+    def test_stateless_without_session_id(self):
+        self.llm.generate([Message(role="user", content="a")])
+        self.llm.generate([Message(role="user", content="a")])
+        self.assertEqual(len(self.client.created), 2)
+
+    def test_contents_are_cached_per_message(self):
+        messages = [Message(role="user", content="hello"), Message(role="assistant", content="hi"), Message(role="user", content="x")]
+        first, _, _ = self.llm._prepare_request(messages, "sys")
+        second, _, _ = self.llm._prepare_request(messages, "sys")
+        self.assertTrue(all(a is b for a, b in zip(first, second)))
+
+    def test_stream_continues_chat(self):
+        messages = [Message(role="user", content="hello")]
+        reply = "".join(self.llm.stream(messages, system_prompt="sys", session_id="user1"))
+        self.assertEqual(reply, "reply to hello ")
+        self.turn(messages + [Message(role="assistant", content=reply)], "next")
+        self.assertEqual(len(self.client.created), 1)
+        self.assertEqual(self.llm.get_token_usage()["total"], 10)
+
+    def test_async_chat_is_reused(self):
+        async def run():
+            messages = [Message(role="user", content="hello")]
+            reply = await self.llm.agenerate(messages, system_prompt="sys", session_id="user1")
+            messages += [Message(role="assistant", content=reply), Message(role="user", content="again")]
+            return await self.llm.agenerate(messages, system_prompt="sys", session_id="user1")
+
+        self.assertEqual(asyncio.run(run()), "reply to again")
+        self.assertEqual(len(self.client.created), 1)
+
+    def test_with_model_shares_client(self):
+        lite = self.llm.with_model("gemini-2.0-flash-lite")
+        self.assertIs(lite.client, self.client)
+        self.assertEqual(lite.model_name, "gemini-2.0-flash-lite")
+        lite.generate([Message(role="user", content="hi")])
+        self.assertEqual(self.client.sent, ["hi"])
+
+    def test_http_options_connection_pool(self):
+        options = GeminiLLM._build_http_options({"timeout": 30_000}, max_connections=50)
+        self.assertEqual(options.timeout, 30_000)
+        self.assertEqual(options.client_args["limits"].max_connections, 50)
+        self.assertIsNone(GeminiLLM._build_http_options(None, None))
+
+@unittest.skipIf(gemini.genai is None, "google-genai not installed")
+class TestGeminiSystemPrompt(unittest.TestCase):
+    def setUp(self):
+        self.client = StubClient()
+        # ~1200 estimated tokens, above the default min_cache_tokens
+        self.prompt = "You are a sales expert. " * 200
+
+    def test_system_prompt_sent_as_system_instruction(self):
+        llm = GeminiLLM(client=self.client)
+        llm.generate([Message(role="user", content="hi")], system_prompt=self.prompt)
+        chat = self.client.created[0]
+        self.assertEqual(chat.config.system_instruction, self.prompt)
+        self.assertEqual(chat.history, [])
+        self.assertEqual(llm.get_token_usage()["cached"], 0)
+
+    def test_context_cache_per_prompt_hash(self):
+        llm = GeminiLLM(client=self.client, context_cache=True)
+        llm.generate([Message(role="user", content="hi")], system_prompt=self.prompt)
+        llm.generate([Message(role="user", content="hello")], system_prompt=self.prompt)
+        llm.generate([Message(role="user", content="hey")], system_prompt="You are a support expert. " * 200)
+
+        self.assertEqual(len(self.client.cache_sizes), 2)
+        config = self.client.created[0].config
+        self.assertEqual(config.cached_content, "cachedContents/0")
+        self.assertIsNone(config.system_instruction)
+        self.assertEqual(self.client.created[1].config.cached_content, "cachedContents/0")
+
+    def test_short_prompts_are_never_cached(self):
+        from aghentic_minds.memory import PNNet
+        llm = GeminiLLM(client=self.client, context_cache=True)
+        for prompt in ("sys", PNNet.SUMMARY_SYSTEM_PROMPT, "You are a sales expert. " * 50):
+            llm.generate([Message(role="user", content="hi")], system_prompt=prompt)
+            asyncio.run(llm.agenerate([Message(role="user", content="hi")], system_prompt=prompt))
+        self.assertEqual(self.client.cache_creates, 0)
+        self.assertTrue(all(chat.config.system_instruction is not None for chat in self.client.created))
+
+        # The threshold is configurable
+        llm = GeminiLLM(client=self.client, context_cache=True, min_cache_tokens=100)
+        llm.generate([Message(role="user", content="hi")], system_prompt="You are a sales expert. " * 50)
+        self.assertEqual(self.client.cache_creates, 1)
+
+    def test_cached_tokens_reported(self):
+        llm = GeminiLLM(client=self.client, context_cache=True)
+        llm.generate([Message(role="user", content="hi")], system_prompt=self.prompt)
+        usage = llm.get_token_usage()
+        self.assertEqual(usage["cached"], len(self.prompt) // 4)
+        self.assertEqual(usage["total"], 10 + usage["cached"])
+
+    def test_token_usage_per_thread(self):
+        llm = GeminiLLM(client=self.client, context_cache=True)
+        llm.generate([Message(role="user", content="hi")], system_prompt=self.prompt)
+
+        def other_call():
+            llm.generate([Message(role="user", content="hi")], system_prompt="sys")
+            return llm.get_token_usage()
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            self.assertEqual(pool.submit(other_call).result(), {"total": 10, "cached": 0})
+        # A call on another thread doesn't overwrite this thread's usage
+        self.assertEqual(llm.get_token_usage()["cached"], len(self.prompt) // 4)
+
+    def test_falls_back_when_cache_rejected(self):
+        self.client.min_cache_chars = 10_000
+        llm = GeminiLLM(client=self.client, context_cache=True)
+        llm.generate([Message(role="user", content="hi")], system_prompt=self.prompt)
+        llm.generate([Message(role="user", content="hi")], system_prompt=self.prompt)
+        self.assertEqual(self.client.created[1].config.system_instruction, self.prompt)
+        # The failure is remembered instead of retried on every call
+        self.assertEqual(len(llm._context_caches), 1)
+
+    def test_async_uses_context_cache(self):
+        llm = GeminiLLM(client=self.client, context_cache=True)
+        asyncio.run(llm.agenerate([Message(role="user", content="hi")], system_prompt=self.prompt))
+        self.assertEqual(self.client.created[0].config.cached_content, "cachedContents/0")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+from aghentic_minds.history import CompactHistory
+from aghentic_minds.memory import PNNet
+from aghentic_minds.store import dump_session, load_session
+from aghentic_minds.types import Message
+
+class TestCompactHistory(unittest.TestCase):
+    def setUp(self):
+        self.messages = [
+            Message(role="system", content="Previous conversation summary: ...", metadata={"summary_level": 2}),
+            Message(role="user", content="hi", metadata={"expert": "sales"}, token_count=3),
+            Message(role="assistant", content="hello", metadata={"expert": "sales", "tool": "x"}),
+            Message(role="user", content="bye"),
+        ]
+        self.history = CompactHistory(self.messages)
+
+    def test_round_trip(self):
+        self.assertEqual(len(self.history), 4)
+        self.assertEqual(list(self.history), self.messages)
+        self.assertEqual(self.history[-1], self.messages[-1])
+        self.assertEqual(self.history[1].token_count, 3)
+        self.assertEqual(self.history[2].metadata, {"expert": "sales", "tool": "x"})
+        with self.assertRaises(IndexError):
+            self.history[4]
+
+    def test_messages_are_built_on_demand(self):
+        msg = self.history[1]
+        msg.metadata["expert"] = "support"
+        self.assertEqual(self.history[1].metadata, {"expert": "sales"})
+
+    def test_slicing_and_concatenation_stay_compact(self):
+        tail = self.history[-2:]
+        self.assertIsInstance(tail, CompactHistory)
+        self.assertEqual(tail, self.messages[-2:])
+        combined = [Message(role="system", content="s")] + tail
+        self.assertIsInstance(combined, CompactHistory)
+        self.assertEqual([m.content for m in combined], ["s", "hello", "bye"])
+        self.assertEqual(len(self.history + self.messages), 8)
+
+    def test_token_counts_are_stored(self):
+        counted = []
+        def count(msg):
+            counted.append(msg.content)
+            return 1
+        self.assertEqual(self.history.total_tokens(count), 6)
+        self.assertEqual(self.history.total_tokens(count), 6)
+        self.assertEqual(len(counted), 3)
+        self.assertEqual(PNNet.total_tokens(self.history), 6)
+
+    def test_pnnet_and_store(self):
+        pruned = PNNet.prune(CompactHistory(self.messages * 20), max_turns=5)
+        self.assertIsInstance(pruned, CompactHistory)
+        self.assertEqual(len(pruned), 10)
+
+        session = {"history": self.history, "current_expert": "sales"}
+        self.assertEqual(load_session(dump_session(session))["history"], self.messages)
+
+class TestBoundedHistory(unittest.TestCase):
+    def messages(self, start, stop):
+        return [Message(role="user" if i % 2 == 0 else "assistant", content=f"m{i}") for i in range(start, stop)]
+
+    def test_ring_drops_oldest(self):
+        history = CompactHistory(max_messages=4)
+        for msg in self.messages(0, 100):
+            history.append(msg)
+        self.assertEqual([m.content for m in history], ["m96", "m97", "m98", "m99"])
+        # The dead prefix is compacted away, so storage stays bounded
+        self.assertLess(len(history._cols.contents), 40)
+
+    def test_fork_is_copy_on_write(self):
+        history = CompactHistory(self.messages(0, 4), max_messages=6)
+        fork = history.fork()
+        fork.extend(self.messages(4, 6))
+        # The original keeps its messages; appending to it now copies instead of clobbering the fork
+        self.assertEqual(len(history), 4)
+        history.append(Message(role="user", content="other"))
+        self.assertEqual([m.content for m in fork], ["m0", "m1", "m2", "m3", "m4", "m5"])
+        self.assertEqual([m.content for m in history], ["m0", "m1", "m2", "m3", "other"])
+        fork.extend(self.messages(6, 8))
+        self.assertEqual([m.content for m in fork], ["m2", "m3", "m4", "m5", "m6", "m7"])
+
+    def test_window_is_a_stable_view(self):
+        history = CompactHistory(self.messages(0, 6), max_messages=6)
+        extra = Message(role="user", content="new")
+        view = history.window(extra=(extra,))
+        self.assertEqual(len(view), 7)
+        self.assertEqual(view[-1], extra)
+        self.assertEqual(view[0].content, "m0")
+
+        # Later turns don't change what an in-flight call sees
+        history.extend(self.messages(6, 100))
+        self.assertEqual([m.content for m in view][:2], ["m0", "m1"])
+        self.assertEqual(len(view), 7)
+        self.assertEqual(list(history.window(last=2)), self.messages(98, 100))
+
+    def test_routing_lines_are_cached(self):
+        history = CompactHistory(self.messages(0, 3), max_messages=8)
+        self.assertEqual(history.routing_lines(5), ["user: m0", "assistant: m1", "user: m2"])
+        history.extend(self.messages(3, 10))
+        first = history.routing_lines(5)
+        self.assertEqual(first, ["assistant: m5", "user: m6", "assistant: m7", "user: m8", "assistant: m9"])
+        history.extend(self.messages(10, 11))
+        second = history.routing_lines(5)
+        self.assertEqual(second[-1], "user: m10")
+        # Lines already formatted are reused, not rebuilt
+        self.assertIs(second[0], first[1])
+
+    def test_shorter_routing_window_keeps_the_cache(self):
+        history = CompactHistory(self.messages(0, 10), max_messages=20)
+        first = history.routing_lines(5)
+        # A shorter window (the response cache key) is served from the same cache
+        self.assertEqual(history.routing_lines(2), first[-2:])
+        history.extend(self.messages(10, 11))
+        second = history.routing_lines(5)
+        self.assertEqual(second[-1], "user: m10")
+        self.assertIs(second[0], first[1])
+
+    def test_flow_history_is_copy_on_write(self):
+        from aghentic_minds.session import Flow
+        from aghentic_minds.router import Router
+        from aghentic_minds.types import Expert
+        from aghentic_minds.llm.mock import MockLLM
+        llm = MockLLM()
+        flow = Flow(Router([Expert(name="orchestrator", description="General", system_prompt="sys")], llm), llm, max_turns=3)
+        flow.process_turn("hello", user_id="user1")
+        published = flow._get_session("user1")["history"]
+        for i in range(10):
+            flow.process_turn(f"turn {i}", user_id="user1")
+        history = flow._get_session("user1")["history"]
+        # Published histories are never modified: each turn stores a new (bounded) one
+        self.assertEqual([m.content for m in published], ["hello", "Mock Response"])
+        self.assertIsInstance(history, CompactHistory)
+        self.assertEqual(len(history), 6)
+        self.assertEqual(history[-2].content, "turn 9")
+
+if __name__ == '__main__':
+    unittest.main()
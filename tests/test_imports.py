@@ -0,0 +1,47 @@
+import os
+import sys
+import subprocess
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(code):
+    """Runs `code` in a fresh interpreter and returns its stdout."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout.strip()
+
+class TestLazyImports(unittest.TestCase):
+    def test_core_import_skips_provider_sdks(self):
+        out = run("import sys, aghentic_minds; print('google.genai' in sys.modules, 'numpy' in sys.modules)")
+        self.assertEqual(out, "False False")
+
+    def test_gemini_adapter_loads_on_access(self):
+        out = run(
+            "import sys, aghentic_minds\n"
+            "from aghentic_minds.llm import GeminiLLM\n"
+            "from aghentic_minds.llm.gemini import GeminiLLM as direct\n"
+            "print(GeminiLLM is direct, aghentic_minds.GeminiLLM is direct, 'GeminiLLM' in dir(aghentic_minds.llm))"
+        )
+        self.assertEqual(out, "True True True")
+
+    def test_prompts_are_read_on_first_access(self):
+        out = run(
+            "import builtins\n"
+            "opened = []\n"
+            "real_open = builtins.open\n"
+            "builtins.open = lambda path, *a, **k: (opened.append(str(path)), real_open(path, *a, **k))[1]\n"
+            "import aghentic_minds.prompts as prompts\n"
+            "before = len([p for p in opened if p.endswith('.md')])\n"
+            "first = prompts.QUICK_START_SALES\n"
+            "again = prompts.get_prompt('QUICK_START_SALES')\n"
+            "print(before, len([p for p in opened if p.endswith('.md')]), first is again)"
+        )
+        self.assertEqual(out, "0 1 True")
+
+    def test_unknown_attribute(self):
+        import aghentic_minds.llm
+        with self.assertRaises(AttributeError):
+            aghentic_minds.llm.NoSuchLLM
+
+if __name__ == "__main__":
+    unittest.main()
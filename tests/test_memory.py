@@ -1,6 +1,21 @@
 import unittest
 from aghentic_minds.memory import PNNet
 from aghentic_minds.types import Message
+from aghentic_minds.llm.mock import MockLLM
+from unittest.mock import MagicMock
+
+class CapturingMockLLM(MockLLM):
+    """Keeps the messages of the last generation call and answers with `reply`."""
+    def __init__(self, reply: str = "ok", **kwargs):
+        super().__init__(**kwargs)
+        self.reply = reply
+        self.last_messages = None
+
+    def generate(self, messages, system_prompt=None, tools=None, **kwargs):
+        if self._is_routing(messages):
+            return super().generate(messages, system_prompt, tools, **kwargs)
+        self.last_messages = list(messages)
+        return self.reply
 
 class TestPNNet(unittest.TestCase):
     def test_prune(self):
@@ -26,5 +41,155 @@ class TestPNNet(unittest.TestCase):
         self.assertEqual(sanitized[1].content, "Hi there")
         self.assertEqual(sanitized[2].content, "Previous conversation summary: summary")
 
+    def test_message_tokens_counted_once(self):
+        llm = MockLLM()
+        llm.count_tokens = MagicMock(return_value=7)
+        msg = Message(role="user", content="hello there")
+        self.assertEqual(PNNet.count_message_tokens(msg, llm), 7)
+        self.assertEqual(PNNet.count_message_tokens(msg, llm), 7)
+        self.assertEqual(llm.count_tokens.call_count, 1)
+
+    def test_estimate_skips_llm(self):
+        llm = MockLLM()
+        llm.count_tokens = MagicMock(return_value=7)
+        msg = Message(role="user", content="x" * 40)
+        self.assertEqual(PNNet.count_message_tokens(msg, llm, estimate=True), len("user: " + "x" * 40) // 4)
+        llm.count_tokens.assert_not_called()
+
+    def test_summarize_uses_running_total(self):
+        llm = MockLLM(default_response="short summary")
+        llm.count_tokens = MagicMock(return_value=1)
+        history = [Message(role="user", content=f"msg {i}") for i in range(10)]
+        self.assertIs(PNNet.summarize_if_needed(history, llm, token_limit=500, current_tokens=100), history)
+        summarized = PNNet.summarize_if_needed(history, llm, token_limit=500, current_tokens=501)
+        llm.count_tokens.assert_not_called()
+        self.assertEqual(len(summarized), 5)
+        self.assertTrue(summarized[0].content.startswith("Previous conversation summary:"))
+
+class TestContextPacking(unittest.TestCase):
+    def turns(self, n, size=40):
+        # Each message is ~size/4 + 2 estimated tokens
+        return [Message(role="user" if i % 2 == 0 else "assistant", content=f"{i:02d}" + "x" * (size - 2)) for i in range(n)]
+
+    def test_packs_newest_first_within_budget(self):
+        history = self.turns(20)
+        packed = PNNet.pack_context(history, budget=60)
+        self.assertLessEqual(sum(m.token_count for m in packed), 60)
+        self.assertEqual(packed[-1].content, history[-1].content)
+        # A contiguous tail, in chronological order
+        self.assertEqual([m.content for m in packed], [m.content for m in history[-len(packed):]])
+
+    def test_latest_summary_is_always_kept(self):
+        summary = Message(role="system", content=PNNet.SUMMARY_PREFIX + "user wants a refund")
+        packed = PNNet.pack_context([summary] + self.turns(20), budget=40)
+        self.assertIs(packed[0], summary)
+        self.assertLessEqual(sum(m.token_count for m in packed), 40)
+
+    def test_oversized_message_is_truncated(self):
+        history = self.turns(3) + [Message(role="user", content="y" * 4000)]
+        packed = PNNet.pack_context(history, budget=200)
+        self.assertTrue(packed[-1].content.endswith(PNNet.TRUNCATION_MARKER))
+        self.assertLess(len(packed[-1].content), 4000)
+        self.assertEqual(history[-1].content, "y" * 4000) # The stored message is untouched
+        self.assertEqual(len(packed), 4)
+
+    def test_compact_history(self):
+        from aghentic_minds.history import CompactHistory
+        history = CompactHistory(self.turns(20))
+        packed = PNNet.pack_context(history, budget=60)
+        self.assertEqual([m.content for m in packed], [m.content for m in PNNet.pack_context(self.turns(20), budget=60)])
+
+    def test_compact_history_columns_are_not_written(self):
+        from aghentic_minds.history import CompactHistory
+        history = CompactHistory(self.turns(20))
+        fork = history.fork()
+        packed = PNNet.pack_context(fork, budget=60)
+        self.assertTrue(all(m.token_count is not None for m in packed))
+        # The fork shares its columns with `history`: counts stay on the packed copies
+        self.assertTrue(all(m.token_count is None for m in history))
+        self.assertTrue(all(m.token_count is None for m in fork))
+
+    def test_flow_uses_expert_budget(self):
+        from aghentic_minds.session import Flow
+        from aghentic_minds.router import Router
+        from aghentic_minds.types import Expert
+
+        llm = CapturingMockLLM(reply="r" * 200)
+        expert = Expert(name="orchestrator", description="General", system_prompt="sys", context_budget=120)
+        flow = Flow(Router([expert], llm), llm)
+        for i in range(10):
+            flow.process_turn(f"question {i} " + "z" * 100, user_id="u")
+        self.assertLessEqual(sum(m.token_count for m in llm.last_messages), 120)
+        self.assertEqual(llm.last_messages[-1].content, f"question 9 " + "z" * 100)
+
+    def test_flow_truncates_oversized_new_message(self):
+        from aghentic_minds.session import Flow
+        from aghentic_minds.router import Router
+        from aghentic_minds.types import Expert
+
+        llm = CapturingMockLLM()
+        expert = Expert(name="orchestrator", description="General", system_prompt="sys", context_budget=100)
+        flow = Flow(Router([expert], llm), llm)
+        summary = Message(role="system", content=PNNet.SUMMARY_PREFIX + "user wants a refund for order 42")
+        flow.store.save("u", {"history": [summary], "current_expert": "orchestrator"})
+        flow.process_turn("w" * 4000, user_id="u")
+
+        self.assertLessEqual(sum(m.token_count for m in llm.last_messages), 100)
+        self.assertTrue(llm.last_messages[-1].content.endswith(PNNet.TRUNCATION_MARKER))
+        self.assertEqual(llm.last_messages[0].content, summary.content)
+        # History keeps the full message
+        self.assertEqual(flow._get_session("u")["history"][-2].content, "w" * 4000)
+
+    def test_flow_packs_with_its_token_counter(self):
+        from aghentic_minds.session import Flow
+        from aghentic_minds.router import Router
+        from aghentic_minds.types import Expert
+
+        llm = CapturingMockLLM()
+        llm.count_tokens = MagicMock(return_value=10)
+        expert = Expert(name="orchestrator", description="General", system_prompt="sys", context_budget=100)
+        flow = Flow(Router([expert], llm), llm)
+        for i in range(3):
+            flow.process_turn(f"question {i}", user_id="u")
+        # History and the new message are counted by the provider tokenizer, not estimated
+        self.assertEqual([m.token_count for m in llm.last_messages], [10] * 5)
+
+        estimated = CapturingMockLLM()
+        estimated.count_tokens = MagicMock(return_value=10)
+        flow = Flow(Router([expert], estimated), estimated, estimate_tokens=True)
+        flow.process_turn("question", user_id="u")
+        estimated.count_tokens.assert_not_called()
+
+class TestIncrementalSummaries(unittest.TestCase):
+    def setUp(self):
+        self.prompts = []
+        self.llm = MockLLM()
+        self.llm.generate = lambda messages, system_prompt=None, **kwargs: self.prompts.append(messages[0].content) or f"summary {len(self.prompts)}"
+
+    def summarize(self, history, max_chunks=0):
+        return PNNet.summarize_if_needed(history, self.llm, current_tokens=1000, max_chunks=max_chunks)
+
+    def test_rolling_fold_reads_only_new_messages(self):
+        history = self.summarize([Message(role="user", content=f"old {i}") for i in range(6)])
+        history = self.summarize(history + [Message(role="user", content=f"new {i}") for i in range(3)])
+
+        self.assertEqual(history[0].content, "Previous conversation summary: summary 2")
+        self.assertEqual(history[0].metadata["summary_level"], 2)
+        self.assertIn("Existing summary:\nsummary 1", self.prompts[1])
+        self.assertNotIn("old 0", self.prompts[1])
+        self.assertIn("old 4", self.prompts[1]) # aged out of the recent window since the first summary
+
+    def test_chunks_then_session_summary(self):
+        history = [Message(role="user", content=f"msg {i}") for i in range(6)]
+        for turn in range(3):
+            history = self.summarize(history, max_chunks=2)
+            history = history + [Message(role="user", content=f"turn {turn} msg {i}") for i in range(2)]
+
+        levels = [m.metadata.get("summary_level") for m in history if PNNet.is_summary(m)]
+        self.assertEqual(levels, [2])
+        # Chunk prompts only contain aged-out messages, never earlier summaries
+        self.assertNotIn("summary", self.prompts[1].split("\n\n", 1)[1])
+        self.assertIn("Existing summary:\nsummary 1\nsummary 2", self.prompts[2])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from aghentic_minds.session import Flow
+from aghentic_minds.router import Router
+from aghentic_minds.types import Expert, Message
+from aghentic_minds.llm.mock import CountingMockLLM
+from aghentic_minds.llm.registry import LLMRegistry
+
+class NamedMockLLM(CountingMockLLM):
+    def __init__(self, model_name, tokens=10, **kwargs):
+        super().__init__(default_response=f"reply from {model_name}", **kwargs)
+        self.model_name = model_name
+        self.tokens = tokens
+
+    def get_token_usage(self):
+        return {"total": self.tokens}
+
+class TestLLMRegistry(unittest.TestCase):
+    def setUp(self):
+        self.created = []
+        def factory(model_name):
+            llm = NamedMockLLM(model_name, routing_rules={"buy": "sales"})
+            self.created.append(model_name)
+            return llm
+        self.default = NamedMockLLM("default")
+        self.registry = LLMRegistry(self.default, router="flash-lite", summarizer="flash-lite", factory=factory)
+        self.experts = [
+            Expert(name="orchestrator", description="General", system_prompt="Orch", model_name="flash"),
+            Expert(name="sales", description="Sales", system_prompt="Sales", model_name="pro"),
+        ]
+
+    def test_models_resolved_per_role_and_reused(self):
+        self.assertIs(self.registry.router.llm, self.registry.summarizer.llm)
+        self.assertEqual(self.registry.router.model_name, "flash-lite")
+        self.assertEqual(self.registry.for_expert(self.experts[1]).model_name, "pro")
+        self.registry.for_expert(self.experts[1])
+        self.assertEqual(sorted(self.created), ["flash-lite", "pro"])
+
+    def test_without_factory_everything_uses_default(self):
+        registry = LLMRegistry(self.default)
+        self.assertIs(registry.for_expert(self.experts[1]).llm, self.default)
+        self.assertIs(registry.router.llm, self.default)
+        with self.assertRaises(ValueError):
+            LLMRegistry(self.default, router="flash-lite").router
+
+    def test_expert_override(self):
+        special = NamedMockLLM("special")
+        registry = LLMRegistry(self.default, experts={"sales": special})
+        self.assertIs(registry.for_expert(self.experts[1]).llm, special)
+        self.assertIs(registry.for_expert(self.experts[0]).llm, self.default)
+
+    def test_generation_role_with_factory(self):
+        registry = LLMRegistry(self.default, generation="gen", factory=self.registry.factory)
+        unset = Expert(name="support", description="Support", system_prompt="Support")
+        self.assertEqual(registry.for_expert(unset).model_name, "gen")
+        # An explicit model name still wins, even when it equals the field default
+        default_name = Expert.model_fields["model_name"].default
+        explicit = Expert(name="billing", description="Billing", system_prompt="Billing", model_name=default_name)
+        self.assertEqual(registry.for_expert(explicit).model_name, default_name)
+        self.assertEqual(registry.for_expert(self.experts[1]).model_name, "pro")
+        # Without a generation role, unset experts fall back to default
+        fallback = LLMRegistry(self.default, factory=self.registry.factory)
+        self.assertIs(fallback.for_expert(unset).llm, self.default)
+
+    def test_flow_uses_tiers_and_accounts_tokens(self):
+        flow = Flow(Router(self.experts, self.registry), self.registry)
+        response = flow.process_turn("I want to buy", user_id="user1")
+        self.assertEqual(response.agent_name, "sales")
+        self.assertEqual(response.content, "reply from pro")
+
+        usage = flow.get_token_usage()
+        self.assertEqual(usage["roles"]["router"], {"calls": 1, "total": 10})
+        self.assertEqual(usage["roles"]["generation"], {"calls": 1, "total": 10})
+        self.assertEqual(set(usage["models"]), {"flash-lite", "pro"})
+        self.assertEqual(self.default.calls, 0)
+
+    def test_summaries_use_summarizer_model(self):
+        flow = Flow(Router(self.experts, self.registry), self.registry, optimize=True, estimate_tokens=True)
+        long_reply = NamedMockLLM("flash")
+        long_reply.default_response = "A fairly long answer " * 20
+        self.registry.experts["orchestrator"] = long_reply
+        for i in range(12):
+            flow.process_turn(f"question {i}", user_id="user1")
+        self.assertIn("summarizer", flow.get_token_usage()["roles"])
+
+if __name__ == '__main__':
+    unittest.main()
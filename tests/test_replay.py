@@ -0,0 +1,110 @@
+import os
+import time
+import asyncio
+import tempfile
+import unittest
+from aghentic_minds.router import Router
+from aghentic_minds.session import Flow
+from aghentic_minds.types import Expert, Message
+from aghentic_minds.llm.mock import MockLLM, LatencyMockLLM
+from aghentic_minds.llm.replay import RecordingLLM, ReplayLLM, ReplayStore, ReplayMissError, request_key
+
+MESSAGES = [Message(role="user", content="hello")]
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "replay.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_request_key(self):
+        key = request_key(MESSAGES, "sys", session_id="alice")
+        # The session id and message metadata don't change the response
+        self.assertEqual(key, request_key([Message(role="user", content="hello", metadata={"a": 1})], "sys", session_id="bob"))
+        self.assertNotEqual(key, request_key(MESSAGES, "other sys"))
+        self.assertNotEqual(key, request_key(MESSAGES, "sys", tools=[print]))
+        self.assertNotEqual(key, request_key(MESSAGES, "sys", temperature=0.2))
+
+    def test_record_then_replay_from_disk(self):
+        store = ReplayStore(self.path)
+        recorder = RecordingLLM(LatencyMockLLM(default_response="recorded", generation_latency=0.02), store)
+        self.assertEqual(recorder.generate(MESSAGES, system_prompt="sys"), "recorded")
+        self.assertEqual(recorder.recorded, 1)
+        store.close()
+
+        for preload in (True, False):
+            replay_store = ReplayStore(self.path, preload=preload)
+            llm = ReplayLLM(replay_store)
+            self.assertEqual(len(replay_store), 1)
+            self.assertEqual(llm.generate(MESSAGES, system_prompt="sys"), "recorded")
+            self.assertEqual(llm.get_token_usage(), {"total": 42})
+            recording = replay_store.get(request_key(MESSAGES, "sys"))
+            self.assertGreaterEqual(recording.latency, 0.02)
+            replay_store.close()
+
+    def test_miss_raises_or_uses_fallback(self):
+        llm = ReplayLLM(ReplayStore(self.path))
+        with self.assertRaises(ReplayMissError):
+            llm.generate(MESSAGES)
+
+        fallback = ReplayLLM(ReplayStore(self.path), fallback=MockLLM(default_response="live"))
+        self.assertEqual(fallback.generate(MESSAGES), "live")
+        self.assertEqual(fallback.get_stats()["misses"], 1)
+
+    def test_replays_recorded_latency(self):
+        store = ReplayStore(self.path)
+        RecordingLLM(LatencyMockLLM(generation_latency=0.05), store).generate(MESSAGES)
+
+        fast = ReplayLLM(store)
+        started = time.monotonic()
+        fast.generate(MESSAGES)
+        self.assertLess(time.monotonic() - started, 0.03)
+
+        slow = ReplayLLM(store, replay_latency=True, latency_scale=2.0)
+        started = time.monotonic()
+        slow.generate(MESSAGES)
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        self.assertGreaterEqual(slow.get_stats()["replayed_latency"], 0.1)
+
+    def test_stream_keeps_chunks_and_first_chunk_latency(self):
+        store = ReplayStore(self.path)
+        inner = MockLLM(default_response="a streamed reply", stream_chunk_size=4, stream_delay=0.01)
+        self.assertEqual(list(RecordingLLM(inner, store).stream(MESSAGES)), ["a st", "ream", "ed r", "eply"])
+
+        recording = store.get(request_key(MESSAGES))
+        self.assertEqual(recording.chunks, ["a st", "ream", "ed r", "eply"])
+        self.assertLess(recording.first_chunk_latency, recording.latency)
+
+        llm = ReplayLLM(store, replay_latency=True)
+        started = time.monotonic()
+        self.assertEqual(list(llm.stream(MESSAGES)), recording.chunks)
+        self.assertGreaterEqual(time.monotonic() - started, recording.latency * 0.9)
+        # A streamed recording also answers `generate`
+        self.assertEqual(llm.generate(MESSAGES), "a streamed reply")
+
+    def test_async_record_and_replay(self):
+        async def run():
+            store = ReplayStore(self.path)
+            await RecordingLLM(MockLLM(default_response="async"), store).agenerate(MESSAGES)
+            self.assertEqual(await ReplayLLM(store, replay_latency=True).agenerate(MESSAGES), "async")
+        asyncio.run(run())
+
+    def test_flow_replays_a_recorded_conversation(self):
+        experts = [Expert(name="orchestrator", description="General", system_prompt="sys"),
+                   Expert(name="sales", description="Sales", system_prompt="sales sys")]
+        store = ReplayStore(self.path)
+        recorder = RecordingLLM(MockLLM(responses={"price": "It costs $10."}, routing_rules={"price": "sales"}), store)
+        live = Flow(Router(experts, recorder), recorder)
+        recorded = [live.process_turn(m, user_id="alice") for m in ("What is the price?", "And the price for two?")]
+
+        # Same conversation for another user, served only from the recordings
+        replay = ReplayLLM(store)
+        flow = Flow(Router(experts, replay), replay)
+        replayed = [flow.process_turn(m, user_id="bob") for m in ("What is the price?", "And the price for two?")]
+        self.assertEqual([(r.agent_name, r.content) for r in replayed], [(r.agent_name, r.content) for r in recorded])
+        self.assertEqual(replay.get_stats()["misses"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
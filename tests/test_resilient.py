@@ -0,0 +1,185 @@
+import time
+import asyncio
+import unittest
+from aghentic_minds.router import Router
+from aghentic_minds.types import Expert, Message
+from aghentic_minds.llm.mock import FaultyMockLLM, LatencyMockLLM
+from aghentic_minds.llm.resilient import ResilientLLM, CircuitBreaker, LLMTimeoutError, CircuitOpenError
+
+MESSAGES = [Message(role="user", content="hello")]
+
+def sequence(*delays):
+    """Latency distribution returning the given delays in order, then 0."""
+    remaining = list(delays)
+    return lambda rng: remaining.pop(0) if remaining else 0.0
+
+class TestResilientLLM(unittest.TestCase):
+    def test_retries_transient_errors(self):
+        inner = FaultyMockLLM(default_response="ok", fail_first=2)
+        llm = ResilientLLM(inner, max_retries=2, backoff=0.001, seed=1)
+
+        self.assertEqual(llm.generate(MESSAGES), "ok")
+        self.assertEqual(inner.calls, 3)
+        self.assertEqual(llm.get_stats()["retries"], 2)
+
+    def test_gives_up_after_max_retries(self):
+        inner = FaultyMockLLM(fail_first=10)
+        llm = ResilientLLM(inner, max_retries=1, backoff=0.001)
+
+        with self.assertRaises(ConnectionError):
+            llm.generate(MESSAGES)
+        self.assertEqual(inner.calls, 2)
+        self.assertEqual(llm.get_stats()["failures"], 1)
+
+    def test_non_transient_errors_are_not_retried(self):
+        inner = FaultyMockLLM(fail_first=1, error=ValueError)
+        llm = ResilientLLM(inner, max_retries=3, backoff=0.001)
+
+        with self.assertRaises(ValueError):
+            llm.generate(MESSAGES)
+        self.assertEqual(inner.calls, 1)
+
+    def test_timeout(self):
+        inner = LatencyMockLLM(generation_latency=0.5)
+        llm = ResilientLLM(inner, timeout=0.05, max_retries=0)
+
+        started = time.monotonic()
+        with self.assertRaises(LLMTimeoutError):
+            llm.generate(MESSAGES)
+        self.assertLess(time.monotonic() - started, 0.3)
+        self.assertEqual(llm.get_stats()["timeouts"], 1)
+        llm.close()
+
+    def test_timeout_is_retried(self):
+        inner = LatencyMockLLM(default_response="ok", generation_latency=sequence(0.5))
+        llm = ResilientLLM(inner, timeout=0.05, max_retries=1, backoff=0.001)
+
+        self.assertEqual(llm.generate(MESSAGES), "ok")
+        self.assertEqual(llm.get_stats()["retries"], 1)
+        llm.close()
+
+    def test_hedged_request_wins(self):
+        # First request stalls, the hedge answers right away
+        inner = LatencyMockLLM(default_response="ok", generation_latency=sequence(1.0))
+        llm = ResilientLLM(inner, hedge=True, hedge_delay=0.02)
+
+        started = time.monotonic()
+        self.assertEqual(llm.generate(MESSAGES), "ok")
+        self.assertLess(time.monotonic() - started, 0.5)
+        stats = llm.get_stats()
+        self.assertEqual(stats["hedged"], 1)
+        self.assertEqual(stats["hedge_wins"], 1)
+        llm.close()
+
+    def test_adaptive_hedge_delay(self):
+        llm = ResilientLLM(LatencyMockLLM(), hedge=True, hedge_min_samples=5)
+        for _ in range(4):
+            llm.generate(MESSAGES)
+        self.assertIsNone(llm.current_hedge_delay())
+        llm.generate(MESSAGES)
+        self.assertIsNotNone(llm.current_hedge_delay())
+        llm.close()
+
+    def test_circuit_breaker_opens_and_recovers(self):
+        inner = FaultyMockLLM(default_response="ok", fail_first=3)
+        llm = ResilientLLM(inner, max_retries=0, failure_threshold=3, reset_timeout=0.05)
+
+        for _ in range(3):
+            with self.assertRaises(ConnectionError):
+                llm.generate(MESSAGES)
+        # Open: fails fast without calling the provider
+        with self.assertRaises(CircuitOpenError):
+            llm.generate(MESSAGES)
+        self.assertEqual(inner.calls, 3)
+        self.assertEqual(llm.get_stats()["circuit"], CircuitBreaker.OPEN)
+
+        time.sleep(0.06)
+        self.assertEqual(llm.generate(MESSAGES), "ok")
+        self.assertEqual(llm.get_stats()["circuit"], CircuitBreaker.CLOSED)
+
+    def test_half_open_failure_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.02)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow()) # Only one trial at a time
+        breaker.failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_stream_retries_before_first_chunk(self):
+        inner = FaultyMockLLM(default_response="streamed reply", fail_first=1, stream_chunk_size=4)
+        llm = ResilientLLM(inner, backoff=0.001)
+
+        self.assertEqual("".join(llm.stream(MESSAGES)), "streamed reply")
+        self.assertEqual(inner.calls, 2)
+
+    def open_then_half_open(self, llm):
+        for _ in range(llm.breaker.failure_threshold):
+            llm.breaker.failure()
+        time.sleep(llm.breaker.reset_timeout + 0.01)
+
+    def test_stream_closed_early_closes_half_open_breaker(self):
+        llm = ResilientLLM(FaultyMockLLM(default_response="streamed reply", stream_chunk_size=4),
+                           failure_threshold=1, reset_timeout=0.02)
+        self.open_then_half_open(llm)
+        stream = llm.stream(MESSAGES)
+        self.assertEqual(next(stream), "stre")
+        stream.close()
+        self.assertEqual(llm.get_stats()["circuit"], CircuitBreaker.CLOSED)
+        self.assertEqual(llm.generate(MESSAGES), "streamed reply")
+
+    def test_stream_failure_after_first_chunk(self):
+        class BrokenStreamLLM(FaultyMockLLM):
+            def stream(self, messages, system_prompt=None, tools=None, **kwargs):
+                yield "partial"
+                raise ConnectionError("connection reset")
+
+        llm = ResilientLLM(BrokenStreamLLM(), failure_threshold=1, reset_timeout=60)
+        stream = llm.stream(MESSAGES)
+        self.assertEqual(next(stream), "partial")
+        with self.assertRaises(ConnectionError):
+            next(stream)
+        self.assertEqual(llm.get_stats()["circuit"], CircuitBreaker.OPEN)
+        self.assertEqual(llm.get_stats()["failures"], 1)
+
+    def test_cancelled_async_trial_is_released(self):
+        async def run():
+            llm = ResilientLLM(LatencyMockLLM(default_response="ok", generation_latency=sequence(1.0)),
+                               failure_threshold=1, reset_timeout=0.02)
+            self.open_then_half_open(llm)
+            task = asyncio.ensure_future(llm.agenerate(MESSAGES))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(await llm.agenerate(MESSAGES), "ok")
+        asyncio.run(run())
+
+    def test_async_retry_timeout_and_hedge(self):
+        async def run():
+            flaky = ResilientLLM(FaultyMockLLM(default_response="ok", fail_first=1), backoff=0.001)
+            self.assertEqual(await flaky.agenerate(MESSAGES), "ok")
+
+            slow = ResilientLLM(LatencyMockLLM(generation_latency=0.5), timeout=0.05, max_retries=0)
+            with self.assertRaises(LLMTimeoutError):
+                await slow.agenerate(MESSAGES)
+
+            hedged = ResilientLLM(LatencyMockLLM(default_response="ok", generation_latency=sequence(1.0)), hedge=True, hedge_delay=0.02)
+            started = time.monotonic()
+            self.assertEqual(await hedged.agenerate(MESSAGES), "ok")
+            self.assertLess(time.monotonic() - started, 0.5)
+            self.assertEqual(hedged.get_stats()["hedge_wins"], 1)
+        asyncio.run(run())
+
+    def test_router_with_resilient_llm(self):
+        experts = [Expert(name="orchestrator", description="General", system_prompt=""),
+                   Expert(name="sales", description="Sales", system_prompt="")]
+        inner = FaultyMockLLM(routing_rules={"buy": "sales"}, fail_first=1)
+        router = Router(experts, ResilientLLM(inner, backoff=0.001))
+
+        # The transient failure is retried instead of falling back to the current expert
+        self.assertEqual(router.classify("I want to buy", "orchestrator"), "sales")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,12 @@
+import time
+import asyncio
+import threading
 import unittest
 from aghentic_minds.router import Router
 from aghentic_minds.types import Expert
-from aghentic_minds.llm.mock import MockLLM
+from aghentic_minds.llm.mock import MockLLM, CountingMockLLM
+from aghentic_minds.embedding import np
+from aghentic_minds.cache import LRUCache
 
 class TestRouter(unittest.TestCase):
     def setUp(self):
@@ -33,5 +38,139 @@ class TestRouter(unittest.TestCase):
         expert = self.router.classify("random text", "orchestrator")
         self.assertEqual(expert, "orchestrator")
 
+    def test_aclassify_matches_classify(self):
+        expert = asyncio.run(self.router.aclassify("I want to buy something", "orchestrator"))
+        self.assertEqual(expert, "sales")
+
+class TestRoutingCache(unittest.TestCase):
+    def setUp(self):
+        self.experts = [
+            Expert(name="sales", description="Sales expert", system_prompt="sales sys"),
+            Expert(name="support", description="Support expert", system_prompt="support sys")
+        ]
+        self.mock_llm = CountingMockLLM(routing_rules={"pricing": "sales", "reset": "support"})
+        self.router = Router(self.experts, self.mock_llm, cache=LRUCache(max_size=2))
+
+    def test_repeated_messages_hit_cache(self):
+        self.assertEqual(self.router.classify("Pricing?", "orchestrator"), "sales")
+        self.assertEqual(self.router.classify("  pricing ", "orchestrator"), "sales")
+        self.assertEqual(self.mock_llm.calls, 1)
+        self.assertEqual(self.router.get_stats()["cache"], 1)
+
+    def test_key_includes_current_expert(self):
+        self.router.classify("pricing", "orchestrator")
+        self.router.classify("pricing", "support")
+        self.assertEqual(self.mock_llm.calls, 2)
+
+    def test_lru_eviction(self):
+        for message in ["pricing", "reset", "hello"]:
+            self.router.classify(message, "orchestrator")
+        self.router.classify("pricing", "orchestrator")
+        self.assertEqual(self.mock_llm.calls, 4)
+        self.assertGreaterEqual(self.router.cache.get_stats()["evictions"], 1)
+
+    def test_ttl_expiry(self):
+        cache = LRUCache(ttl=0.01)
+        cache.set("k", "v")
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(cache.get_stats()["expirations"], 1)
+
+    def test_expert_set_change_invalidates(self):
+        self.router.classify("pricing", "orchestrator")
+        self.router.add_expert(Expert(name="billing", description="Billing expert", system_prompt="billing sys"))
+        self.router.classify("pricing", "orchestrator")
+        self.assertEqual(self.mock_llm.calls, 2)
+
+    def test_stats_count_every_decision_across_threads(self):
+        router = Router(self.experts, self.mock_llm, cache=LRUCache(max_size=100))
+        def worker(t):
+            for i in range(200):
+                router.classify(f"pricing {i % 20}", "sales")
+        pool = [threading.Thread(target=worker, args=(t,)) for t in range(8)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+
+        stats = router.get_stats()
+        self.assertEqual(stats["cache"] + stats["fast_path"] + stats["llm"], 1600)
+        self.assertEqual(router.prompt_stats["prompts"], stats["llm"])
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestFastPathRouter(unittest.TestCase):
+    def setUp(self):
+        self.experts = [
+            Expert(name="sales", description="Handles sales inquiries, pricing, plans and billing.", system_prompt="sales sys",
+                   examples=["how much does it cost", "pricing?", "I want to buy the premium plan"]),
+            Expert(name="support", description="Handles technical support, troubleshooting, and bugs.", system_prompt="support sys",
+                   examples=["reset my password", "the app crashes", "I have a problem with my account"])
+        ]
+        # The LLM would route everything to support, so fast-path decisions are distinguishable
+        self.mock_llm = MockLLM(routing_rules={"": "support"})
+        self.router = Router(self.experts, self.mock_llm, fast_path_threshold=0.3)
+
+    def test_confident_messages_skip_llm(self):
+        self.assertEqual(self.router.classify("pricing?", "support"), "sales")
+        self.assertEqual(self.router.classify("thanks", "sales"), "orchestrator")
+        self.assertEqual(self.router.tier_stats, {"cache": 0, "fast_path": 2, "llm": 0})
+
+    def test_ambiguous_messages_fall_back_to_llm(self):
+        self.assertEqual(self.router.classify("what is the weather like", "sales"), "support")
+        stats = self.router.get_stats()
+        self.assertEqual(stats["llm"], 1)
+        self.assertEqual(stats["llm_rate"], 1.0)
+
+    def test_disabled_by_default(self):
+        router = Router(self.experts, self.mock_llm)
+        self.assertEqual(router.classify("pricing?", "sales"), "support")
+        self.assertEqual(router.tier_stats["fast_path"], 0)
+
+class PromptCapturingLLM(MockLLM):
+    def generate(self, messages, system_prompt=None, tools=None, **kwargs):
+        self.last_prompt = messages[-1].content
+        return super().generate(messages, system_prompt, tools, **kwargs)
+
+class TestRouterPrompt(unittest.TestCase):
+    def setUp(self):
+        self.experts = [Expert(name=f"expert{i}", description=f"Handles   topic {i} questions.", system_prompt="sys") for i in range(50)]
+        self.experts.append(Expert(name="sales", description="Handles sales, pricing, plans and billing.", system_prompt="sys",
+                                   examples=["how much does it cost"]))
+        self.llm = PromptCapturingLLM(routing_rules={"price": "sales"})
+
+    def test_catalog_compiled_once(self):
+        router = Router(self.experts, self.llm)
+        head = router._prompt_head
+        router.classify("what is the price", "orchestrator")
+        self.assertIs(router._prompt_head, head)
+        self.assertTrue(self.llm.last_prompt.startswith(head))
+        self.assertIn("- expert3: Handles topic 3 questions.", head)
+        self.assertIn('User Message: "what is the price"', self.llm.last_prompt)
+
+        router.add_expert(Expert(name="support", description="Bugs", system_prompt="sys"))
+        self.assertIn("- support: Bugs", router._prompt_head)
+
+    def test_prompt_size_is_tracked(self):
+        router = Router(self.experts, self.llm)
+        router.classify("what is the price", "orchestrator", ["user: hi", "assistant: hello"])
+        stats = router.get_stats()
+        self.assertGreater(stats["avg_prompt_tokens"], 0)
+        self.assertEqual(stats["avg_prompt_tokens"], len(self.llm.last_prompt) // 4)
+
+    @unittest.skipIf(np is None, "numpy not installed")
+    def test_prefilter_lists_top_candidates(self):
+        router = Router(self.experts, self.llm, prefilter_k=5)
+        self.assertEqual(router.classify("what is the price of the plans", "expert7"), "sales")
+        listed = [line for line in self.llm.last_prompt.splitlines() if line.startswith("- ")]
+        names = [line[2:].split(":")[0] for line in listed]
+        self.assertIn("sales", names)
+        self.assertIn("expert7", names)        # current expert is always listed
+        self.assertIn("orchestrator", names)   # and the default
+        self.assertLessEqual(len(names), 7)
+
+        full = Router(self.experts, self.llm)
+        full.classify("what is the price of the plans", "expert7")
+        self.assertLess(router.get_stats()["avg_prompt_tokens"], full.get_stats()["avg_prompt_tokens"] / 3)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,8 +1,14 @@
+import time
+import threading
+import asyncio
 import unittest
 from aghentic_minds.session import Flow
+from aghentic_minds.store import InMemorySessionStore
 from aghentic_minds.router import Router
-from aghentic_minds.types import Expert
-from aghentic_minds.llm.mock import MockLLM
+from aghentic_minds.types import Expert, Message
+from concurrent.futures import ThreadPoolExecutor
+from aghentic_minds.llm.base import BaseLLM
+from aghentic_minds.llm.mock import MockLLM, CountingMockLLM, LatencyMockLLM
 
 class TestSession(unittest.TestCase):
     def setUp(self):
@@ -41,5 +47,522 @@ class TestSession(unittest.TestCase):
         session2 = self.flow._get_session("user2")
         self.assertEqual(len(session2["history"]), 0)
 
+    def test_adapter_gets_a_list(self):
+        seen = []
+        class ListLLM(MockLLM):
+            def generate(self, messages, system_prompt=None, tools=None, **kwargs):
+                seen.append(messages)
+                # Adapters written against List[Message] concatenate and append
+                messages = messages + [Message(role="user", content="(reminder)")]
+                messages.append(Message(role="user", content="(end)"))
+                return super().generate(messages[:-2], system_prompt, tools, **kwargs)
+
+        llm = ListLLM(responses={"hello": "Hello there!"})
+        flow = Flow(Router(self.experts, llm), llm)
+        flow.process_turn("hello", user_id="user1")
+        self.assertEqual(flow.process_turn("hello again", user_id="user1").content, "Hello there!")
+        generation = [m for m in seen if not MockLLM._is_routing(m)][-1]
+        self.assertIsInstance(generation, list)
+        self.assertEqual([m.content for m in generation], ["hello", "Hello there!", "hello again"])
+
+class TestStreamingSession(unittest.TestCase):
+    def setUp(self):
+        experts = [
+            Expert(name="orchestrator", description="General", system_prompt="sys"),
+            Expert(name="sales", description="Sales expert", system_prompt="sales sys")
+        ]
+        self.mock_llm = MockLLM(
+            responses={"buy": "Sure, what would you like to buy today?"},
+            routing_rules={"buy": "sales"},
+            stream_chunk_size=5, stream_delay=0.01
+        )
+        self.flow = Flow(Router(experts, self.mock_llm), self.mock_llm)
+
+    def test_stream_turn_events(self):
+        chunks = list(self.flow.stream_turn("I want to buy", user_id="user1"))
+
+        self.assertEqual(chunks[0].type, "route")
+        self.assertEqual(chunks[0].agent_name, "sales")
+        self.assertTrue(chunks[0].switched_context)
+        content = [c.content for c in chunks if c.type == "content"]
+        self.assertGreater(len(content), 1)
+        self.assertEqual(chunks[-1].type, "done")
+        self.assertEqual(chunks[-1].content, "".join(content))
+        self.assertEqual(chunks[-1].content, "Sure, what would you like to buy today?")
+
+        history = self.flow._get_session("user1")["history"]
+        self.assertEqual(history[-1].content, "Sure, what would you like to buy today?")
+
+    def test_first_content_before_full_generation(self):
+        produced = []
+        original = self.mock_llm.stream
+        def tracked(*args, **kwargs):
+            for chunk in original(*args, **kwargs):
+                produced.append(chunk)
+                yield chunk
+        self.mock_llm.stream = tracked
+
+        stream = self.flow.stream_turn("I want to buy", user_id="user1")
+        next(stream) # route
+        first = next(stream) # first content chunk
+        # Forwarded as soon as the LLM produced it, before the rest was generated
+        self.assertEqual(produced, [first.content])
+        self.assertEqual(self.flow._get_session("user1")["history"], [])
+        list(stream)
+        self.assertGreater(len(produced), 1)
+
+class TestOptimizedSession(unittest.TestCase):
+    def setUp(self):
+        experts = [Expert(name="orchestrator", description="General", system_prompt="sys")]
+        self.mock_llm = MockLLM(default_response="A fairly long answer " * 20)
+        self.count_calls = []
+        original = self.mock_llm.count_tokens
+        self.mock_llm.count_tokens = lambda text: self.count_calls.append(text) or original(text)
+        self.flow = Flow(Router(experts, self.mock_llm), self.mock_llm, optimize=True)
+
+    def test_running_total_matches_history(self):
+        for i in range(3):
+            self.flow.process_turn(f"question {i}", user_id="user1")
+        session = self.flow._get_session("user1")
+        self.assertEqual(session["tokens"], sum(m.token_count for m in session["history"]))
+        # Only the new messages are counted each turn, never the whole history
+        self.assertEqual(len(self.count_calls), 6)
+
+    def test_summarization_resets_total(self):
+        for i in range(12):
+            self.flow.process_turn(f"question {i}", user_id="user1")
+        session = self.flow._get_session("user1")
+        self.assertTrue(session["history"][0].content.startswith("Previous conversation summary:"))
+        self.assertEqual(session["tokens"], sum(m.token_count for m in session["history"]))
+
+    def test_async_turns_match_sync_turns(self):
+        experts = [Expert(name="orchestrator", description="General", system_prompt="sys")]
+        llm = MockLLM(default_response="A fairly long answer " * 20)
+        flow = Flow(Router(experts, llm), llm, optimize=True)
+
+        async def run():
+            for i in range(12):
+                await flow.aprocess_turn(f"question {i}", user_id="user1")
+        asyncio.run(run())
+        for i in range(12):
+            self.flow.process_turn(f"question {i}", user_id="user1")
+
+        sync_session, async_session = self.flow._get_session("user1"), flow._get_session("user1")
+        self.assertEqual([m.content for m in async_session["history"]], [m.content for m in sync_session["history"]])
+        self.assertEqual(async_session["tokens"], sync_session["tokens"])
+        self.assertEqual(async_session["tokens"], sum(m.token_count for m in async_session["history"]))
+
+    def test_estimate_tokens_never_calls_tokenizer(self):
+        self.flow.estimate_tokens = True
+        self.flow.process_turn("question", user_id="user1")
+        self.assertEqual(self.count_calls, [])
+
+class SummaryBlockingLLM(MockLLM):
+    """Summarization calls block until released, to observe them running in the background."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.release = threading.Event()
+        self.summary_calls = 0
+
+    def generate(self, messages, system_prompt=None, tools=None, **kwargs):
+        if system_prompt and "summarizes" in system_prompt:
+            self.summary_calls += 1
+            self.release.wait(timeout=5)
+            return "compact summary"
+        return super().generate(messages, system_prompt, tools, **kwargs)
+
+class TestBackgroundSummarization(unittest.TestCase):
+    def setUp(self):
+        experts = [Expert(name="orchestrator", description="General", system_prompt="sys")]
+        self.mock_llm = SummaryBlockingLLM(default_response="A fairly long answer " * 20)
+        self.flow = Flow(Router(experts, self.mock_llm), self.mock_llm, optimize=True, background_summarize=True)
+
+    def tearDown(self):
+        self.mock_llm.release.set()
+        self.flow.close()
+
+    def test_summary_applied_on_next_turn(self):
+        for i in range(8):
+            self.flow.process_turn(f"question {i}", user_id="user1")
+        # Turns kept completing while the summarization was blocked, and only one was started
+        self.assertEqual(self.mock_llm.summary_calls, 1)
+        self.assertTrue(self.flow._summarizer.pending("user1"))
+        self.assertFalse(self.flow._get_session("user1")["history"][0].content.startswith("Previous conversation summary:"))
+
+        self.mock_llm.release.set()
+        self.flow._summarizer.join(timeout=5)
+        self.flow.process_turn("one more", user_id="user1")
+
+        session = self.flow._get_session("user1")
+        self.assertEqual(session["history"][0].content, "Previous conversation summary: compact summary")
+        self.assertEqual(session["history"][-1].role, "assistant")
+        self.assertEqual(session["tokens"], sum(m.token_count for m in session["history"]))
+
+    def test_stale_summary_is_discarded(self):
+        summarizer = self.flow._summarizer
+        history = [Message(role="user", content=f"msg {i}") for i in range(10)]
+        self.mock_llm.release.set()
+        self.assertTrue(summarizer.submit("user1", history, current_tokens=1000))
+        summarizer.join(timeout=5)
+        self.assertIsNone(summarizer.apply("user1", history[2:]))
+        self.assertFalse(summarizer.pending("user1"))
+
+class SlowMockLLM(CountingMockLLM):
+    def generate(self, messages, system_prompt=None, tools=None, **kwargs):
+        time.sleep(0.05)
+        return super().generate(messages, system_prompt, tools, **kwargs)
+
+    async def agenerate(self, messages, system_prompt=None, tools=None, **kwargs):
+        await asyncio.sleep(0.05)
+        return self._respond(messages)
+
+class GatedMockLLM(CountingMockLLM):
+    """
+    Routing waits (up to 2s) for a generation to start and records whether one did;
+    generations of messages containing "hold" wait for `release`.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.generating = threading.Event()
+        self.release = threading.Event()
+        self.overlapped = None
+
+    def generate(self, messages, system_prompt=None, tools=None, **kwargs):
+        if self._is_routing(messages):
+            self.overlapped = self.generating.wait(timeout=2)
+        else:
+            self.generating.set()
+            if "hold" in messages[-1].content:
+                self.release.wait(timeout=5)
+        return super().generate(messages, system_prompt, tools, **kwargs)
+
+class TestSpeculativeSession(unittest.TestCase):
+    def setUp(self):
+        self.experts = [
+            Expert(name="orchestrator", description="General", system_prompt="sys"),
+            Expert(name="sales", description="Sales expert", system_prompt="sales sys")
+        ]
+        self.mock_llm = SlowMockLLM(
+            responses={"hello": "Hello there!", "buy": "Sure, what do you want?"},
+            routing_rules={"buy": "sales", "hello": "orchestrator"}
+        )
+        self.flow = Flow(Router(self.experts, self.mock_llm), self.mock_llm, speculative=True)
+
+    def tearDown(self):
+        self.flow.close()
+
+    def test_hit_uses_speculative_response(self):
+        response = self.flow.process_turn("hello", user_id="user1")
+
+        self.assertEqual(response.content, "Hello there!")
+        # The speculative reply is used: one routing call, one generation, nothing regenerated
+        self.assertEqual((self.mock_llm.routing_calls, self.mock_llm.generation_calls), (1, 1))
+        stats = self.flow.get_speculation_stats()
+        self.assertEqual((stats["turns"], stats["hits"], stats["misses"]), (1, 1, 0))
+
+    def test_miss_regenerates_with_new_expert(self):
+        response = self.flow.process_turn("I want to buy", user_id="user1")
+        self.assertEqual(response.agent_name, "sales")
+        self.assertEqual(response.content, "Sure, what do you want?")
+        self.assertEqual(len(self.flow._get_session("user1")["history"]), 2)
+        # The discarded speculative generation (finished in the background) plus the one for the new expert
+        self.flow._executor.shutdown(wait=True)
+        self.assertEqual((self.mock_llm.routing_calls, self.mock_llm.generation_calls), (1, 2))
+        stats = self.flow.get_speculation_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 1))
+
+    def test_generation_overlaps_classification(self):
+        llm = GatedMockLLM(responses={"hello": "Hello there!"})
+        flow = Flow(Router(self.experts, llm), llm, speculative=True)
+        self.assertEqual(flow.process_turn("hello", user_id="user1").content, "Hello there!")
+        # The router was still classifying when the generation started
+        self.assertTrue(llm.overlapped)
+        flow.close()
+
+    def test_skips_speculation_without_an_idle_worker(self):
+        llm = GatedMockLLM(responses={"hello": "Hello there!", "hold": "Held."})
+        flow = Flow(Router(self.experts, llm), llm, speculative=True, max_workers=1)
+        held = ThreadPoolExecutor(max_workers=1).submit(flow.process_turn, "hold on", "user1")
+        self.assertTrue(llm.generating.wait(timeout=2))
+
+        # The only worker is busy with user1's speculation: user2 generates inline instead of queueing
+        self.assertEqual(flow.process_turn("hello", user_id="user2").content, "Hello there!")
+        stats = flow.get_speculation_stats()
+        self.assertEqual((stats["turns"], stats["skipped"]), (0, 1))
+
+        llm.release.set()
+        self.assertEqual(held.result(timeout=5).content, "Held.")
+        stats = flow.get_speculation_stats()
+        self.assertEqual((stats["turns"], stats["hits"], stats["skipped"]), (1, 1, 1))
+        self.assertEqual(flow._speculating, 0)
+        flow.close()
+
+    def test_async_speculation(self):
+        async def run():
+            await self.flow.aprocess_turn("hello", user_id="user1")
+            return await self.flow.aprocess_turn("I want to buy", user_id="user1")
+
+        response = asyncio.run(run())
+        self.assertEqual(response.agent_name, "sales")
+        stats = self.flow.get_speculation_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+class TestBatchProcessing(unittest.TestCase):
+    def setUp(self):
+        self.experts = [
+            Expert(name="orchestrator", description="General", system_prompt="sys"),
+            Expert(name="sales", description="Sales expert", system_prompt="sales sys")
+        ]
+        self.mock_llm = SlowMockLLM(
+            responses={"hello": "Hello there!", "buy": "Sure, what do you want?"},
+            routing_rules={"buy": "sales", "hello": "orchestrator"}
+        )
+        self.flow = Flow(Router(self.experts, self.mock_llm), self.mock_llm)
+
+    def test_users_keep_input_order(self):
+        requests = [(f"user{i % 4}", f"hello {turn}") for turn in range(3) for i in range(4)]
+        results = list(self.flow.process_turns(requests, max_concurrency=4))
+
+        self.assertEqual(sorted(r.index for r in results), list(range(12)))
+        self.assertTrue(all(r.error is None for r in results))
+        for u in range(4):
+            history = self.flow._get_session(f"user{u}")["history"]
+            self.assertEqual([m.content for m in history if m.role == "user"], ["hello 0", "hello 1", "hello 2"])
+
+    def test_errors_are_collected(self):
+        original = self.flow.process_turn
+        def flaky(message, user_id=None):
+            if message == "boom":
+                raise RuntimeError("store down")
+            return original(message, user_id)
+        self.flow.process_turn = flaky
+
+        results = {r.index: r for r in self.flow.process_turns([("a", "hello"), ("b", "boom"), ("a", "buy")])}
+        self.assertEqual(results[1].error, "RuntimeError: store down")
+        self.assertEqual(results[2].response.agent_name, "sales")
+
+    def test_timeout_keeps_user_order(self):
+        results = list(self.flow.process_turns([("a", "hello"), ("a", "buy")], timeout=0.06))
+        self.assertTrue(all(r.error.startswith("TimeoutError") for r in results))
+        history = self.flow._get_session("a")["history"]
+        self.assertEqual([m.content for m in history if m.role == "user"], ["hello", "buy"])
+
+    def test_timeout_ignores_time_queued_for_a_worker(self):
+        # 8 users on 2 workers: the last turns start ~0.3s after submission but each runs ~0.1s
+        requests = [(f"user{i}", "hello") for i in range(8)]
+        results = list(self.flow.process_turns(requests, max_concurrency=2, timeout=0.3))
+        self.assertEqual([r.error for r in results], [None] * 8)
+
+    def test_backpressure_limits_read_ahead(self):
+        consumed = []
+        def source():
+            for i in range(20):
+                consumed.append(i)
+                yield (f"user{i}", "hello")
+
+        results = self.flow.process_turns(source(), max_concurrency=2, max_pending=3)
+        next(results)
+        self.assertLessEqual(len(consumed), 4)
+        self.assertEqual(len(list(results)), 19)
+
+class TestLatencyMockLLM(unittest.TestCase):
+    def test_seeded_latency_is_reproducible(self):
+        first = LatencyMockLLM(generation_latency=("lognormal", 0.01, 0.5), seed=7)
+        second = LatencyMockLLM(generation_latency=("lognormal", 0.01, 0.5), seed=7)
+        samples = [first._sample(first.generation_latency) for _ in range(5)]
+        self.assertEqual(samples, [second._sample(second.generation_latency) for _ in range(5)])
+        self.assertTrue(all(s >= 0 for s in samples))
+
+    def test_routing_and_generation_latency(self):
+        llm = LatencyMockLLM(routing_rules={"price": "sales"}, routing_latency=0.05, generation_latency=0.0)
+        start = time.perf_counter()
+        self.assertEqual(llm.generate([Message(role="user", content="hello")]), "Mock Response")
+        self.assertLess(time.perf_counter() - start, 0.04)
+        start = time.perf_counter()
+        self.assertEqual(llm.generate([Message(role="user", content='You are an Intent Router. User Message: "price?"')]), "sales")
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+class TestConcurrentFlow(unittest.TestCase):
+    def setUp(self):
+        self.experts = [
+            Expert(name="orchestrator", description="General", system_prompt="sys"),
+            Expert(name="sales", description="Sales expert", system_prompt="sales sys")
+        ]
+
+    def make_flow(self, latency=0.0):
+        llm = LatencyMockLLM(routing_rules={"buy": "sales"}, routing_latency=latency, generation_latency=latency)
+        return Flow(Router(self.experts, llm), llm, max_turns=100)
+
+    def run_threads(self, flow, threads, users, turns):
+        def worker(t):
+            for turn in range(turns):
+                for u in range(t, users, threads):
+                    flow.process_turn(f"user{u} turn {turn}", user_id=f"user{u}")
+        pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+
+    def test_same_user_turns_are_not_lost(self):
+        flow = self.make_flow(0.001)
+        def worker(t):
+            for turn in range(25):
+                flow.process_turn(f"t{t}-{turn}", user_id="shared")
+        pool = [threading.Thread(target=worker, args=(t,)) for t in range(8)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+
+        history = flow._get_session("shared")["history"]
+        self.assertEqual(len(history), 200)
+        # Each user message is directly followed by its own reply
+        self.assertTrue(all(history[i].role == "user" and history[i + 1].role == "assistant" for i in range(0, 200, 2)))
+        self.assertEqual(len({m.content for m in history if m.role == "user"}), 100)
+
+    def test_threads_over_many_users_keep_every_turn(self):
+        # Throughput scaling is measured by the shared_threads benchmark; here only correctness
+        flow = self.make_flow(0.001)
+        self.run_threads(flow, threads=8, users=16, turns=3)
+        for u in range(16):
+            history = flow._get_session(f"user{u}")["history"]
+            self.assertEqual([m.content for m in history if m.role == "user"], [f"user{u} turn {t}" for t in range(3)])
+            self.assertEqual([m.role for m in history], ["user", "assistant"] * 3)
+
+    def test_async_same_user_turns_are_serialized(self):
+        flow = self.make_flow(0.002)
+        async def run():
+            await asyncio.gather(*[flow.aprocess_turn(f"turn {i}", user_id="shared") for i in range(10)])
+        asyncio.run(run())
+        history = flow._get_session("shared")["history"]
+        self.assertEqual(len(history), 20)
+
+    def test_async_same_user_turns_with_more_waiters_than_executor_workers(self):
+        # agenerate defaults to asyncio.to_thread: waiting turns must not occupy the executor the running turn needs
+        class SyncOnlyLLM(BaseLLM):
+            def __init__(self):
+                self.mock = MockLLM(routing_rules={"buy": "sales"})
+            def generate(self, messages, system_prompt=None, tools=None, **kwargs):
+                time.sleep(0.001)
+                return self.mock.generate(messages)
+            def get_token_usage(self):
+                return {"total": 1}
+            def count_tokens(self, text):
+                return len(text) // 4
+
+        llm = SyncOnlyLLM()
+        flow = Flow(Router(self.experts, llm), llm, max_turns=100)
+        async def run():
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2))
+            await asyncio.wait_for(asyncio.gather(*[flow.aprocess_turn(f"turn {i}", user_id="same") for i in range(16)]), 10)
+        asyncio.run(run())
+        history = flow._get_session("same")["history"]
+        self.assertEqual(len(history), 32)
+        self.assertEqual(len({m.content for m in history if m.role == "user"}), 16)
+
+    def test_async_waits_for_a_turn_held_by_a_thread(self):
+        flow = self.make_flow(0.02)
+        thread = threading.Thread(target=flow.process_turn, args=("from a thread", "shared"))
+        thread.start()
+        time.sleep(0.005)
+        asyncio.run(flow.aprocess_turn("from the loop", user_id="shared"))
+        thread.join()
+        history = flow._get_session("shared")["history"]
+        self.assertEqual([m.content for m in history if m.role == "user"], ["from a thread", "from the loop"])
+
+    def test_interleaved_streams_in_one_thread(self):
+        # One stripe: every user shares it, as in a single-threaded server round-robining streams
+        llm = MockLLM(default_response="a longer streamed reply", stream_chunk_size=4)
+        flow = Flow(Router(self.experts, llm), llm, lock_stripes=1)
+        pending = {u: flow.stream_turn("hello", user_id=f"user{u}") for u in range(3)}
+        chunks = {u: [] for u in pending}
+        while pending:
+            for u, stream in list(pending.items()):
+                chunk = next(stream, None)
+                if chunk is None:
+                    del pending[u]
+                else:
+                    chunks[u].append(chunk)
+        for u in range(3):
+            self.assertEqual(chunks[u][-1].content, "a longer streamed reply")
+            self.assertEqual(len(flow._get_session(f"user{u}")["history"]), 2)
+
+    def test_closed_stream_releases_its_user(self):
+        flow = self.make_flow()
+        stream = flow.stream_turn("hello", user_id="user1")
+        next(stream)
+        stream.close()
+        # Would wait forever if the closed stream still held the user
+        self.assertEqual(flow.process_turn("hello", user_id="user1").agent_name, "orchestrator")
+
+    def test_store_readers_see_published_sessions(self):
+        flow = self.make_flow()
+        flow.process_turn("hello", user_id="user1")
+        published = flow.store.load("user1")
+        flow.process_turn("I want to buy", user_id="user1")
+        # The earlier snapshot is untouched by the later turn
+        self.assertEqual(published["current_expert"], "orchestrator")
+        self.assertEqual(len(published["history"]), 2)
+        self.assertEqual(flow.store.load("user1")["current_expert"], "sales")
+
+class TestAsyncSession(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.experts = [
+            Expert(name="orchestrator", description="General", system_prompt="sys"),
+            Expert(name="sales", description="Sales expert", system_prompt="sales sys")
+        ]
+        self.mock_llm = MockLLM(
+            responses={"hello": "Hello there!", "buy": "Sure, what do you want?"},
+            routing_rules={"buy": "sales", "hello": "orchestrator"}
+        )
+        self.router = Router(self.experts, self.mock_llm)
+        self.flow = Flow(self.router, self.mock_llm)
+
+    async def test_aprocess_turn_switch(self):
+        await self.flow.aprocess_turn("hello", user_id="user1")
+        response = await self.flow.aprocess_turn("I want to buy", user_id="user1")
+        self.assertEqual(response.agent_name, "sales")
+        self.assertEqual(response.content, "Sure, what do you want?")
+        self.assertTrue(response.switched_context)
+        self.assertEqual(len(self.flow._get_session("user1")["history"]), 4)
+
+    async def test_concurrent_users(self):
+        responses = await asyncio.gather(*[
+            self.flow.aprocess_turn("I want to buy", user_id=f"user{i}") for i in range(20)
+        ])
+        self.assertTrue(all(r.agent_name == "sales" for r in responses))
+        self.assertEqual(len(self.flow._get_session("user7")["history"]), 2)
+
+    async def test_blocking_store_runs_off_the_loop(self):
+        class ThreadRecordingStore(InMemorySessionStore):
+            blocking = True
+            def __init__(self):
+                super().__init__()
+                self.threads = []
+            def load(self, user_id):
+                self.threads.append(threading.get_ident())
+                return super().load(user_id)
+            def save(self, user_id, session):
+                self.threads.append(threading.get_ident())
+                super().save(user_id, session)
+
+        store = ThreadRecordingStore()
+        flow = Flow(self.router, self.mock_llm, store=store)
+        await flow.aprocess_turn("hello", user_id="user1")
+        self.assertEqual(len(store.threads), 2)
+        self.assertNotIn(threading.get_ident(), store.threads)
+
+    async def test_default_agenerate_runs_sync_generate(self):
+        class SyncOnlyLLM(MockLLM):
+            async def agenerate(self, *args, **kwargs):
+                return await super(MockLLM, self).agenerate(*args, **kwargs)
+
+        flow = Flow(Router(self.experts, SyncOnlyLLM(routing_rules={"buy": "sales"})), SyncOnlyLLM(default_response="threaded"))
+        response = await flow.aprocess_turn("I want to buy", user_id="user1")
+        self.assertEqual(response.agent_name, "sales")
+        self.assertEqual(response.content, "threaded")
+
 if __name__ == '__main__':
     unittest.main()
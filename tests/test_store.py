@@ -0,0 +1,118 @@
+import os
+import time
+import tempfile
+import unittest
+from aghentic_minds.store import InMemorySessionStore, SQLiteSessionStore, RedisSessionStore, dump_session, load_session
+from aghentic_minds.session import Flow
+from aghentic_minds.router import Router
+from aghentic_minds.types import Expert, Message
+from aghentic_minds.llm.mock import MockLLM
+
+class FakeRedis:
+    """
+    Minimal in-memory stand-in for the redis-py client (get/set with ex/delete).
+    """
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (value.encode("utf-8"), time.monotonic() + ex if ex else None)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+def make_session():
+    return {
+        "current_expert": "sales",
+        "history": [
+            Message(role="user", content="héllo", metadata={"expert": "sales"}),
+            Message(role="assistant", content="Hi!"),
+        ]
+    }
+
+class TestSerialization(unittest.TestCase):
+    def test_round_trip(self):
+        session = load_session(dump_session(make_session()))
+        self.assertEqual(session["current_expert"], "sales")
+        self.assertEqual(session["history"][0].metadata, {"expert": "sales"})
+        self.assertEqual(session["history"][1].content, "Hi!")
+        self.assertEqual(session["history"][1].metadata, {})
+
+class TestInMemorySessionStore(unittest.TestCase):
+    def test_lru_limit(self):
+        store = InMemorySessionStore(max_sessions=2)
+        for user_id in ["a", "b"]:
+            store.save(user_id, make_session())
+        store.load("a")
+        store.save("c", make_session())
+        self.assertIsNone(store.load("b"))
+        self.assertIsNotNone(store.load("a"))
+        self.assertEqual(len(store), 2)
+
+    def test_idle_ttl(self):
+        store = InMemorySessionStore(idle_ttl=0.01)
+        store.save("a", make_session())
+        time.sleep(0.02)
+        self.assertIsNone(store.load("a"))
+
+class TestSQLiteSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "sessions.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_shared_between_instances(self):
+        writer = SQLiteSessionStore(self.path)
+        reader = SQLiteSessionStore(self.path)
+        writer.save("a", make_session())
+        self.assertEqual(reader.load("a")["history"][0].content, "héllo")
+        mode = reader._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+        writer.delete("a")
+        self.assertIsNone(reader.load("a"))
+        writer.close()
+        reader.close()
+
+    def test_purge_idle(self):
+        store = SQLiteSessionStore(self.path, idle_ttl=0.01)
+        store.save("a", make_session())
+        time.sleep(0.02)
+        self.assertEqual(store.purge_idle(), 1)
+        store.close()
+
+class TestRedisSessionStore(unittest.TestCase):
+    def test_round_trip_and_expiry(self):
+        client = FakeRedis()
+        store = RedisSessionStore(client, idle_ttl=60)
+        store.save("a", make_session())
+        self.assertIn("aghentic:session:a", client.data)
+        self.assertEqual(store.load("a")["current_expert"], "sales")
+        store.delete("a")
+        self.assertIsNone(store.load("a"))
+
+class TestFlowWithStore(unittest.TestCase):
+    def test_flows_share_sessions_through_store(self):
+        experts = [Expert(name="sales", description="Sales expert", system_prompt="sales sys")]
+        llm = MockLLM(responses={"buy": "Sure!"}, routing_rules={"buy": "sales"})
+        store = RedisSessionStore(FakeRedis())
+
+        worker_a = Flow(Router(experts, llm), llm, store=store)
+        worker_b = Flow(Router(experts, llm), llm, store=store)
+        worker_a.process_turn("I want to buy", user_id="user1")
+        response = worker_b.process_turn("buy more", user_id="user1")
+
+        self.assertFalse(response.switched_context)
+        self.assertEqual(len(worker_b._get_session("user1")["history"]), 4)
+
+if __name__ == '__main__':
+    unittest.main()
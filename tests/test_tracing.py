@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+from aghentic_minds.session import Flow
+from aghentic_minds.router import Router
+from aghentic_minds.types import Expert
+from aghentic_minds.llm.mock import MockLLM
+from aghentic_minds.tracing import NullTracer, CallbackTracer, MetricsTracer
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.experts = [
+            Expert(name="orchestrator", description="General", system_prompt="Orch"),
+            Expert(name="sales", description="Sales", system_prompt="Sales"),
+        ]
+        self.llm = MockLLM(routing_rules={"buy": "sales"}, default_response="A fairly long answer " * 20)
+        self.spans = []
+        self.tracer = CallbackTracer(lambda name, duration, attributes: self.spans.append((name, duration, dict(attributes))))
+
+    def flow(self, **kwargs):
+        return Flow(Router(self.experts, self.llm), self.llm, tracer=self.tracer, **kwargs)
+
+    def test_turn_spans(self):
+        self.flow().process_turn("I want to buy", user_id="user1")
+        names = [name for name, _, _ in self.spans]
+        self.assertEqual(names, ["route", "context", "generate", "prune", "turn"])
+        route = self.spans[0][2]
+        self.assertEqual(route, {"expert": "sales", "switched": True})
+        self.assertEqual(self.spans[2][2]["tokens"], 42)
+        self.assertTrue(all(duration >= 0 for _, duration, _ in self.spans))
+
+    def test_summarize_span(self):
+        flow = self.flow(optimize=True, estimate_tokens=True)
+        for i in range(12):
+            flow.process_turn(f"question {i}", user_id="user1")
+        summaries = [attributes for name, _, attributes in self.spans if name == "summarize"]
+        self.assertEqual(len(summaries), 12)
+        self.assertTrue(any(attributes["summarized"] for attributes in summaries))
+
+    def test_stream_and_async_spans(self):
+        flow = self.flow()
+        list(flow.stream_turn("hello", user_id="user1"))
+        asyncio.run(flow.aprocess_turn("hello", user_id="user2"))
+        names = [name for name, _, _ in self.spans]
+        self.assertEqual(names.count("turn"), 2)
+        self.assertEqual(names.count("generate"), 2)
+
+    def test_null_tracer_records_nothing(self):
+        tracer = NullTracer()
+        with tracer.span("route") as span:
+            span.set(expert="sales")
+        self.assertIs(tracer.span("a"), tracer.span("b"))
+
+class TestMetricsTracer(unittest.TestCase):
+    def test_histogram_and_prometheus(self):
+        tracer = MetricsTracer(buckets=(0.01, 0.1, 1.0))
+        tracer.on_span("generate", 0.005, {"tokens": 10})
+        tracer.on_span("generate", 0.05, {"tokens": 5, "cached_tokens": 3})
+        tracer.on_span("generate", 5.0, {"error": "TimeoutError"})
+
+        stats = tracer.snapshot()
+        self.assertEqual(stats["spans"]["generate"]["count"], 3)
+        self.assertEqual(stats["spans"]["generate"]["p50"], 0.1)
+        self.assertEqual(stats["spans"]["generate"]["p99"], float("inf"))
+        self.assertEqual(stats["tokens"], {"generate.tokens": 15, "generate.cached_tokens": 3})
+        self.assertEqual(stats["errors"], {"generate": 1})
+
+        text = tracer.to_prometheus()
+        self.assertIn('aghentic_span_duration_seconds_bucket{span="generate",le="0.1"} 2', text)
+        self.assertIn('aghentic_span_duration_seconds_bucket{span="generate",le="+Inf"} 3', text)
+        self.assertIn('aghentic_span_duration_seconds_count{span="generate"} 3', text)
+        self.assertIn('aghentic_tokens_total{span="generate",kind="tokens"} 15', text)
+        self.assertIn('aghentic_span_errors_total{span="generate"} 1', text)
+
+    def test_flow_integration(self):
+        tracer = MetricsTracer()
+        llm = MockLLM()
+        flow = Flow(Router([Expert(name="orchestrator", description="General", system_prompt="Orch")], llm), llm, tracer=tracer)
+        for _ in range(3):
+            flow.process_turn("hello", user_id="user1")
+        spans = tracer.snapshot()["spans"]
+        self.assertEqual(spans["turn"]["count"], 3)
+        self.assertEqual(spans["route"]["count"], 3)
+
+if __name__ == '__main__':
+    unittest.main()